@@ -0,0 +1,105 @@
+"""
+Alabia MCP Gateway
+Processo único dono dos pools de MCP servers, compartilhado por todos os
+workers do orquestrador (via socket unix local ou HTTP)
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+
+from apps.orchestrator.settings import settings
+from apps.orchestrator.mcp_client import MCPOrchestrator
+
+# Logging
+logging.basicConfig(
+    level=getattr(logging, settings.log_level.upper()),
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# O gateway sempre usa o orquestrador local (nunca outro gateway)
+orchestrator = MCPOrchestrator()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Lifecycle events"""
+    logger.info("🚀 Alabia MCP Gateway starting...")
+
+    started = time.perf_counter()
+    try:
+        await orchestrator.initialize()
+        logger.info(f"MCP servers ready in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"MCP startup failed: {e}", exc_info=True)
+
+    yield
+
+    logger.info("👋 Alabia MCP Gateway shutting down...")
+    await orchestrator.shutdown()
+
+
+app = FastAPI(
+    title="Alabia MCP Gateway",
+    description="Pools de MCP servers compartilhados entre workers do orquestrador",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+
+class ToolCallRequest(BaseModel):
+    """Request de execução de tool"""
+    input: Dict[str, Any] = Field(default_factory=dict, description="Parâmetros da tool")
+
+
+@app.get("/tools")
+async def list_tools():
+    """Tools disponíveis e servidor responsável por cada uma"""
+    tools = await orchestrator.get_tools()
+    return {
+        "tools": tools,
+        "server_for_tool": orchestrator.server_for_tool
+    }
+
+
+@app.post("/tools/{tool_name}/call")
+async def call_tool(tool_name: str, request: ToolCallRequest):
+    """Executa uma tool (com timeout, cache e coalescing do orquestrador)"""
+    await orchestrator.initialize()
+
+    try:
+        result = await orchestrator.execute_tool(tool_name, request.input)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {"result": result}
+
+
+@app.get("/health")
+async def health():
+    """Estado dos MCP servers"""
+    mcp_health = orchestrator.health()
+    return JSONResponse(
+        status_code=200 if mcp_health["initialized"] else 503,
+        content=mcp_health
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas internas (JSON)"""
+    return orchestrator.metrics()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    if settings.mcp_gateway_uds:
+        uvicorn.run(app, uds=settings.mcp_gateway_uds, log_level=settings.log_level)
+    else:
+        uvicorn.run(app, host=settings.mcp_gateway_host, port=settings.mcp_gateway_port, log_level=settings.log_level)
@@ -0,0 +1,209 @@
+"""
+Admission Control - Limite global de conversas com o LLM em andamento
+Fila com prioridade (leads no meio de um agendamento primeiro), SLO de
+tempo de fila por prioridade e rejeição rápida (503 + Retry-After)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional
+
+from packages.llm.history import EMAIL_RE, has_tool_use
+from apps.orchestrator.prefetch import TZ_BR, resolve_date
+
+logger = logging.getLogger(__name__)
+
+# Menor valor = atendido primeiro
+PRIORITY_BOOKING = 0  # lead no meio de um agendamento/cadastro
+PRIORITY_RETURNING = 1  # conversa em andamento
+PRIORITY_NEW = 2  # primeira mensagem (saudação)
+PRIORITY_NAMES = {PRIORITY_BOOKING: "booking", PRIORITY_RETURNING: "returning", PRIORITY_NEW: "new"}
+
+
+class AdmissionRejected(Exception):
+    """Turno recusado por sobrecarga (o chamador responde 503)"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Server overloaded ({reason}), retry in {retry_after:.0f}s")
+
+
+def turn_priority(history: List[Dict[str, Any]], message: str, booking_tools: Collection[str]) -> int:
+    """
+    Prioridade do turno
+
+    Args:
+        history: Histórico da conversa (formato Anthropic)
+        message: Mensagem nova
+        booking_tools: Tools de agendamento/CRM (tool_use no histórico
+            indica agendamento em andamento)
+    """
+    if not history:
+        return PRIORITY_NEW
+
+    if has_tool_use(history, booking_tools):
+        return PRIORITY_BOOKING
+
+    # Cliente mandando email ou data numa conversa em andamento
+    if EMAIL_RE.search(message) or resolve_date(message, datetime.now(TZ_BR).date()):
+        return PRIORITY_BOOKING
+    return PRIORITY_RETURNING
+
+
+class AdmissionController:
+    """
+    Semáforo global com fila de prioridade
+
+    Uma vaga liberada vai para o turno de maior prioridade na fila (FIFO
+    dentro da mesma prioridade). Cada prioridade tem um SLO de tempo de
+    fila: se a espera estimada já passa dele, rejeita na hora; se a espera
+    real passa, o turno sai da fila e é rejeitado.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        max_queue: int = 200,
+        queue_slo_seconds: Optional[Dict[int, float]] = None
+    ):
+        """
+        Args:
+            max_concurrent: Turnos com o LLM em andamento ao mesmo tempo
+            max_queue: Turnos aguardando vaga (além disso, rejeita)
+            queue_slo_seconds: Espera máxima por prioridade
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_slo_seconds = queue_slo_seconds or {
+            PRIORITY_BOOKING: 20.0, PRIORITY_RETURNING: 10.0, PRIORITY_NEW: 5.0
+        }
+
+        self.in_flight = 0
+        self._heap: List[tuple] = []  # (prioridade, ordem, future)
+        self._order = itertools.count()
+        self.waiting = 0
+
+        # Duração média de um turno (EWMA) para estimar a espera
+        self.avg_turn_seconds: Optional[float] = None
+
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "slo_estimate": 0, "slo_timeout": 0}
+        self.shed_by_priority: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _queued(self, priority: Optional[int] = None) -> int:
+        """Turnos na fila (com prioridade igual ou maior que `priority`)"""
+        return sum(
+            1 for entry in self._heap
+            if not entry[2].done() and (priority is None or entry[0] <= priority)
+        )
+
+    def estimated_wait(self, priority: int) -> Optional[float]:
+        """Espera estimada para um turno novo com esta prioridade"""
+        if self.avg_turn_seconds is None:
+            return None
+        if self.in_flight < self.max_concurrent and not self.waiting:
+            return 0.0
+        ahead = self._queued(priority)
+        return (ahead + 1) * self.avg_turn_seconds / self.max_concurrent
+
+    def _reject(self, reason: str, priority: int, retry_after: Optional[float]) -> AdmissionRejected:
+        self.shed[reason] += 1
+        self.shed_by_priority[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        retry_after = max(1.0, math.ceil(retry_after or self.avg_turn_seconds or 1.0))
+        logger.warning(f"Turn shed ({reason}, priority {PRIORITY_NAMES.get(priority, priority)}), {self.waiting} queued")
+        return AdmissionRejected(reason, retry_after)
+
+    async def _acquire(self, priority: int) -> None:
+        if self.in_flight < self.max_concurrent and not self.waiting:
+            self.in_flight += 1
+            self._record_wait(0.0)
+            return
+
+        slo = self.queue_slo_seconds.get(priority, max(self.queue_slo_seconds.values()))
+        if self.waiting >= self.max_queue:
+            raise self._reject("queue_full", priority, self.estimated_wait(priority))
+        estimate = self.estimated_wait(priority)
+        if estimate is not None and estimate > slo:
+            raise self._reject("slo_estimate", priority, estimate)
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._order), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), slo)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A vaga chegou junto com o timeout/cancelamento
+                if isinstance(e, asyncio.CancelledError):
+                    self._release()
+                    raise
+            else:
+                future.cancel()
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise self._reject("slo_timeout", priority, self.estimated_wait(priority)) from None
+        finally:
+            self.waiting -= 1
+
+        self._record_wait(time.monotonic() - started)
+
+    def _release(self) -> None:
+        """Passa a vaga para o próximo da fila (ou devolve)"""
+        while self._heap:
+            _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record_wait(self, waited: float) -> None:
+        self.admitted += 1
+        self.wait_count += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_RETURNING) -> AsyncIterator[None]:
+        """
+        Vaga para um turno com o LLM
+
+        Raises:
+            AdmissionRejected: Fila cheia ou SLO de fila estourado
+        """
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.avg_turn_seconds = elapsed if self.avg_turn_seconds is None else 0.8 * self.avg_turn_seconds + 0.2 * elapsed
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {
+            name: self._queued(priority) - (self._queued(priority - 1) if priority > 0 else 0)
+            for priority, name in PRIORITY_NAMES.items()
+        }
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self.waiting,
+            "queued_by_priority": queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "shed_by_priority": dict(self.shed_by_priority),
+            "avg_wait_ms": round(self.wait_total / self.wait_count * 1000, 1) if self.wait_count else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "avg_turn_ms": round(self.avg_turn_seconds * 1000, 1) if self.avg_turn_seconds is not None else None
+        }
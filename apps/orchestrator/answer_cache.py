@@ -0,0 +1,180 @@
+"""
+Answer Cache - Cache semântico de respostas para perguntas de FAQ
+Chave: embedding da mensagem normalizada + hash da versão do prompt
+"""
+import hashlib
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+
+def normalize_message(message: str) -> str:
+    """Minúsculas, sem acentos, espaços colapsados e sem pontuação final"""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ")
+
+
+def prompt_version(*parts: str) -> str:
+    """Hash curto do prompt/modelo; mudou, as respostas antigas não valem"""
+    return hashlib.sha256("\x00".join(parts).encode()).hexdigest()[:12]
+
+
+def _norm(vector: List[float]) -> float:
+    return math.sqrt(sum(x * x for x in vector)) or 1.0
+
+
+@dataclass
+class CachedAnswer:
+    """Resposta guardada"""
+    message: str
+    embedding: List[float]
+    norm: float
+    response: Dict[str, Any]
+    prompt_version: str
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas por similaridade de embedding
+
+    Só o chamador sabe se um turno pode ser cacheado (sem contexto do
+    usuário, sem tools com efeito colateral); aqui ficam a busca por
+    similaridade, TTL, LRU e os contadores.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        prompt_version: str,
+        threshold: float = 0.95,
+        ttl: float = 3600,
+        max_entries: int = 500
+    ):
+        """
+        Args:
+            embedder: Função async texto -> embedding
+            prompt_version: Hash da versão do prompt (entradas de outra versão são ignoradas)
+            threshold: Similaridade de cosseno mínima para acerto
+            ttl: Validade das respostas em segundos
+            max_entries: Máximo de respostas guardadas (LRU)
+        """
+        self.embedder = embedder
+        self.prompt_version = prompt_version
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        self.embed_errors = 0
+        self.hit_age_total = 0.0
+        self.hit_age_max = 0.0
+
+    async def embed(self, message: str) -> Optional[List[float]]:
+        """Embedding da mensagem normalizada (None se o embedder falhar)"""
+        try:
+            return await self.embedder(normalize_message(message))
+        except Exception as e:
+            self.embed_errors += 1
+            logger.warning(f"Answer cache embedding failed: {e}")
+            return None
+
+    def lookup(self, embedding: List[float]) -> Optional[tuple]:
+        """
+        Resposta mais parecida acima do limiar
+
+        Returns:
+            (CachedAnswer, similaridade) ou None
+        """
+        now = time.monotonic()
+        for key in [k for k, entry in self._entries.items() if now - entry.created_at > self.ttl]:
+            del self._entries[key]
+            self.expired += 1
+
+        norm = _norm(embedding)
+        best, best_score = None, 0.0
+        for entry in self._entries.values():
+            if entry.prompt_version != self.prompt_version:
+                continue
+            score = sum(a * b for a, b in zip(embedding, entry.embedding)) / (norm * entry.norm)
+            if score > best_score:
+                best, best_score = entry, score
+
+        if best is None or best_score < self.threshold:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(normalize_message(best.message))
+        best.hits += 1
+        self.hits += 1
+        self.hit_age_total += best.age_seconds
+        self.hit_age_max = max(self.hit_age_max, best.age_seconds)
+        return best, best_score
+
+    def store(self, message: str, embedding: List[float], response: Dict[str, Any]) -> None:
+        """Guarda a resposta de um turno cacheável"""
+        key = normalize_message(message)
+        self._entries[key] = CachedAnswer(
+            message=message,
+            embedding=list(embedding),
+            norm=_norm(embedding),
+            response=response,
+            prompt_version=self.prompt_version
+        )
+        self._entries.move_to_end(key)
+        self.stores += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Acertos e idade (staleness) das respostas servidas"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "expired": self.expired,
+            "embed_errors": self.embed_errors,
+            "avg_hit_age_seconds": round(self.hit_age_total / self.hits, 1) if self.hits else 0.0,
+            "max_hit_age_seconds": round(self.hit_age_max, 1),
+            "prompt_version": self.prompt_version
+        }
+
+
+def openai_embedder(api_key: str, model: str) -> Embedder:
+    """Embedder com a API da OpenAI (mesmo modelo do RAG)"""
+    client = None
+
+    async def embed(text: str) -> List[float]:
+        nonlocal client
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(api_key=api_key)
+        response = await client.embeddings.create(model=model, input=text)
+        return response.data[0].embedding
+
+    return embed
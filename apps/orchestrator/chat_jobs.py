@@ -0,0 +1,254 @@
+"""
+Chat Jobs - Modo assíncrono do /chat com entrega por webhook
+O request volta 202 na hora; um pool limitado de workers processa o turno
+e faz POST do ChatResponse na URL de callback (com retry)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from packages.llm.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+JobRunner = Callable[[], Awaitable[Dict[str, Any]]]
+
+# Respostas do callback que valem nova tentativa
+RETRYABLE_CALLBACK_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class JobQueueFull(Exception):
+    """Fila de jobs cheia (o chamador responde 503)"""
+
+
+@dataclass
+class ChatJob:
+    """Um turno processado em background"""
+    id: str
+    user_id: str
+    status: str = "queued"  # queued | running | succeeded | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    # Entrega do webhook: pending | delivered | failed | disabled
+    delivery: Dict[str, Any] = field(default_factory=lambda: {"status": "pending", "attempts": 0, "error": None})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "delivery": dict(self.delivery)
+        }
+
+
+class ChatJobQueue:
+    """
+    Fila limitada + pool fixo de workers
+
+    Jobs terminados ficam consultáveis por `retention_seconds` (até
+    `max_jobs`), depois são descartados.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 100,
+        callback_url: str = "",
+        callback_secret: str = "",
+        callback_timeout: float = 10.0,
+        callback_max_attempts: int = 5,
+        callback_retry_base_seconds: float = 1.0,
+        callback_retry_max_seconds: float = 30.0,
+        retention_seconds: float = 3600,
+        max_jobs: int = 10000,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            workers: Turnos processados ao mesmo tempo
+            max_queue: Jobs aguardando worker; além disso, JobQueueFull
+            callback_url: URL que recebe o resultado ("" = só polling)
+            callback_secret: Assina o corpo (HMAC-SHA256) no header X-Alabia-Signature
+            callback_timeout: Timeout de cada POST do callback
+            callback_max_attempts: Tentativas de entrega do webhook
+            retention_seconds: Tempo que um job terminado fica consultável
+            max_jobs: Jobs guardados (os mais antigos saem primeiro)
+            transport: Transport httpx (testes)
+        """
+        self.workers = workers
+        self.callback_url = callback_url
+        self.callback_secret = callback_secret
+        self.callback_timeout = callback_timeout
+        self.callback_max_attempts = callback_max_attempts
+        self.callback_retry_base_seconds = callback_retry_base_seconds
+        self.callback_retry_max_seconds = callback_retry_max_seconds
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self.transport = transport
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, ChatJob]" = OrderedDict()
+        self._runners: Dict[str, JobRunner] = {}
+        self._workers: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.deliveries = 0
+        self.delivery_failures = 0
+
+    def _start(self) -> None:
+        """Sobe os workers no primeiro job (precisa do event loop)"""
+        self._workers = [task for task in self._workers if not task.done()]
+        for index in range(len(self._workers), self.workers):
+            self._workers.append(asyncio.create_task(self._worker(index)))
+
+    def submit(self, user_id: str, runner: JobRunner) -> ChatJob:
+        """
+        Enfileira um turno
+
+        Args:
+            user_id: Usuário do turno
+            runner: Coroutine factory que devolve o ChatResponse (dict)
+
+        Raises:
+            JobQueueFull: Fila no limite
+        """
+        self._start()
+        job = ChatJob(id=uuid.uuid4().hex, user_id=user_id)
+        if not self.callback_url:
+            job.delivery["status"] = "disabled"
+        try:
+            self._queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFull(f"Chat job queue full ({self._queue.maxsize} jobs)")
+
+        self._runners[job.id] = runner
+        self._jobs[job.id] = job
+        self.submitted += 1
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[ChatJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        """Descarta jobs terminados expirados e o excesso sobre max_jobs"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            expired = job.finished_at is not None and now - job.finished_at > self.retention_seconds
+            if expired or (len(self._jobs) > self.max_jobs and job.finished_at is not None):
+                del self._jobs[job_id]
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self._jobs.get(job_id)
+                runner = self._runners.pop(job_id, None)
+                if job and runner:
+                    await self._process(job, runner)
+            except Exception as e:
+                logger.error(f"Chat job worker {index} error: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: ChatJob, runner: JobRunner) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await runner()
+            job.status = "succeeded"
+            self.succeeded += 1
+        except Exception as e:
+            logger.error(f"Chat job {job.id} failed: {e}", exc_info=True)
+            job.error = f"Error processing message: {str(e)}"
+            job.status = "failed"
+            self.failed += 1
+        job.finished_at = time.time()
+
+        if self.callback_url:
+            await self._deliver(job)
+
+    async def _deliver(self, job: ChatJob) -> None:
+        """POST do job no callback, com backoff exponencial + jitter"""
+        body = json.dumps(job.to_dict(), ensure_ascii=False, default=str).encode()
+        headers = {"Content-Type": "application/json", "X-Alabia-Job-Id": job.id}
+        if self.callback_secret:
+            signature = hmac.new(self.callback_secret.encode(), body, hashlib.sha256).hexdigest()
+            headers["X-Alabia-Signature"] = f"sha256={signature}"
+
+        client = self._http()
+        for attempt in range(1, self.callback_max_attempts + 1):
+            job.delivery["attempts"] = attempt
+            try:
+                response = await client.post(self.callback_url, content=body, headers=headers)
+                response.raise_for_status()
+                job.delivery.update(status="delivered", error=None)
+                self.deliveries += 1
+                return
+            except httpx.HTTPError as e:
+                job.delivery["error"] = str(e) or e.__class__.__name__
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                if status is not None and status not in RETRYABLE_CALLBACK_STATUS:
+                    break
+                if attempt < self.callback_max_attempts:
+                    delay = backoff_delay(
+                        e, attempt,
+                        base=self.callback_retry_base_seconds,
+                        cap=self.callback_retry_max_seconds
+                    )
+                    logger.warning(f"Callback for job {job.id} failed ({job.delivery['error']}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+        job.delivery["status"] = "failed"
+        self.delivery_failures += 1
+        logger.error(f"Callback for job {job.id} failed after {job.delivery['attempts']} attempts")
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.callback_timeout, transport=self.transport)
+        return self._client
+
+    async def shutdown(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "deliveries": self.deliveries,
+            "delivery_failures": self.delivery_failures
+        }
@@ -0,0 +1,352 @@
+"""
+Conversation Store - Histórico de conversa por user_id no orquestrador
+O backend WhatsApp só precisa mandar a mensagem nova; os blocos de
+tool_use/tool_result do loop também ficam guardados
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from packages.llm.history import is_tool_result
+
+logger = logging.getLogger(__name__)
+
+# (user_id, mensagens cortadas) -> None; chamado quando o início da conversa é apagado
+TrimCallback = Callable[[str, List[Dict[str, Any]]], None]
+
+
+def normalize_block(block: Any) -> Any:
+    """Bloco do SDK (TextBlock, ToolUseBlock...) ou dict -> dict mínimo"""
+    if not isinstance(block, dict):
+        block = block.model_dump() if hasattr(block, "model_dump") else {"type": "text", "text": str(block)}
+
+    kind = block.get("type")
+    if kind == "text":
+        return {"type": "text", "text": block.get("text", "")}
+    if kind == "tool_use":
+        return {"type": "tool_use", "id": block["id"], "name": block["name"], "input": block.get("input") or {}}
+    if kind == "tool_result":
+        normalized = {"type": "tool_result", "tool_use_id": block["tool_use_id"], "content": block.get("content", "")}
+        if block.get("is_error"):
+            normalized["is_error"] = True
+        return normalized
+    # Outros tipos: sem campos de transporte (cache_control, citations...)
+    return {k: v for k, v in block.items() if k not in ("cache_control", "citations")}
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Formato compacto para guardar: {"role", "content"} com content string
+    ou lista de blocos em dict (sem objetos do SDK)
+    """
+    normalized = []
+    for message in messages:
+        content = message.get("content", "")
+        if not isinstance(content, str):
+            blocks = [normalize_block(block) for block in content]
+            # Só texto: guarda como string
+            if len(blocks) == 1 and blocks[0]["type"] == "text":
+                content = blocks[0]["text"]
+            else:
+                content = [block for block in blocks if block.get("type") != "text" or block.get("text")]
+        if content:
+            normalized.append({"role": message["role"], "content": content})
+    return normalized
+
+
+def trim_messages(messages: List[Dict[str, Any]], max_messages: int) -> List[Dict[str, Any]]:
+    """
+    Passando de `max_messages`, corta para a metade mais recente, começando
+    num turno do usuário que não seja tool_result
+
+    O corte em bloco (e não a cada mensagem) só muda o início da conversa
+    a cada `max_messages / 2` mensagens. As mensagens cortadas vão para o
+    `on_trim` do store (HistoryManager.fold), que guarda resumo e fatos-chave.
+    """
+    if len(messages) <= max_messages:
+        return messages
+    trimmed = messages[-max(max_messages // 2, 1):]
+    while trimmed and (trimmed[0]["role"] != "user" or is_tool_result(trimmed[0])):
+        trimmed = trimmed[1:]
+    return trimmed
+
+
+class ConversationStore(ABC):
+    """Interface dos stores de conversa"""
+
+    @abstractmethod
+    async def load(self, user_id: str) -> List[Dict[str, Any]]:
+        """Mensagens da conversa (mais antigas primeiro)"""
+
+    @abstractmethod
+    async def append(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Acrescenta mensagens (já normalizadas ou do SDK)"""
+
+    @abstractmethod
+    async def clear(self, user_id: str) -> None:
+        """Apaga a conversa"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryConversationStore(ConversationStore):
+    """Conversas em memória com despejo LRU por usuário"""
+
+    def __init__(self, max_users: int = 5000, max_messages: int = 100, on_trim: Optional[TrimCallback] = None):
+        """
+        Args:
+            max_users: Conversas mantidas (LRU)
+            max_messages: Mensagens por conversa
+            on_trim: Recebe as mensagens cortadas pelo limite
+        """
+        self.max_users = max_users
+        self.max_messages = max_messages
+        self.on_trim = on_trim
+        self._conversations: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self.evictions = 0
+
+    async def load(self, user_id: str) -> List[Dict[str, Any]]:
+        messages = self._conversations.get(user_id)
+        if messages is None:
+            return []
+        self._conversations.move_to_end(user_id)
+        return list(messages)
+
+    async def append(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        self.put(user_id, self._conversations.get(user_id, []) + normalize_messages(messages))
+
+    def put(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Substitui a conversa inteira (usado pelo TieredConversationStore)"""
+        kept = trim_messages(messages, self.max_messages)
+        if self.on_trim and len(kept) < len(messages):
+            self.on_trim(user_id, messages[:len(messages) - len(kept)])
+        self._conversations[user_id] = kept
+        self._conversations.move_to_end(user_id)
+        while len(self._conversations) > self.max_users:
+            self._conversations.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self, user_id: str) -> None:
+        self._conversations.pop(user_id, None)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._conversations
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "conversations": len(self._conversations),
+            "evictions": self.evictions
+        }
+
+
+class SQLiteConversationStore(ConversationStore):
+    """
+    Conversas em SQLite no disco local (WAL; compartilhado entre workers)
+
+    Uma linha por mensagem, com o content em JSON compacto. Operações
+    rodam em thread para não bloquear o event loop.
+    """
+
+    def __init__(self, path: str, max_messages: int = 100, on_trim: Optional[TrimCallback] = None):
+        """
+        Args:
+            path: Arquivo do banco (criado no primeiro uso)
+            max_messages: Mensagens guardadas por conversa
+            on_trim: Recebe as mensagens cortadas pelo limite
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self.on_trim = on_trim
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " user_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,"
+                " content TEXT NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (user_id, seq))"
+            )
+            # Contador por conversa: não reinicia com corte ou clear, então
+            # serve de versão para o TieredConversationStore
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " user_id TEXT PRIMARY KEY, last_seq INTEGER NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _load(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT role, content FROM messages WHERE user_id = ? ORDER BY seq", (user_id,)
+        ).fetchall()
+        return [{"role": role, "content": json.loads(content)} for role, content in rows]
+
+    def _last_seq(self, user_id: str) -> int:
+        row = self._connect().execute("SELECT last_seq FROM conversations WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _append(self, user_id: str, messages: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self._last_seq(user_id)
+            rows = []
+            for message in messages:
+                seq += 1
+                content = json.dumps(message["content"], ensure_ascii=False, separators=(",", ":"))
+                rows.append((user_id, seq, message["role"], content, now))
+            conn.executemany("INSERT INTO messages VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO conversations VALUES (?, ?)"
+                " ON CONFLICT(user_id) DO UPDATE SET last_seq = excluded.last_seq",
+                (user_id, seq)
+            )
+
+            # Mantém só as últimas max_messages (corte num turno do usuário)
+            stored = self._load(user_id)
+            kept = trim_messages(stored, self.max_messages)
+            trimmed = stored[:len(stored) - len(kept)]
+            first_kept = seq - len(kept) + 1
+            conn.execute("DELETE FROM messages WHERE user_id = ? AND seq < ?", (user_id, first_kept))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq, trimmed
+
+    def _clear(self, user_id: str) -> None:
+        conn = self._connect()
+        # Incrementa a versão para invalidar cópias em memória
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+        conn.execute("UPDATE conversations SET last_seq = last_seq + 1 WHERE user_id = ?", (user_id,))
+        conn.execute("COMMIT")
+
+    async def load(self, user_id: str) -> List[Dict[str, Any]]:
+        return await self._run(self._load, user_id)
+
+    async def last_seq(self, user_id: str) -> int:
+        """Versão da conversa (seq da última mensagem)"""
+        return await self._run(self._last_seq, user_id)
+
+    async def append(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        await self.append_versioned(user_id, messages)
+
+    async def append_versioned(self, user_id: str, messages: List[Dict[str, Any]]) -> int:
+        """Acrescenta mensagens e devolve a nova versão da conversa"""
+        seq, trimmed = await self._run(self._append, user_id, normalize_messages(messages))
+        if trimmed and self.on_trim:
+            self.on_trim(user_id, trimmed)
+        return seq
+
+    async def clear(self, user_id: str) -> None:
+        await self._run(self._clear, user_id)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path}
+
+
+class TieredConversationStore(ConversationStore):
+    """
+    Memória (LRU) na frente do SQLite
+
+    A cópia em memória só é usada se o seq da última mensagem bate com o
+    do SQLite (outro worker pode ter escrito na mesma conversa).
+    """
+
+    def __init__(self, memory: MemoryConversationStore, sqlite: SQLiteConversationStore):
+        self.memory = memory
+        self.sqlite = sqlite
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def load(self, user_id: str) -> List[Dict[str, Any]]:
+        version = await self.sqlite.last_seq(user_id)
+        if version and self._versions.get(user_id) == version:
+            cached = await self.memory.load(user_id)
+            if cached:
+                self.hits += 1
+                return cached
+
+        self.misses += 1
+        messages = await self.sqlite.load(user_id)
+        if messages:
+            self.memory.put(user_id, messages)
+            self._versions[user_id] = version
+        return messages
+
+    async def append(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        self._versions[user_id] = await self.sqlite.append_versioned(user_id, messages)
+        # Recarrega do SQLite no próximo load se a memória não tinha a conversa
+        if user_id in self.memory:
+            await self.memory.append(user_id, messages)
+        else:
+            self._versions.pop(user_id, None)
+        if len(self._versions) > self.memory.max_users:
+            self._versions = {k: v for k, v in self._versions.items() if k in self.memory}
+
+    async def clear(self, user_id: str) -> None:
+        await self.sqlite.clear(user_id)
+        await self.memory.clear(user_id)
+        self._versions.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "tiered",
+            "memory": self.memory.stats(),
+            "sqlite": self.sqlite.stats(),
+            "memory_hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+def create_conversation_store(settings, on_trim: Optional[TrimCallback] = None) -> ConversationStore:
+    """
+    Store configurado em settings.conversation_store_backend
+
+    Args:
+        settings: Settings da aplicação
+        on_trim: Recebe as mensagens cortadas pelo limite (no tiered, só o
+            SQLite avisa, para não contar o corte duas vezes)
+    """
+    memory = MemoryConversationStore(
+        max_users=settings.conversation_store_max_users,
+        max_messages=settings.conversation_store_max_messages
+    )
+    if settings.conversation_store_backend == "memory":
+        memory.on_trim = on_trim
+        return memory
+
+    sqlite = SQLiteConversationStore(
+        settings.conversation_store_path,
+        max_messages=settings.conversation_store_max_messages,
+        on_trim=on_trim
+    )
+    if settings.conversation_store_backend == "sqlite":
+        return sqlite
+    return TieredConversationStore(memory, sqlite)
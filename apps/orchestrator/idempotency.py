@@ -0,0 +1,238 @@
+"""
+Idempotency - Reentregas do webhook do WhatsApp não repetem o turno
+Duplicatas em andamento esperam a execução original; as que chegam depois
+recebem o resultado guardado (TTL + LRU). Com vários workers, a reserva e o
+resultado ficam no SQLite compartilhado
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    """
+    Execução única por chave
+
+    Uso:
+        result, replayed = await store.run(key, lambda: _submit_turn(request))
+
+    Só resultados de sucesso ficam guardados; se a execução falha, as
+    duplicatas em andamento recebem o mesmo erro e a próxima reentrega
+    executa de novo.
+
+    Estado só do processo: com mais de um worker, use o
+    SQLiteIdempotencyStore.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 10000):
+        """
+        Args:
+            ttl: Tempo (segundos) que um resultado fica guardado
+            max_entries: Resultados guardados (LRU)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # chave -> (expires_at, resultado)
+        self._completed: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.executions = 0
+        self.replayed = 0
+        self.joined = 0
+        self.evictions = 0
+
+    def _cached(self, key: str) -> Tuple[bool, Any]:
+        entry = self._completed.get(key)
+        if entry is None:
+            return False, None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._completed[key]
+            return False, None
+        self._completed.move_to_end(key)
+        return True, result
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        """
+        Executa `factory` uma vez por chave
+
+        Returns:
+            (resultado, None na execução original | "in_flight" | "completed")
+        """
+        found, result = self._cached(key)
+        if found:
+            self.replayed += 1
+            logger.info(f"Idempotent replay for {key}")
+            return result, "completed"
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+            logger.info(f"Duplicate request joined in-flight execution for {key}")
+            result, _ = await asyncio.shield(task)
+            return result, "in_flight"
+
+        # Task própria: o request original desistir não cancela a execução
+        task = asyncio.create_task(self._execute(key, factory))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def _execute(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        """Execução original (sobrescrito pelo store compartilhado)"""
+        self.executions += 1
+        return await factory(), None
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result, _ = task.result()
+        self._completed[key] = (time.monotonic() + self.ttl, result)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._completed),
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "replayed": self.replayed,
+            "joined": self.joined,
+            "evictions": self.evictions
+        }
+
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """
+    Idempotência compartilhada entre workers (tabela no SQLite das conversas)
+
+    O worker que reserva a chave (BEGIN IMMEDIATE) executa; os outros
+    esperam o resultado aparecer no banco. Reserva de um worker que morreu
+    expira em `lease` segundos. Resultados precisam ser serializáveis em
+    JSON; a cópia em memória continua servindo as duplicatas do processo.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 86400,
+        max_entries: int = 10000,
+        lease: float = 300,
+        poll_interval: float = 0.2,
+    ):
+        """
+        Args:
+            path: Arquivo do banco (criado no primeiro uso)
+            ttl: Tempo (segundos) que um resultado fica guardado
+            max_entries: Resultados guardados em memória (LRU)
+            lease: Tempo máximo (segundos) de uma execução reservada
+            poll_interval: Intervalo da espera por outro worker
+        """
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self.path = path
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # result NULL = execução em andamento (expires_at = fim da reserva)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency_keys ("
+                " key TEXT PRIMARY KEY, result TEXT, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idempotency_keys_expires ON idempotency_keys (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _claim(self, key: str) -> Tuple[str, Any]:
+        """("claimed", None) | ("pending", None) | ("completed", resultado)"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT result, expires_at FROM idempotency_keys WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                conn.execute("COMMIT")
+                return ("pending", None) if row[0] is None else ("completed", json.loads(row[0]))
+
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+            conn.execute("INSERT OR REPLACE INTO idempotency_keys VALUES (?, NULL, ?)", (key, now + self.lease))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return "claimed", None
+
+    def _complete(self, key: str, result: Any) -> None:
+        self._connect().execute(
+            "UPDATE idempotency_keys SET result = ?, expires_at = ? WHERE key = ?",
+            (json.dumps(result, ensure_ascii=False, separators=(",", ":")), time.time() + self.ttl, key)
+        )
+
+    def _release(self, key: str) -> None:
+        self._connect().execute("DELETE FROM idempotency_keys WHERE key = ? AND result IS NULL", (key,))
+
+    async def _execute(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[str]]:
+        waited = False
+        while True:
+            state, result = await self._run(self._claim, key)
+            if state == "completed":
+                self.joined += waited
+                self.replayed += not waited
+                logger.info(f"Idempotent replay for {key} (shared store)")
+                return result, "in_flight" if waited else "completed"
+            if state == "claimed":
+                break
+            # Outro worker está executando; se ele falhar, a reserva some e
+            # esta reentrega executa
+            waited = True
+            await asyncio.sleep(self.poll_interval)
+
+        self.executions += 1
+        try:
+            result = await factory()
+        except BaseException:
+            await self._run(self._release, key)
+            raise
+        try:
+            await self._run(self._complete, key, result)
+        except Exception as e:
+            # Turno já rodou: a resposta sai mesmo sem o registro
+            logger.error(f"Could not store idempotent result for {key}: {e}", exc_info=True)
+        return result, None
+
+
+def create_idempotency_store(settings) -> IdempotencyStore:
+    """Store configurado em settings.idempotency_backend"""
+    if settings.idempotency_backend == "memory":
+        return IdempotencyStore(ttl=settings.idempotency_ttl_seconds, max_entries=settings.idempotency_max_entries)
+    return SQLiteIdempotencyStore(
+        settings.conversation_store_path,
+        ttl=settings.idempotency_ttl_seconds,
+        max_entries=settings.idempotency_max_entries,
+        lease=settings.idempotency_lease_seconds
+    )
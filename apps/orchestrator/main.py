@@ -2,13 +2,17 @@
 Alabia Conductor - Main FastAPI Application
 Orquestrador de LLM com MCP (Model Context Protocol)
 """
+import inspect
 import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
 from apps.orchestrator.settings import settings
+from apps.orchestrator.mcp_client import mcp_orchestrator
+from apps.orchestrator.prefetch import prefetch_stats
 from apps.orchestrator.routes import chat
 
 # Logging
@@ -27,16 +31,22 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.environment}")
     logger.info(f"Anthropic Model: {settings.anthropic_model}")
 
-    # TODO: Inicializar MCP Servers aqui
-    # - RAG Server
-    # - Calendar Server
-    # - Web Search Server
+    # Sobe os MCP servers em paralelo antes de aceitar tráfego,
+    # assim nenhuma mensagem paga o cold start dos subprocessos
+    started = time.perf_counter()
+    try:
+        await mcp_orchestrator.initialize()
+        logger.info(f"MCP servers ready in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        # API sobe mesmo assim; /health reporta o estado e o /chat tenta de novo
+        logger.error(f"MCP startup failed: {e}", exc_info=True)
 
     yield
 
     # Shutdown
     logger.info("👋 Alabia Conductor shutting down...")
-    # TODO: Cleanup de MCP servers
+    await chat.chat_jobs.shutdown()
+    await mcp_orchestrator.shutdown()
 
 
 # FastAPI App
@@ -75,14 +85,48 @@ async def root():
 @app.get("/health")
 async def health():
     """Detailed health check"""
+    mcp_health = mcp_orchestrator.health()
+    if inspect.isawaitable(mcp_health):
+        # Modo gateway: estado repassado do /health do gateway
+        mcp_health = await mcp_health
+
+    if mcp_health["ready"]:
+        status = "healthy"
+    elif mcp_health["initialized"]:
+        status = "degraded"
+    else:
+        status = "starting"
+
+    checks = {"api": "ok"}
+    for name, server in mcp_health["servers"].items():
+        checks[f"{name}_server"] = server["state"]
+    checks["mcp"] = mcp_health
+
+    content = {
+        "status": status,
+        "checks": checks
+    }
+
+    # 503 enquanto nenhum MCP server está de pé (readiness)
+    return JSONResponse(
+        status_code=200 if mcp_health["initialized"] else 503,
+        content=content
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas internas (JSON)"""
     return {
-        "status": "healthy",
-        "checks": {
-            "api": "ok",
-            # TODO: Adicionar checks dos MCP servers
-            # "rag_server": "ok",
-            # "calendar_server": "ok",
-        }
+        **mcp_orchestrator.metrics(),
+        "llm": chat.anthropic_driver.stats(),
+        "history": chat.history_manager.stats(),
+        "prefetch": prefetch_stats.stats(),
+        "answer_cache": chat.answer_cache.stats(),
+        "turns": chat.turn_coalescer.stats(),
+        "jobs": chat.chat_jobs.stats(),
+        "admission": chat.admission.stats(),
+        "idempotency": chat.idempotency_store.stats()
     }
 
 
@@ -4,14 +4,27 @@ Conecta e gerencia múltiplos MCP servers (RAG, Calendar, Web Search)
 """
 import logging
 import asyncio
+import copy
+import importlib
 import os
-from typing import Dict, List, Any, Optional
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Any, Optional
 from pathlib import Path
 
+from apps.orchestrator.settings import settings
+from apps.orchestrator.server_guard import ServerGuard, ServiceUnavailableError, UpstreamError
+from apps.orchestrator.tool_cache import ToolResultCache, canonicalize_input
+
 # MCP imports
 try:
+    import anyio
     from mcp import ClientSession, StdioServerParameters
     from mcp.client.stdio import stdio_client
+    from mcp.shared.memory import create_client_server_memory_streams
+    from mcp import types as mcp_types
 except ImportError:
     print("ERROR: MCP not installed. Run: pip install mcp")
     raise
@@ -19,225 +32,1035 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
-class MCPOrchestrator:
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+SERVERS_DIR = PROJECT_ROOT / "packages" / "mcp_servers"
+
+
+@dataclass
+class MCPServerSpec:
     """
-    Orquestrador de MCP Servers
+    Declaração de um MCP server
+
+    Attributes:
+        name: Nome do servidor
+        command: Executável do subprocesso stdio
+        args: Argumentos do subprocesso
+        module: Módulo importado no modo in-process
+        env: Variáveis extras para o subprocesso
+        tools: Tools que o servidor fornece
+        startup: "eager" (sobe no boot), "lazy" (sobe na primeira chamada
+            e para quando ocioso) ou "disabled"
+        idle_timeout_seconds: Ociosidade até parar um servidor lazy
+            (usa settings se None)
+    """
+    name: str
+    command: str
+    args: List[str]
+    module: Optional[str] = None
+    env: Dict[str, str] = field(default_factory=dict)
+    tools: List[str] = field(default_factory=list)
+    startup: str = "eager"
+    idle_timeout_seconds: Optional[float] = None
 
-    Gerencia conexão com múltiplos MCP servers e fornece
-    interface unificada para execução de tools.
+
+# tools/call enviada pela task atual: o stream de escrita anota o ID JSON-RPC
+_sent_call: ContextVar[Optional[Dict[str, Any]]] = ContextVar("mcp_sent_call", default=None)
+
+
+class _RequestIdRecorder:
     """
+    Stream de escrita da sessão que anota o ID das tools/call enviadas
 
-    def __init__(self):
-        """Inicializa orquestrador"""
-        self.servers: Dict[str, Dict[str, Any]] = {}  # name -> {session, stdio_context}
-        self.tools: Dict[str, Dict[str, Any]] = {}  # tool_name -> tool_info
-        self.server_for_tool: Dict[str, str] = {}  # tool_name -> server_name
-        self.is_initialized = False
+    O ClientSession numera as requisições internamente; o ID é lido da
+    mensagem JSON-RPC que sai, na mesma task que chamou `call_tool`, para
+    o CancelledNotification apontar a requisição certa.
+    """
 
-        logger.info("MCP Orchestrator created")
+    def __init__(self, stream):
+        self._stream = stream
+
+    async def send(self, message) -> None:
+        sent = _sent_call.get()
+        request = message.message.root
+        if sent is not None and isinstance(request, mcp_types.JSONRPCRequest) and request.method == "tools/call":
+            sent["id"] = request.id
+        await self._stream.send(message)
+
+    async def __aenter__(self):
+        await self._stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._stream.__aexit__(*exc_info)
+
+
+# Registro dos MCP servers. Para adicionar um servidor, declare aqui.
+MCP_SERVERS: List[MCPServerSpec] = [
+    MCPServerSpec(
+        name="rag",
+        command="python",
+        args=[str(SERVERS_DIR / "rag_server" / "server.py")],
+        module="packages.mcp_servers.rag_server.server",
+        tools=["file_search", "get_collection_stats"],
+    ),
+    MCPServerSpec(
+        name="calendar",
+        command="python",
+        args=[str(SERVERS_DIR / "calendar_server" / "server.py")],
+        module="packages.mcp_servers.calendar_server.server",
+        tools=["create_event", "check_availability", "list_events", "cancel_event"],
+    ),
+    MCPServerSpec(
+        name="pipedrive",
+        command="python",
+        args=[str(SERVERS_DIR / "pipedrive_simple" / "server.py")],
+        module="packages.mcp_servers.pipedrive_simple.server",
+        tools=["create_lead"],
+        # Só é usado no fim do agendamento
+        startup="lazy",
+    ),
+    # Web Search Server (TODO)
+]
+
+
+class MCPConnection:
+    """
+    Uma sessão MCP com um subprocesso stdio
 
-    async def initialize(self):
+    Os context managers do stdio_client precisam ser abertos e fechados na
+    mesma task, então a sessão vive dentro de uma task dona que só termina
+    no `close()` (ou quando o subprocesso morre).
+    """
+
+    def __init__(self, server_name: str, params: StdioServerParameters):
+        """
+        Args:
+            server_name: Nome do servidor dono da sessão
+            params: Parâmetros do subprocesso stdio
         """
-        Inicializa e conecta todos os MCP servers
+        self.server_name = server_name
+        self.params = params
+        self.session: Optional[ClientSession] = None
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    @property
+    def is_alive(self) -> bool:
+        """True enquanto a sessão está aberta"""
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self) -> List[Dict[str, Any]]:
+        """
+        Sobe o subprocesso, inicializa a sessão e lista as tools
 
-        Servidores disponíveis:
-        - RAG Server (file_search)
-        - Calendar Server (create_event, check_availability, list_events)
-        - Web Search Server (web_search)
+        Returns:
+            Tools do servidor no formato MCP
         """
-        logger.info("Initializing MCP servers...")
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        return await ready
+
+    @asynccontextmanager
+    async def _open_session(self):
+        """Abre e inicializa a sessão MCP com o subprocesso stdio"""
+        async with stdio_client(self.params) as (read_stream, write_stream):
+            async with self._client_session(read_stream, write_stream) as session:
+                yield session
+
+    @staticmethod
+    @asynccontextmanager
+    async def _client_session(read_stream, write_stream):
+        """ClientSession inicializada, com o ID das tools/call rastreado"""
+        async with ClientSession(read_stream, _RequestIdRecorder(write_stream)) as session:
+            await session.initialize()
+            yield session
 
+    async def _run(self, ready: asyncio.Future) -> None:
+        """Task dona da sessão"""
         try:
-            # RAG Server
-            await self._connect_rag_server()
+            async with self._open_session() as session:
+                tools_response = await session.list_tools()
+
+                self.session = session
+                ready.set_result([
+                    {
+                        "name": tool.name,
+                        "description": tool.description,
+                        "inputSchema": tool.inputSchema,
+                        "annotations": tool.annotations.model_dump(exclude_none=True) if tool.annotations else None
+                    }
+                    for tool in tools_response.tools
+                ])
+
+                await self._stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"MCP session for {self.server_name} died: {e}")
+        finally:
+            self.session = None
+            if not ready.done():
+                ready.set_exception(ConnectionError(f"MCP session for {self.server_name} closed during startup"))
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        tool_input: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Executa uma tool nesta sessão
 
-            # Calendar Server
-            await self._connect_calendar_server()
+        Args:
+            tool_name: Nome da tool
+            tool_input: Parâmetros de entrada
+            timeout: Tempo máximo em segundos (None = sem limite)
 
-            # Pipedrive Server
-            await self._connect_pipedrive_server()
+        Raises:
+            ConnectionError: Se a sessão está fechada
+            TimeoutError: Se estourou o timeout (a requisição é cancelada no servidor)
+        """
+        if not self.session:
+            raise ConnectionError(f"MCP session for '{self.server_name}' is closed")
 
-            # Web Search Server (TODO)
-            # await self._connect_websearch_server()
+        session = self.session
+        request = mcp_types.ClientRequest(
+            mcp_types.CallToolRequest(
+                params=mcp_types.CallToolRequestParams(name=tool_name, arguments=tool_input)
+            )
+        )
+        # send_request direto: o session.call_tool pode mandar um list_tools
+        # depois da resposta (validação do outputSchema), fora do timeout certo
+        sent: Dict[str, Any] = {}
+        token = _sent_call.set(sent)
 
-            self.is_initialized = True
-            logger.info(f"MCP initialized with {len(self.tools)} tools from {len(self.servers)} servers")
+        self.in_flight += 1
+        try:
+            async with asyncio.timeout(timeout):
+                return await session.send_request(request, mcp_types.CallToolResult)
+        except TimeoutError:
+            if "id" in sent:
+                await self._cancel_request(session, sent["id"], f"Tool '{tool_name}' timed out after {timeout}s")
+            raise
+        finally:
+            _sent_call.reset(token)
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
 
+    async def _cancel_request(self, session: ClientSession, request_id: int, reason: str) -> None:
+        """Avisa o servidor para abortar uma requisição pendente"""
+        try:
+            await session.send_notification(
+                mcp_types.ClientNotification(
+                    mcp_types.CancelledNotification(
+                        params=mcp_types.CancelledNotificationParams(requestId=request_id, reason=reason)
+                    )
+                )
+            )
         except Exception as e:
-            logger.error(f"Error initializing MCP servers: {e}", exc_info=True)
-            raise
+            logger.warning(f"Could not cancel request {request_id} on {self.server_name}: {e}")
+
+    async def ping(self, timeout: float) -> float:
+        """
+        Verifica se a sessão responde
+
+        Args:
+            timeout: Tempo máximo de espera em segundos
+
+        Returns:
+            Latência do ping em ms
+
+        Raises:
+            ConnectionError: Se a sessão está fechada
+            asyncio.TimeoutError: Se não respondeu a tempo
+        """
+        if not self.is_alive:
+            raise ConnectionError(f"MCP session for '{self.server_name}' is closed")
 
-    async def _connect_rag_server(self):
-        """Conecta ao RAG MCP Server"""
-        server_name = "rag"
+        started = time.perf_counter()
+        await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    async def close(self) -> None:
+        """Encerra a sessão e o subprocesso"""
+        self._stop.set()
+        if not self._task:
+            return
 
         try:
-            logger.info(f"Connecting to RAG server...")
-
-            # Caminho para o script do servidor
-            project_root = Path(__file__).parent.parent.parent
-            server_script = project_root / "packages" / "mcp_servers" / "rag_server" / "server.py"
-
-            if not server_script.exists():
-                raise FileNotFoundError(f"RAG server script not found: {server_script}")
-
-            # Parâmetros do servidor stdio
-            server_params = StdioServerParameters(
-                command="python",
-                args=[str(server_script)],
-                env={
-                    **os.environ,
-                    "PYTHONPATH": str(project_root)
-                }
-            )
+            await asyncio.wait_for(self._task, timeout=5)
+        except Exception:
+            self._task.cancel()
 
-            # Conecta via stdio (é um context manager)
-            stdio_context = stdio_client(server_params)
-            read_stream, write_stream = await stdio_context.__aenter__()
 
-            # Cria sessão MCP
-            session = ClientSession(read_stream, write_stream)
+# Setup dos módulos carregados in-process (module_path -> task)
+_server_setups: Dict[str, asyncio.Task] = {}
 
-            # Inicializa sessão
-            await session.__aenter__()
-            await session.initialize()
 
-            # Armazena sessão e context manager para cleanup posterior
-            self.servers[server_name] = {
-                "session": session,
-                "stdio_context": stdio_context
-            }
+async def load_server_module(module_path: str):
+    """
+    Importa o módulo de um MCP server e roda seu `setup()` uma única vez
 
-            # Lista e registra tools
-            tools_response = await session.list_tools()
+    Args:
+        module_path: Caminho do módulo (ex: packages.mcp_servers.rag_server.server)
 
-            for tool in tools_response.tools:
-                tool_dict = {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.inputSchema
-                }
-                self.tools[tool.name] = tool_dict
-                self.server_for_tool[tool.name] = server_name
-                logger.info(f"Registered tool: {tool.name} from {server_name}")
+    Returns:
+        Módulo importado (expõe `server`)
 
-            logger.info(f"RAG server connected successfully with {len(tools_response.tools)} tools")
+    Raises:
+        ImportError: Se o módulo ou suas dependências não estão instalados
+    """
+    try:
+        module = importlib.import_module(module_path)
+    except SystemExit as e:
+        # Os scripts fazem exit(1) quando falta dependência
+        raise ImportError(f"Dependencies missing for MCP server {module_path}") from e
 
-        except Exception as e:
-            logger.error(f"Failed to connect to RAG server: {e}", exc_info=True)
-            raise
+    setup = getattr(module, "setup", None)
+    if setup is not None:
+        task = _server_setups.get(module_path)
+        if task is None or (task.done() and task.exception() is not None):
+            task = asyncio.ensure_future(setup())
+            _server_setups[module_path] = task
+        await asyncio.shield(task)
 
-    async def _connect_calendar_server(self):
-        """Conecta ao Calendar MCP Server"""
-        server_name = "calendar"
+    return module
 
-        try:
-            logger.info(f"Connecting to Calendar server...")
-
-            # Caminho para o script do servidor
-            project_root = Path(__file__).parent.parent.parent
-            server_script = project_root / "packages" / "mcp_servers" / "calendar_server" / "server.py"
-
-            if not server_script.exists():
-                raise FileNotFoundError(f"Calendar server script not found: {server_script}")
-
-            # Parâmetros do servidor stdio
-            server_params = StdioServerParameters(
-                command="python",
-                args=[str(server_script)],
-                env={
-                    **os.environ,
-                    "PYTHONPATH": str(project_root)
-                }
-            )
 
-            # Conecta via stdio (é um context manager)
-            stdio_context = stdio_client(server_params)
-            read_stream, write_stream = await stdio_context.__aenter__()
+class InProcessMCPConnection(MCPConnection):
+    """
+    Sessão MCP com um servidor carregado no próprio processo
 
-            # Cria sessão MCP
-            session = ClientSession(read_stream, write_stream)
+    Importa packages/mcp_servers/*/server.py, roda `setup()` e conecta ao
+    `server` do módulo por streams em memória: mesmo contrato de tools,
+    sem subprocesso, pipes nem um interpretador Python extra.
+    """
 
-            # Inicializa sessão
-            await session.__aenter__()
-            await session.initialize()
+    def __init__(self, server_name: str, module_path: str):
+        """
+        Args:
+            server_name: Nome do servidor dono da sessão
+            module_path: Módulo do servidor
+        """
+        super().__init__(server_name, params=None)
+        self.module_path = module_path
+
+    @asynccontextmanager
+    async def _open_session(self):
+        """Abre a sessão MCP com o servidor in-process"""
+        module = await load_server_module(self.module_path)
+        server = module.server
+        async with create_client_server_memory_streams() as (client_streams, server_streams):
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(
+                    lambda: server.run(*server_streams, server.create_initialization_options())
+                )
+                try:
+                    async with self._client_session(*client_streams) as session:
+                        yield session
+                finally:
+                    task_group.cancel_scope.cancel()
 
-            # Armazena sessão e context manager para cleanup posterior
-            self.servers[server_name] = {
-                "session": session,
-                "stdio_context": stdio_context
-            }
 
-            # Lista e registra tools
-            tools_response = await session.list_tools()
+class MCPServerPool:
+    """
+    Pool de sessões MCP para um servidor
 
-            for tool in tools_response.tools:
-                tool_dict = {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.inputSchema
-                }
-                self.tools[tool.name] = tool_dict
-                self.server_for_tool[tool.name] = server_name
-                logger.info(f"Registered tool: {tool.name} from {server_name}")
+    Cada chamada vai para a sessão com menos chamadas em andamento. Quando
+    todas as sessões têm `scale_up_queue_depth` chamadas em andamento, uma
+    nova sessão sobe em background (até `max_size`); sessões ociosas além
+    de `min_size` são encerradas depois de `idle_seconds`.
 
-            logger.info(f"Calendar server connected successfully with {len(tools_response.tools)} tools")
+    Com `warm_standby`, mantém uma sessão pré-aquecida fora do rodízio,
+    promovida no failover ou no scale-up sem pagar cold start.
+    """
 
-        except Exception as e:
-            logger.error(f"Failed to connect to Calendar server: {e}", exc_info=True)
-            raise
+    def __init__(
+        self,
+        server_name: str,
+        connection_factory: Callable[[str], "MCPConnection"],
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        warm_standby: Optional[bool] = None,
+    ):
+        """
+        Args:
+            server_name: Nome do servidor
+            connection_factory: Cria uma conexão (não iniciada) para o servidor
+            min_size: Número mínimo de sessões (usa settings se None)
+            max_size: Número máximo de sessões (usa settings se None)
+            warm_standby: Mantém sessão standby (usa settings se None)
+        """
+        self.server_name = server_name
+        self.min_size = max(1, min_size or settings.mcp_pool_min_size)
+        self.max_size = max(self.min_size, max_size or settings.mcp_pool_max_size)
+        self.warm_standby = settings.mcp_warm_standby if warm_standby is None else warm_standby
+        self.connections: List[MCPConnection] = []
+        self.standby: Optional[MCPConnection] = None
+        self.tools: List[Dict[str, Any]] = []
+        self.restarts = 0
+        self.last_probe: Dict[str, Any] = {}
+
+        self._connection_factory = connection_factory
+        self._grow_task: Optional[asyncio.Task] = None
+        self._scaler_task: Optional[asyncio.Task] = None
+        self._standby_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def queue_depth(self) -> int:
+        """Total de chamadas em andamento no pool"""
+        return sum(connection.in_flight for connection in self.connections)
+
+    @property
+    def last_used(self) -> float:
+        """Último uso (monotonic) entre as sessões do pool"""
+        return max((connection.last_used for connection in self.connections), default=0.0)
+
+    async def start(self) -> None:
+        """
+        Sobe `min_size` sessões em paralelo
+
+        Raises:
+            Exception: Erro da primeira sessão se nenhuma conseguiu subir
+        """
+        results = await asyncio.gather(
+            *(self._spawn() for _ in range(self.min_size)),
+            return_exceptions=True
+        )
+
+        if not self.connections:
+            raise results[0]
+
+        self._scaler_task = asyncio.create_task(self._autoscale_loop())
+        self.refill_standby()
+        logger.info(f"Pool '{self.server_name}' started with {len(self.connections)} sessions")
+
+    async def _spawn(self) -> MCPConnection:
+        """Cria, inicia e adiciona uma sessão ao pool"""
+        connection = self._connection_factory(self.server_name)
+        tools = await connection.start()
+
+        if not self.tools:
+            self.tools = tools
+        self.connections.append(connection)
+        return connection
+
+    def _pick(self) -> MCPConnection:
+        """Sessão viva com menos chamadas em andamento"""
+        alive = [connection for connection in self.connections if connection.is_alive]
+        if not alive:
+            raise ConnectionError(f"No live MCP session for server '{self.server_name}'")
+        return min(alive, key=lambda connection: connection.in_flight)
+
+    async def call_tool(
+        self,
+        tool_name: str,
+        tool_input: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> Any:
+        """Executa a tool na sessão menos carregada"""
+        connection = self._pick()
+
+        if connection.in_flight >= settings.mcp_pool_scale_up_queue_depth:
+            self._grow()
+
+        return await connection.call_tool(tool_name, tool_input, timeout=timeout)
+
+    def _grow(self) -> None:
+        """Sobe uma sessão extra em background (uma por vez)"""
+        if len(self.connections) >= self.max_size:
+            return
+        if self._grow_task and not self._grow_task.done():
+            return
+
+        standby = self._take_standby()
+        if standby:
+            self.connections.append(standby)
+            logger.info(f"Pool '{self.server_name}' promoted standby, now {len(self.connections)} sessions")
+            return
+
+        async def grow():
+            try:
+                await self._spawn()
+                logger.info(f"Pool '{self.server_name}' scaled up to {len(self.connections)} sessions")
+            except Exception as e:
+                logger.error(f"Pool '{self.server_name}' failed to scale up: {e}")
+
+        self._grow_task = asyncio.create_task(grow())
+
+    def _take_standby(self) -> Optional[MCPConnection]:
+        """Retira a standby (se viva) e agenda uma nova"""
+        standby, self.standby = self.standby, None
+        self.refill_standby()
+        return standby if standby and standby.is_alive else None
+
+    def refill_standby(self) -> None:
+        """Agenda a criação da sessão standby, se habilitada e ausente"""
+        if not self.warm_standby or self._closed:
+            return
+        if self.standby and self.standby.is_alive:
+            return
+        if self._standby_task and not self._standby_task.done():
+            return
+
+        async def spawn_standby():
+            try:
+                connection = self._connection_factory(self.server_name)
+                await connection.start()
+            except Exception as e:
+                logger.warning(f"Pool '{self.server_name}' failed to spawn standby: {e}")
+                return
+
+            if self._closed:
+                await connection.close()
+            else:
+                self.standby = connection
 
-    async def _connect_pipedrive_server(self):
-        """Conecta ao Pipedrive MCP Server"""
-        server_name = "pipedrive"
+        self._standby_task = asyncio.create_task(spawn_standby())
 
-        try:
-            logger.info(f"Connecting to Pipedrive server...")
+    async def probe(self, timeout: float) -> None:
+        """
+        Faz ping nas sessões ociosas e descarta as que não respondem
+
+        Sessões com chamadas em andamento não são pingadas (o handler do
+        servidor pode estar ocupado); chamadas travadas são limitadas pelo
+        timeout das tools.
+        """
+        async def probe_one(connection: MCPConnection) -> Optional[float]:
+            try:
+                return await connection.ping(timeout)
+            except Exception as e:
+                logger.warning(f"Pool '{self.server_name}' session failed probe: {e!r}")
+                if connection in self.connections:
+                    self.connections.remove(connection)
+                if connection is self.standby:
+                    self.standby = None
+                await connection.close()
+                return None
+
+        idle = [connection for connection in self.connections if connection.in_flight == 0]
+        if self.standby:
+            idle.append(self.standby)
+
+        latencies = await asyncio.gather(*(probe_one(connection) for connection in idle))
+        ok = [latency for latency in latencies if latency is not None]
+
+        self.last_probe = {
+            "at": time.time(),
+            "latency_ms": max(ok) if ok else None,
+            "probed": len(idle),
+            "dead": len(idle) - len(ok)
+        }
+
+    async def heal(self) -> int:
+        """
+        Completa o pool até `min_size`, promovendo a standby antes de subir
+        subprocessos novos
+
+        Returns:
+            Número de sessões repostas
+
+        Raises:
+            Exception: Se não conseguiu subir uma sessão nova
+        """
+        restored = 0
+        while len(self.connections) < self.min_size:
+            standby = self._take_standby()
+            if standby:
+                self.connections.append(standby)
+            else:
+                await self._spawn()
+            restored += 1
+            self.restarts += 1
+
+        if restored:
+            logger.info(f"Pool '{self.server_name}' restored {restored} sessions")
+        return restored
+
+    async def _autoscale_loop(self) -> None:
+        """Encerra periodicamente sessões ociosas acima do mínimo"""
+        while True:
+            await asyncio.sleep(settings.mcp_pool_scale_interval_seconds)
+            await self.shrink()
+
+    async def shrink(self) -> None:
+        """Encerra sessões ociosas há mais de `mcp_pool_idle_seconds`, respeitando `min_size`"""
+        now = time.monotonic()
+        idle = [
+            connection for connection in self.connections
+            if connection.in_flight == 0 and now - connection.last_used > settings.mcp_pool_idle_seconds
+        ]
+
+        while idle and len(self.connections) > self.min_size:
+            connection = idle.pop()
+            self.connections.remove(connection)
+            await connection.close()
+            logger.info(f"Pool '{self.server_name}' scaled down to {len(self.connections)} sessions")
+
+    async def close(self) -> None:
+        """Encerra todas as sessões do pool"""
+        self._closed = True
+        for task in (self._scaler_task, self._grow_task, self._standby_task):
+            if task and not task.done():
+                task.cancel()
+
+        connections, self.connections = self.connections, []
+        if self.standby:
+            connections.append(self.standby)
+            self.standby = None
+        await asyncio.gather(*(connection.close() for connection in connections), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho e carga do pool"""
+        return {
+            "size": len(self.connections),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_flight": self.queue_depth,
+            "sessions": [connection.in_flight for connection in self.connections],
+            "standby_ready": bool(self.standby and self.standby.is_alive),
+            "restarts": self.restarts,
+            "last_probe": dict(self.last_probe)
+        }
+
+
+class MCPSupervisor:
+    """
+    Supervisor dos MCP servers
 
-            project_root = Path(__file__).parent.parent.parent
-            server_script = project_root / "packages" / "mcp_servers" / "pipedrive_simple" / "server.py"
+    A cada `mcp_probe_interval_seconds` pinga as sessões de cada pool,
+    mede a latência, descarta sessões mortas e repõe o pool (standby
+    pré-aquecida primeiro, subprocesso novo depois). Reposições que falham
+    são repetidas com backoff exponencial. Servidores que nunca subiram
+    também são tentados de novo com o mesmo backoff.
+    """
+
+    def __init__(self, orchestrator: "MCPOrchestrator"):
+        """
+        Args:
+            orchestrator: Orquestrador supervisionado
+        """
+        self.orchestrator = orchestrator
+        self.failures: Dict[str, int] = {}  # server_name -> falhas consecutivas
+        self.next_attempt: Dict[str, float] = {}  # server_name -> monotonic
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Inicia o loop de supervisão (idempotente)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Para o loop de supervisão"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.mcp_probe_interval_seconds)
+            try:
+                await self.check_all()
+            except Exception as e:
+                logger.error(f"MCP supervisor check failed: {e}", exc_info=True)
+
+    async def check_all(self) -> None:
+        """Verifica todos os servidores em paralelo"""
+        await asyncio.gather(*(
+            self.check_server(name) for name in self.orchestrator.registry
+        ))
+
+    async def check_server(self, server_name: str) -> None:
+        """Pinga, descarta sessões mortas e repõe o pool de um servidor"""
+        pool = self.orchestrator.servers.get(server_name)
+        state = self.orchestrator.server_status.get(server_name, {}).get("state")
+
+        if state in ("idle", "disabled"):
+            return
+
+        if pool is None:
+            if not self._can_attempt(server_name):
+                return
+            await self.orchestrator.restart_server(server_name)
+            self._record(server_name, server_name in self.orchestrator.servers)
+            return
+
+        if self.orchestrator.is_idle(server_name):
+            await self.orchestrator.stop_idle_server(server_name)
+            return
 
-            if not server_script.exists():
-                raise FileNotFoundError(f"Pipedrive server script not found: {server_script}")
+        await pool.probe(settings.mcp_probe_timeout_seconds)
+
+        if len(pool.connections) < pool.min_size and self._can_attempt(server_name):
+            try:
+                await pool.heal()
+                self._record(server_name, True)
+            except Exception as e:
+                logger.error(f"Failed to restart {server_name} server: {e}")
+                self._record(server_name, False)
+
+        pool.refill_standby()
+        self.orchestrator._update_server_state(server_name)
+
+    def _can_attempt(self, server_name: str) -> bool:
+        return time.monotonic() >= self.next_attempt.get(server_name, 0.0)
+
+    def _record(self, server_name: str, ok: bool) -> None:
+        """Atualiza falhas consecutivas e agenda a próxima tentativa"""
+        if ok:
+            self.failures.pop(server_name, None)
+            self.next_attempt.pop(server_name, None)
+            return
+
+        failures = self.failures.get(server_name, 0) + 1
+        self.failures[server_name] = failures
+        delay = min(
+            settings.mcp_restart_backoff_base_seconds * 2 ** (failures - 1),
+            settings.mcp_restart_backoff_max_seconds
+        )
+        self.next_attempt[server_name] = time.monotonic() + delay
+        logger.warning(f"{server_name} server restart failed {failures}x, next attempt in {delay:.1f}s")
+
+    def stats(self, server_name: str) -> Dict[str, Any]:
+        """Estado de supervisão de um servidor"""
+        next_attempt = self.next_attempt.get(server_name)
+        return {
+            "consecutive_failures": self.failures.get(server_name, 0),
+            "next_restart_in_s": round(max(0.0, next_attempt - time.monotonic()), 1) if next_attempt else None
+        }
+
+
+class MCPOrchestrator:
+    """
+    Orquestrador de MCP Servers
+
+    Gerencia conexão com múltiplos MCP servers e fornece
+    interface unificada para execução de tools.
+    """
 
-            server_params = StdioServerParameters(
-                command="python",
-                args=[str(server_script)],
-                env={
-                    **os.environ,
-                    "PYTHONPATH": str(project_root)
-                }
+    def __init__(self, specs: Optional[List[MCPServerSpec]] = None):
+        """
+        Inicializa orquestrador
+
+        Args:
+            specs: Servidores gerenciados (usa MCP_SERVERS se None)
+        """
+        # Registro (server_name -> spec), com política de startup do settings
+        self.registry: Dict[str, MCPServerSpec] = {}
+        for spec in (specs if specs is not None else MCP_SERVERS):
+            startup = settings.mcp_server_startup.get(spec.name, spec.startup)
+            self.registry[spec.name] = MCPServerSpec(**{**spec.__dict__, "startup": startup})
+
+        self.servers: Dict[str, MCPServerPool] = {}  # name -> pool de sessões
+        self.tools: Dict[str, Dict[str, Any]] = {}  # tool_name -> tool_info
+        self.server_for_tool: Dict[str, str] = {}  # tool_name -> server_name
+        self.server_status: Dict[str, Dict[str, Any]] = {}  # name -> {state, error, startup_ms}
+        self.is_initialized = False
+
+        # Cria conexões (não iniciadas); substituível em testes
+        self._connection_factory: Callable[[str], MCPConnection] = self._create_connection
+
+        # Operações em andamento (key -> task), compartilhadas entre chamadores
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        # Probes periódicos e restart automático
+        self.supervisor = MCPSupervisor(self)
+
+        # Cache de resultados das tools read-only
+        self.cache = ToolResultCache(
+            max_entries=settings.tool_cache_max_entries,
+            default_ttl=settings.tool_cache_default_ttl_seconds,
+            ttl_overrides=settings.tool_cache_ttl_overrides
+        )
+        self.coalesced_calls = 0  # chamadas que aguardaram uma execução idêntica
+
+        # Limite de concorrência e circuit breaker por servidor
+        self.guards: Dict[str, ServerGuard] = {
+            name: ServerGuard(
+                name,
+                max_concurrency=settings.mcp_server_max_concurrency_overrides.get(
+                    name, settings.mcp_server_max_concurrency
+                ),
+                max_queue=settings.mcp_server_max_queue,
+                queue_timeout=settings.mcp_server_queue_timeout_seconds,
+                failure_threshold=settings.mcp_breaker_failure_threshold,
+                reset_seconds=settings.mcp_breaker_reset_seconds
             )
+            for name in self.registry
+        }
 
-            stdio_context = stdio_client(server_params)
-            read_stream, write_stream = await stdio_context.__aenter__()
+        logger.info("MCP Orchestrator created")
 
-            session = ClientSession(read_stream, write_stream)
-            await session.__aenter__()
-            await session.initialize()
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Executa `factory` uma única vez por `key` enquanto estiver em andamento
 
-            self.servers[server_name] = {
-                "session": session,
-                "stdio_context": stdio_context
-            }
+        Chamadores concorrentes aguardam a mesma task e recebem o mesmo
+        resultado ou a mesma exceção. O cancelamento de um chamador não
+        cancela a operação compartilhada.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def initialize(self):
+        """
+        Inicializa e conecta todos os MCP servers em paralelo
+
+        Os servidores vêm do registro (MCP_SERVERS) e sobem concorrentemente,
+        então o tempo de boot é o do servidor mais lento. Falha de um
+        servidor não derruba os outros: o estado de cada um fica em
+        `server_status`.
+
+        Servidores "lazy" só sobem para descobrir as tools e são parados
+        em seguida; voltam na primeira chamada. Servidores "disabled" são
+        ignorados.
+
+        Chamadas concorrentes são agrupadas numa única inicialização; se o
+        orquestrador já está inicializado, retorna imediatamente.
+
+        Raises:
+            RuntimeError: Se nenhum servidor conseguiu conectar
+        """
+        if self.is_initialized:
+            return
+
+        await self._single_flight("initialize", self._initialize)
 
-            tools_response = await session.list_tools()
+    async def _initialize(self):
+        """Inicialização efetiva (ver `initialize`)"""
+        logger.info("Initializing MCP servers...")
+
+        startups = []
+        for name, spec in self.registry.items():
+            if spec.startup == "eager":
+                startups.append(self.start_server(name))
+            elif spec.startup == "lazy":
+                startups.append(self._single_flight(f"server:{name}", lambda name=name: self._discover_server(name)))
+            else:
+                self.server_status[name] = {"state": "disabled", "error": None, "startup_ms": None}
+
+        await asyncio.gather(*startups)
+
+        # Supervisor também tenta de novo os servidores que falharam
+        self.supervisor.start()
+
+        ready = [name for name, status in self.server_status.items() if status["state"] in ("ready", "idle")]
+        if not ready:
+            raise RuntimeError(f"No MCP server could be started: {self.server_status}")
+
+        self.is_initialized = True
+        logger.info(f"MCP initialized with {len(self.tools)} tools from {len(self.servers)} servers")
 
-            for tool in tools_response.tools:
-                tool_dict = {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.inputSchema
-                }
-                self.tools[tool.name] = tool_dict
-                self.server_for_tool[tool.name] = server_name
-                logger.info(f"Registered tool: {tool.name} from {server_name}")
+    async def start_server(self, server_name: str) -> None:
+        """
+        Conecta um servidor, agrupando chamadas concorrentes para o mesmo nome
+
+        Args:
+            server_name: Nome do servidor (rag, calendar, pipedrive)
+
+        Raises:
+            ValueError: Se o servidor não existe ou está desabilitado
+        """
+        self._check_server_name(server_name)
 
-            logger.info(f"Pipedrive server connected successfully with {len(tools_response.tools)} tools")
+        await self._single_flight(
+            f"server:{server_name}",
+            lambda: self._start_server(server_name)
+        )
 
+    async def restart_server(self, server_name: str) -> None:
+        """
+        Reinicializa um único servidor sem derrubar os demais
+
+        Fecha o pool atual (se existir), remove as tools registradas por
+        ele e conecta novamente.
+
+        Args:
+            server_name: Nome do servidor
+
+        Raises:
+            ValueError: Se o servidor não existe ou está desabilitado
+        """
+        self._check_server_name(server_name)
+
+        async def _restart():
+            await self._close_server(server_name)
+            await self._start_server(server_name)
+
+        await self._single_flight(f"server:{server_name}", _restart)
+
+    def _check_server_name(self, server_name: str) -> None:
+        spec = self.registry.get(server_name)
+        if spec is None:
+            raise ValueError(f"Unknown MCP server: {server_name}")
+        if spec.startup == "disabled":
+            raise ValueError(f"MCP server '{server_name}' is disabled")
+
+    async def _discover_server(self, server_name: str) -> None:
+        """Sobe um servidor lazy só para registrar as tools e o para em seguida"""
+        await self._start_server(server_name)
+
+        if server_name in self.servers:
+            await self._close_server(server_name, keep_tools=True)
+            self.server_status[server_name]["state"] = "idle"
+
+    def is_idle(self, server_name: str) -> bool:
+        """True se um servidor lazy está sem uso há mais que o idle timeout"""
+        spec = self.registry.get(server_name)
+        pool = self.servers.get(server_name)
+        if spec is None or spec.startup != "lazy" or pool is None or pool.queue_depth > 0:
+            return False
+
+        idle_timeout = spec.idle_timeout_seconds or settings.mcp_lazy_idle_seconds
+        return time.monotonic() - pool.last_used > idle_timeout
+
+    async def stop_idle_server(self, server_name: str) -> None:
+        """Para um servidor lazy ocioso mantendo as tools registradas"""
+        async def _stop():
+            if not self.is_idle(server_name):
+                return
+            await self._close_server(server_name, keep_tools=True)
+            self.server_status[server_name]["state"] = "idle"
+            logger.info(f"Stopped idle MCP server: {server_name}")
+
+        await self._single_flight(f"server:{server_name}", _stop)
+
+    async def _start_server(self, server_name: str) -> None:
+        """Sobe o pool de um servidor registrando estado e tempo de startup"""
+        if server_name in self.servers:
+            # Já conectado: não duplica subprocessos
+            return
+
+        logger.info(f"Connecting to {server_name} server...")
+        self.server_status[server_name] = {"state": "starting", "error": None, "startup_ms": None}
+        started = time.perf_counter()
+
+        try:
+            if self.get_transport(server_name) == "inprocess":
+                # Mesmo event loop: sessões extras não trazem paralelismo
+                pool = MCPServerPool(server_name, self._connection_factory, min_size=1, max_size=1, warm_standby=False)
+            else:
+                pool = MCPServerPool(server_name, self._connection_factory)
+            await pool.start()
+            self.servers[server_name] = pool
+
+            for tool_dict in pool.tools:
+                self.tools[tool_dict["name"]] = tool_dict
+                self.server_for_tool[tool_dict["name"]] = server_name
+                self.cache.register_tool(tool_dict)
+                logger.info(f"Registered tool: {tool_dict['name']} from {server_name}")
+
+            declared = set(self.registry[server_name].tools)
+            listed = {tool_dict["name"] for tool_dict in pool.tools}
+            if declared and declared != listed:
+                logger.warning(f"{server_name} server tools {sorted(listed)} differ from registry {sorted(declared)}")
+
+            state, error = "ready", None
+            logger.info(f"{server_name} server connected successfully with {len(pool.tools)} tools")
         except Exception as e:
-            logger.error(f"Failed to connect to Pipedrive server: {e}", exc_info=True)
-            raise
+            logger.error(f"Failed to connect to {server_name} server: {e}", exc_info=True)
+            state, error = "failed", str(e)
+
+        self.server_status[server_name] = {
+            "state": state,
+            "error": error,
+            "startup_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    async def _close_server(self, server_name: str, keep_tools: bool = False) -> None:
+        """Fecha o pool de um servidor e remove suas tools (exceto com keep_tools)"""
+        pool = self.servers.pop(server_name, None)
+
+        if not keep_tools:
+            for tool_name in [t for t, s in self.server_for_tool.items() if s == server_name]:
+                self.server_for_tool.pop(tool_name, None)
+                self.tools.pop(tool_name, None)
+
+        if not pool:
+            return
+
+        try:
+            await pool.close()
+            logger.info(f"Closed MCP server: {server_name}")
+        except Exception as e:
+            logger.error(f"Error closing server {server_name}: {e}")
+
+    def get_transport(self, server_name: str) -> str:
+        """Transporte do servidor: "subprocess" (isolado) ou "inprocess" """
+        return settings.mcp_transport_overrides.get(server_name, settings.mcp_transport)
+
+    def _create_connection(self, server_name: str) -> MCPConnection:
+        """Cria conexão para o servidor conforme o transporte configurado"""
+        spec = self.registry[server_name]
+
+        if self.get_transport(server_name) == "inprocess":
+            if not spec.module:
+                raise ValueError(f"MCP server '{server_name}' has no module for in-process transport")
+            return InProcessMCPConnection(server_name, spec.module)
+
+        server_params = StdioServerParameters(
+            command=spec.command,
+            args=spec.args,
+            env={
+                **os.environ,
+                "PYTHONPATH": str(PROJECT_ROOT),
+                **spec.env
+            }
+        )
+        return MCPConnection(server_name, server_params)
+
+    def _update_server_state(self, server_name: str) -> None:
+        """Recalcula o estado de um servidor a partir do pool"""
+        status = self.server_status.get(server_name)
+        pool = self.servers.get(server_name)
+        if status is None or pool is None:
+            return
+
+        alive = sum(1 for connection in pool.connections if connection.is_alive)
+        if alive == 0:
+            status["state"] = "down"
+        elif alive < pool.min_size:
+            status["state"] = "degraded"
+        else:
+            status["state"] = "ready"
+
+    @property
+    def is_ready(self) -> bool:
+        """True quando todos os servidores conhecidos estão prontos (ou parados por política)"""
+        return bool(self.server_status) and all(
+            status["state"] in ("ready", "idle", "disabled") for status in self.server_status.values()
+        )
+
+    def health(self) -> Dict[str, Any]:
+        """Estado de prontidão do orquestrador e de cada servidor"""
+        servers = {}
+        for name, status in self.server_status.items():
+            servers[name] = dict(status)
+            servers[name]["startup"] = self.registry[name].startup
+            servers[name]["transport"] = self.get_transport(name)
+            if name in self.servers:
+                servers[name]["pool"] = self.servers[name].stats()
+            servers[name]["supervisor"] = self.supervisor.stats(name)
+            servers[name]["breaker"] = self.guards[name].state
+
+        return {
+            "initialized": self.is_initialized,
+            "ready": self.is_ready,
+            "tools_count": len(self.tools),
+            "servers": servers
+        }
 
     async def get_tools(self) -> List[Dict[str, Any]]:
         """
@@ -255,6 +1078,10 @@ class MCPOrchestrator:
         """
         Executa uma tool específica
 
+        Resultados de tools read-only são servidos do cache enquanto
+        válidos, e chamadas read-only idênticas em andamento compartilham
+        a mesma execução; tools de escrita invalidam as entradas afetadas.
+
         Args:
             tool_name: Nome da tool
             tool_input: Parâmetros de entrada
@@ -264,12 +1091,50 @@ class MCPOrchestrator:
 
         Raises:
             ValueError: Se tool não existe
-            Exception: Se erro na execução
+
+        Erros e timeouts (ver `get_tool_timeout`) são devolvidos como dict
+        com a chave "error" para que o Claude possa lidar com eles.
         """
         if tool_name not in self.tools:
             raise ValueError(f"Tool '{tool_name}' not found. Available: {list(self.tools.keys())}")
 
+        use_cache = settings.tool_cache_enabled and self.cache.is_cacheable(tool_name)
+
+        if use_cache:
+            cached = self.cache.get(tool_name, tool_input)
+            if cached is not None:
+                logger.info(f"Tool {tool_name} served from cache")
+                return cached
+
+        leader = True
+        if settings.tool_coalescing_enabled and self.cache.is_read_only(tool_name):
+            # Chamadas idênticas em andamento compartilham uma única execução
+            key = f"tool:{tool_name}:{canonicalize_input(tool_name, tool_input)}"
+            leader = key not in self._inflight
+            if not leader:
+                self.coalesced_calls += 1
+                logger.info(f"Tool {tool_name} coalesced with in-flight call")
+
+            result = await self._single_flight(key, lambda: self._call_tool(tool_name, tool_input))
+            if not leader:
+                result = copy.deepcopy(result)
+        else:
+            result = await self._call_tool(tool_name, tool_input)
+
+        failed = isinstance(result, dict) and "error" in result
+
+        if use_cache and not failed and leader:
+            self.cache.set(tool_name, tool_input, result)
+        elif not use_cache:
+            # Escrita pode ter acontecido mesmo com erro/timeout
+            self.cache.invalidate_for_write(tool_name, tool_input)
+
+        return result
+
+    async def _call_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Any:
+        """Executa a tool no servidor (sem cache)"""
         logger.info(f"Executing tool: {tool_name} with input: {tool_input}")
+        timeout = self.get_tool_timeout(tool_name)
 
         try:
             # Busca o servidor responsável pela tool
@@ -277,71 +1142,130 @@ class MCPOrchestrator:
             if not server_name:
                 raise ValueError(f"No server registered for tool: {tool_name}")
 
-            server_info = self.servers.get(server_name)
-            if not server_info:
+            pool = self.servers.get(server_name)
+            if not pool and self.registry[server_name].startup == "lazy":
+                # Servidor lazy sobe na primeira chamada
+                await self.start_server(server_name)
+                pool = self.servers.get(server_name)
+            if not pool:
                 raise ValueError(f"Server '{server_name}' not connected")
 
-            session = server_info["session"]
-
-            # Executa via MCP
-            result = await session.call_tool(tool_name, tool_input)
+            # Executa via MCP na sessão menos carregada do pool, respeitando
+            # o limite de concorrência e o breaker do servidor
+            async with self.guards[server_name].slot():
+                result = await pool.call_tool(tool_name, tool_input, timeout=timeout)
+                parsed_result = self._parse_tool_result(tool_name, result)
+                # API externa fora do ar (5xx, auth, rede) conta no breaker;
+                # erro de negócio (dado inválido) não
+                if isinstance(parsed_result, dict) and parsed_result.get("error_type") == "upstream":
+                    raise UpstreamError(parsed_result)
+
+            if isinstance(parsed_result, dict) and "error" in parsed_result:
+                logger.error(f"Tool {tool_name} returned error: {parsed_result['error']}")
+                # Return error result instead of raising - let Claude handle it
+                return parsed_result
 
-            # Extrai o conteúdo da resposta
-            if result and hasattr(result, 'content') and len(result.content) > 0:
-                import json
-                text_content = result.content[0].text
+            logger.info(f"Tool {tool_name} executed successfully")
+            return parsed_result
+
+        except UpstreamError as e:
+            logger.error(f"Tool {tool_name} upstream error: {e}")
+            return e.result
+
+        except ServiceUnavailableError as e:
+            logger.warning(f"Tool {tool_name} rejected: {e}")
+            # Falha rápida para o modelo avisar o usuário na hora
+            return {
+                "error": f"Service '{e.server_name}' is temporarily unavailable",
+                "error_type": "service_unavailable",
+                "reason": e.reason,
+                "tool": tool_name,
+                "server": e.server_name,
+                "retry_after_seconds": round(e.retry_after, 1),
+                "retryable": True
+            }
 
-                # Try to parse JSON
-                try:
-                    parsed_result = json.loads(text_content)
-                except json.JSONDecodeError:
-                    # If not JSON, treat as plain text error
-                    logger.warning(f"Tool {tool_name} returned non-JSON: {text_content}")
-                    parsed_result = {"error": text_content, "tool": tool_name}
-
-                # Check if result contains error
-                if isinstance(parsed_result, dict) and "error" in parsed_result:
-                    logger.error(f"Tool {tool_name} returned error: {parsed_result['error']}")
-                    # Return error result instead of raising - let Claude handle it
-                    return parsed_result
-
-                logger.info(f"Tool {tool_name} executed successfully")
-                return parsed_result
-            else:
-                logger.warning(f"Tool {tool_name} returned empty result")
-                return {"status": "success", "result": None}
+        except TimeoutError:
+            logger.error(f"Tool {tool_name} timed out after {timeout}s")
+            # Resultado estruturado para o modelo degradar a resposta
+            result = {
+                "error": f"Tool '{tool_name}' did not respond within {timeout}s",
+                "error_type": "timeout",
+                "tool": tool_name,
+                "timeout_seconds": timeout,
+                "retryable": self.cache.is_read_only(tool_name)
+            }
+            if not result["retryable"]:
+                # Escrita pode ter sido aplicada: repetir duplicaria evento/lead
+                result["outcome"] = "unknown"
+                result["hint"] = (
+                    "The action may have been applied. Verify with a read tool "
+                    "(e.g. list_events or a search) before retrying."
+                )
+            return result
 
         except Exception as e:
             logger.error(f"Error executing tool {tool_name}: {e}", exc_info=True)
             # Return error as dict instead of raising - let Claude see the error
             return {"error": str(e), "tool": tool_name, "input": tool_input}
 
+    @staticmethod
+    def _parse_tool_result(tool_name: str, result: Any) -> Any:
+        """Conteúdo (JSON) da resposta da tool"""
+        if not (result and hasattr(result, 'content') and len(result.content) > 0):
+            logger.warning(f"Tool {tool_name} returned empty result")
+            return {"status": "success", "result": None}
+
+        import json
+        text_content = result.content[0].text
+        try:
+            return json.loads(text_content)
+        except json.JSONDecodeError:
+            # If not JSON, treat as plain text error
+            logger.warning(f"Tool {tool_name} returned non-JSON: {text_content}")
+            return {"error": text_content, "tool": tool_name}
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas de execução de tools"""
+        return {
+            "tool_cache": self.cache.stats(),
+            "coalescing": {
+                "coalesced_calls": self.coalesced_calls,
+                "in_flight_keys": sum(1 for key in self._inflight if key.startswith("tool:"))
+            },
+            "servers": {name: guard.stats() for name, guard in self.guards.items()}
+        }
+
+    def get_tool_timeout(self, tool_name: str) -> float:
+        """Timeout da tool em segundos (override por nome ou padrão global)"""
+        return float(settings.tool_timeout_overrides.get(tool_name, settings.tool_timeout_seconds))
+
 
     async def shutdown(self):
         """Encerra conexões com MCP servers"""
         logger.info("Shutting down MCP servers...")
 
-        for name, server_info in self.servers.items():
-            try:
-                session = server_info["session"]
-                stdio_context = server_info["stdio_context"]
-
-                # Fecha sessão
-                await session.__aexit__(None, None, None)
+        await self.supervisor.stop()
 
-                # Fecha stdio context
-                await stdio_context.__aexit__(None, None, None)
-
-                logger.info(f"Closed MCP server: {name}")
-            except Exception as e:
-                logger.error(f"Error closing server {name}: {e}")
+        for name in list(self.servers):
+            await self._close_server(name)
 
         self.servers.clear()
         self.tools.clear()
         self.server_for_tool.clear()
+        self.server_status.clear()
         self.is_initialized = False
         logger.info("MCP shutdown complete")
 
 
-# Singleton global
-mcp_orchestrator = MCPOrchestrator()
+# Singleton global: com mcp_gateway_url/mcp_gateway_uds, os workers usam
+# o gateway compartilhado (apps/gateway) em vez de subir os servidores
+if settings.mcp_gateway_url or settings.mcp_gateway_uds:
+    from apps.orchestrator.mcp_gateway_client import MCPGatewayClient
+
+    mcp_orchestrator = MCPGatewayClient(
+        base_url=settings.mcp_gateway_url or "http://mcp-gateway",
+        uds=settings.mcp_gateway_uds or None
+    )
+else:
+    mcp_orchestrator = MCPOrchestrator()
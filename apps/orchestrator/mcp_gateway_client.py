@@ -0,0 +1,188 @@
+"""
+MCP Gateway Client
+Cliente do gateway compartilhado (apps/gateway), com a mesma interface do
+MCPOrchestrator usada pelas rotas
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from apps.orchestrator.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MCPGatewayClient:
+    """
+    Cliente do MCP gateway
+
+    Todos os workers do uvicorn multiplexam suas chamadas num único
+    processo gateway (socket unix ou HTTP), em vez de cada worker subir
+    seus próprios subprocessos, clientes Chroma e credenciais Google.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        uds: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Args:
+            base_url: URL do gateway (ignorada como destino quando `uds` é usado)
+            uds: Caminho do socket unix do gateway
+            transport: Transporte httpx customizado (testes)
+        """
+        self.base_url = base_url
+        self.uds = uds
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self.server_for_tool: Dict[str, str] = {}
+        self.is_initialized = False
+
+        self.calls = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+        self._transport = transport or httpx.AsyncHTTPTransport(uds=uds, retries=2)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._init_task: Optional[asyncio.Task] = None
+
+        logger.info(f"MCP gateway client created for {uds or base_url}")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self._transport,
+                # Gateway aplica o timeout da tool; aqui só uma margem
+                timeout=httpx.Timeout(settings.tool_timeout_seconds + 5, connect=5)
+            )
+        return self._client
+
+    async def initialize(self):
+        """
+        Busca as tools no gateway (chamadas concorrentes compartilham a busca)
+
+        Raises:
+            httpx.HTTPError: Se o gateway não respondeu
+        """
+        if self.is_initialized:
+            return
+
+        if self._init_task is None or self._init_task.done():
+            self._init_task = asyncio.ensure_future(self._initialize())
+        await asyncio.shield(self._init_task)
+
+    async def _initialize(self):
+        try:
+            response = await self.client.get("/tools")
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self.last_error = str(e)
+            logger.error(f"MCP gateway unavailable: {e}")
+            raise
+
+        data = response.json()
+        self.tools = {tool["name"]: tool for tool in data["tools"]}
+        self.server_for_tool = data.get("server_for_tool", {})
+        self.is_initialized = True
+        self.last_error = None
+        logger.info(f"MCP gateway client initialized with {len(self.tools)} tools")
+
+    async def get_tools(self) -> List[Dict[str, Any]]:
+        """Lista de tools no formato MCP"""
+        if not self.is_initialized:
+            await self.initialize()
+
+        return list(self.tools.values())
+
+    async def execute_tool(self, tool_name: str, tool_input: Dict[str, Any]) -> Any:
+        """
+        Executa uma tool no gateway
+
+        Raises:
+            ValueError: Se tool não existe
+
+        Erros de rede viram dict com a chave "error", como no MCPOrchestrator.
+        """
+        if tool_name not in self.tools:
+            raise ValueError(f"Tool '{tool_name}' not found. Available: {list(self.tools.keys())}")
+
+        self.calls += 1
+        try:
+            response = await self.client.post(f"/tools/{tool_name}/call", json={"input": tool_input})
+            response.raise_for_status()
+            result = response.json()["result"]
+        except httpx.HTTPError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            logger.error(f"Error executing tool {tool_name} via gateway: {e}")
+            annotations = self.tools[tool_name].get("annotations") or {}
+            # Sem conexão a chamada não saiu; depois disso, escrita pode ter sido aplicada
+            retryable = isinstance(e, httpx.ConnectError) or bool(annotations.get("readOnlyHint"))
+            result = {
+                "error": f"MCP gateway error: {e}",
+                "error_type": "gateway",
+                "tool": tool_name,
+                "retryable": retryable
+            }
+            if not retryable:
+                result["outcome"] = "unknown"
+                result["hint"] = (
+                    "The action may have been applied. Verify with a read tool "
+                    "(e.g. list_events or a search) before retrying."
+                )
+            return result
+
+        self.last_error = None
+        return result
+
+    async def health(self) -> Dict[str, Any]:
+        """
+        Estado dos servidores, repassado do /health do gateway
+
+        Gateway fora do ar: não pronto, sem detalhe de servidores.
+        """
+        gateway = {"url": self.uds or self.base_url, "last_error": self.last_error}
+        try:
+            response = await self.client.get("/health", timeout=settings.mcp_probe_timeout_seconds)
+            # 503 também traz o estado (gateway ainda subindo)
+            mcp_health = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            gateway["reachable"] = False
+            gateway["health_error"] = str(e) or e.__class__.__name__
+            return {
+                "initialized": self.is_initialized,
+                "ready": False,
+                "tools_count": len(self.tools),
+                "servers": {},
+                "gateway": gateway
+            }
+
+        gateway["reachable"] = True
+        return {
+            "initialized": self.is_initialized and mcp_health.get("initialized", False),
+            "ready": self.is_initialized and mcp_health.get("ready", False),
+            "tools_count": len(self.tools),
+            "servers": mcp_health.get("servers", {}),
+            "gateway": gateway
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        """Métricas das chamadas ao gateway"""
+        return {
+            "gateway": {
+                "calls": self.calls,
+                "errors": self.errors
+            }
+        }
+
+    async def shutdown(self):
+        """Fecha as conexões com o gateway"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.is_initialized = False
@@ -0,0 +1,181 @@
+"""
+Prefetch especulativo de tools
+Dispara o check_availability provável junto com a primeira chamada ao
+Claude, a partir da data citada na mensagem do usuário
+"""
+import asyncio
+import logging
+import re
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from apps.orchestrator.tool_cache import canonicalize_input
+
+logger = logging.getLogger(__name__)
+
+ToolExecutor = Callable[..., Awaitable[Any]]
+
+# Brasil (UTC-3), mesmo fuso do system prompt
+TZ_BR = timezone(timedelta(hours=-3))
+
+WEEKDAYS = {"segunda": 0, "terca": 1, "quarta": 2, "quinta": 3, "sexta": 4, "sabado": 5, "domingo": 6}
+DATE_RE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+
+# Parâmetros com valor padrão: o modelo pode mandá-los explícitos
+TOOL_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "check_availability": {"start_hour": 9, "end_hour": 18},
+}
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas e sem acentos ("amanhã" -> "amanha")"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def resolve_date(message: str, today: date) -> Optional[date]:
+    """
+    Data citada na mensagem: hoje, amanhã, depois de amanhã, dia da
+    semana (próxima ocorrência) ou dd/mm[/aaaa]
+    """
+    text = _normalize(message)
+
+    match = DATE_RE.search(text)
+    if match:
+        day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+        year = int(year) + (2000 if year and len(year) == 2 else 0) if year else today.year
+        try:
+            resolved = date(year, month, day)
+        except ValueError:
+            return None
+        if not match.group(3) and resolved < today:
+            resolved = resolved.replace(year=today.year + 1)
+        return resolved
+
+    if "depois de amanha" in text:
+        return today + timedelta(days=2)
+    if re.search(r"\bamanha\b", text):
+        return today + timedelta(days=1)
+    if re.search(r"\bhoje\b", text):
+        return today
+
+    for name, weekday in WEEKDAYS.items():
+        if re.search(rf"\b{name}(-feira)?\b", text):
+            days = (weekday - today.weekday()) % 7 or 7
+            return today + timedelta(days=days)
+
+    return None
+
+
+def predict_tool_calls(message: str, now: Optional[datetime] = None) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Tools que o system prompt manda chamar para esta mensagem
+
+    Só tools com input determinístico: o file_search usa a query escrita
+    pelo modelo, que quase nunca coincide com a mensagem crua (o prefetch
+    custaria um embedding + busca sem acerto).
+
+    Returns:
+        Lista de (tool_name, tool_input)
+    """
+    now = now or datetime.now(TZ_BR)
+    calls = []
+
+    target = resolve_date(message, now.date())
+    if target:
+        calls.append(("check_availability", {"date": target.isoformat()}))
+
+    return calls
+
+
+def prefetch_key(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    """Chave de comparação (ignora parâmetros iguais ao padrão da tool)"""
+    defaults = TOOL_DEFAULTS.get(tool_name, {})
+    relevant = {k: v for k, v in (tool_input or {}).items() if defaults.get(k, object()) != v}
+    return f"{tool_name}:{canonicalize_input(tool_name, relevant)}"
+
+
+class PrefetchStats:
+    """Contadores globais do prefetch"""
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.unused = 0
+
+    def stats(self) -> Dict[str, Any]:
+        finished = self.hits + self.unused
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "unused": self.unused,
+            "hit_rate": round(self.hits / finished, 3) if finished else 0.0
+        }
+
+
+prefetch_stats = PrefetchStats()
+
+
+class ToolPrefetch:
+    """
+    Prefetch de um turno
+
+    Uso:
+        prefetch = ToolPrefetch(mcp_orchestrator.execute_tool, available_tools)
+        prefetch.start(request.message)
+        ... chat_with_tools(tool_executor=prefetch.executor) ...
+        prefetch.finish()
+    """
+
+    def __init__(self, tool_executor: ToolExecutor, available_tools=None, stats: PrefetchStats = prefetch_stats):
+        """
+        Args:
+            tool_executor: Executor real (MCPOrchestrator.execute_tool)
+            available_tools: Tools existentes (só essas são disparadas)
+            stats: Contadores (global por padrão)
+        """
+        self.tool_executor = tool_executor
+        self.available_tools = set(available_tools) if available_tools is not None else None
+        self.stats = stats
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._used: set = set()
+
+    def start(self, message: str, now: Optional[datetime] = None) -> List[str]:
+        """
+        Dispara as tools previstas em background
+
+        Returns:
+            Chaves das chamadas disparadas
+        """
+        for tool_name, tool_input in predict_tool_calls(message, now):
+            if self.available_tools is not None and tool_name not in self.available_tools:
+                continue
+            key = prefetch_key(tool_name, tool_input)
+            if key in self._tasks:
+                continue
+            self._tasks[key] = asyncio.create_task(self.tool_executor(tool_name=tool_name, tool_input=tool_input))
+            self.stats.started += 1
+            logger.info(f"Prefetching {tool_name} with {tool_input}")
+        return list(self._tasks)
+
+    async def executor(self, tool_name: str, tool_input: Dict[str, Any]) -> Any:
+        """Executor para o driver: usa o prefetch quando a chamada bate"""
+        key = prefetch_key(tool_name, tool_input)
+        task = self._tasks.get(key)
+        if task is not None and key not in self._used:
+            self._used.add(key)
+            self.stats.hits += 1
+            logger.info(f"Prefetch hit for {tool_name}")
+            # shield: cancelar o turno não cancela o resultado já compartilhado
+            return await asyncio.shield(task)
+        return await self.tool_executor(tool_name=tool_name, tool_input=tool_input)
+
+    def finish(self) -> None:
+        """Contabiliza prefetches não usados (seguem rodando e aquecem o cache de tools)"""
+        unused = [key for key in self._tasks if key not in self._used]
+        self.stats.unused += len(unused)
+        for key in unused:
+            task = self._tasks[key]
+            # Evita "exception was never retrieved" em prefetch descartado
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -1,14 +1,27 @@
 """
 Chat endpoint - Integração com WhatsApp backend
 """
+import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any, List
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, Optional, Dict, Any, List, Literal
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from packages.llm.anthropic_driver import AnthropicDriver
+from packages.llm.history import HistoryManager, llm_summarizer
 from packages.llm.prompts import ALABIA_SYSTEM_PROMPT
+from packages.llm.router import default_router
+from apps.orchestrator.admission import PRIORITY_NAMES, AdmissionController, AdmissionRejected, turn_priority
+from apps.orchestrator.answer_cache import SemanticAnswerCache, openai_embedder, prompt_version
+from apps.orchestrator.chat_jobs import ChatJobQueue, JobQueueFull
+from apps.orchestrator.conversation_store import create_conversation_store, normalize_messages, trim_messages
+from apps.orchestrator.idempotency import create_idempotency_store
 from apps.orchestrator.mcp_client import mcp_orchestrator
+from apps.orchestrator.prefetch import TZ_BR, ToolPrefetch, resolve_date
+from apps.orchestrator.settings import settings
+from apps.orchestrator.turn_coalescer import Coalesced, TurnCoalescer
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -16,6 +29,70 @@ router = APIRouter()
 # Inicializa driver (singleton)
 anthropic_driver = AnthropicDriver()
 
+# Roteamento de modelo: pequeno por padrão, escala para o grande
+model_router = default_router()
+
+# Cache semântico de respostas de FAQ (opt-in)
+answer_cache = SemanticAnswerCache(
+    embedder=openai_embedder(settings.openai_api_key, settings.openai_embedding_model),
+    prompt_version=prompt_version(ALABIA_SYSTEM_PROMPT, settings.anthropic_model, settings.anthropic_small_model),
+    threshold=settings.answer_cache_similarity_threshold,
+    ttl=settings.answer_cache_ttl_seconds,
+    max_entries=settings.answer_cache_max_entries
+)
+
+# Compactação do histórico (resumo atualizado em background)
+history_manager = HistoryManager(
+    summarizer=llm_summarizer(
+        anthropic_driver,
+        max_tokens=settings.history_summary_max_tokens,
+        model=settings.anthropic_small_model
+    ),
+    keep_turns=settings.history_keep_turns,
+    token_budget=settings.history_token_budget,
+    summary_token_budget=settings.history_summary_max_tokens
+)
+
+# Histórico por user_id no servidor (o backend só manda a mensagem nova);
+# mensagens cortadas pelo limite ficam no resumo do history_manager
+conversation_store = create_conversation_store(settings, on_trim=history_manager.fold)
+
+# Um turno por vez por user_id; rajadas de mensagens viram um turno
+turn_coalescer = TurnCoalescer(
+    merge=lambda requests: _merge_requests(requests),
+    debounce_seconds=settings.chat_debounce_seconds,
+    max_wait_seconds=settings.chat_debounce_max_wait_seconds,
+    max_messages=settings.chat_coalesce_max_messages,
+    immediate_first=settings.chat_debounce_immediate_first
+)
+
+# Limite global de turnos com o LLM (fila com prioridade e SLO)
+admission = AdmissionController(
+    max_concurrent=settings.admission_max_concurrent,
+    max_queue=settings.admission_max_queue,
+    queue_slo_seconds={
+        priority: settings.admission_queue_slo_seconds[name]
+        for priority, name in PRIORITY_NAMES.items()
+        if name in settings.admission_queue_slo_seconds
+    }
+)
+
+# Modo assíncrono: pool limitado de workers + entrega por webhook
+chat_jobs = ChatJobQueue(
+    workers=settings.chat_job_workers,
+    max_queue=settings.chat_job_max_queue,
+    callback_url=settings.chat_callback_url,
+    callback_secret=settings.chat_callback_secret,
+    callback_timeout=settings.chat_callback_timeout_seconds,
+    callback_max_attempts=settings.chat_callback_max_attempts,
+    callback_retry_base_seconds=settings.chat_callback_retry_base_seconds,
+    callback_retry_max_seconds=settings.chat_callback_retry_max_seconds,
+    retention_seconds=settings.chat_job_retention_seconds
+)
+
+# Reentregas do webhook (mesmo Idempotency-Key/message_id) não repetem o turno
+idempotency_store = create_idempotency_store(settings)
+
 
 # Schemas
 class ChatContext(BaseModel):
@@ -23,6 +100,7 @@ class ChatContext(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
     phone: Optional[str] = None
+    # Legado: se enviado, substitui o histórico guardado no servidor
     previous_messages: Optional[List[Dict[str, str]]] = Field(default_factory=list)
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
@@ -32,6 +110,7 @@ class ChatRequest(BaseModel):
     user_id: str = Field(..., description="ID único do usuário (ex: número WhatsApp)")
     message: str = Field(..., description="Mensagem do usuário")
     context: Optional[ChatContext] = Field(default=None, description="Contexto adicional")
+    message_id: Optional[str] = Field(default=None, description="ID da mensagem no provedor WhatsApp (chave de idempotência)")
 
     model_config = {
         "json_schema_extra": {
@@ -55,6 +134,7 @@ class ToolAction(BaseModel):
     status: str  # "success" | "error"
     result: Any
     error: Optional[str] = None
+    duration_ms: Optional[float] = None
 
 
 class ChatResponse(BaseModel):
@@ -65,65 +145,400 @@ class ChatResponse(BaseModel):
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+@router.post("/chat", response_model=ChatResponse, responses={202: {"description": "Job criado (mode=async)"}})
+async def chat(
+    request: ChatRequest,
+    mode: Literal["sync", "async"] = Query("sync", description="async: 202 + job_id, resultado via webhook/polling"),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
     """
     Endpoint principal de chat
 
     Recebe mensagem do backend WhatsApp, processa com Claude + MCP tools,
     e retorna resposta + ações executadas.
+
+    Com mode=async, volta 202 com o job_id na hora; o ChatResponse é
+    entregue em settings.chat_callback_url e em GET /chat/jobs/{job_id}.
+
+    Turnos do mesmo user_id rodam um por vez; mensagens que chegam durante
+    um turno (mais settings.chat_debounce_seconds) viram um turno só. A resposta vai
+    no request da última mensagem; os anteriores voltam com `response`
+    vazio e metadata["coalesced"] (o backend não deve enviá-los).
+
+    Com header Idempotency-Key (ou message_id no corpo), reentregas da
+    mesma mensagem não executam o turno de novo: esperam a execução em
+    andamento ou recebem o resultado guardado.
     """
     logger.info(f"Chat request from user {request.user_id}: {request.message[:50]}...")
 
+    if mode == "async":
+        async def run_job() -> Dict[str, Any]:
+            # Job já foi aceito: sobrecarga só adia o turno
+            for attempt in range(1, settings.chat_job_admission_max_attempts + 1):
+                try:
+                    response = await _submit_turn(request)
+                    return response.model_dump(mode="json")
+                except AdmissionRejected as e:
+                    if attempt == settings.chat_job_admission_max_attempts:
+                        raise
+                    await asyncio.sleep(e.retry_after)
+
+        async def submit_job() -> str:
+            return chat_jobs.submit(request.user_id, run_job).id
+
+        try:
+            job_id, replay = await _idempotent(request, idempotency_key, mode, submit_job)
+        except JobQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+        job = chat_jobs.get(job_id)
+        content = {
+            "job_id": job_id,
+            "status": job.status if job else "expired",
+            "status_url": f"/api/chat/jobs/{job_id}"
+        }
+        if replay:
+            content["idempotent_replay"] = replay
+        return JSONResponse(status_code=202, content=content)
+
+    async def run_turn() -> Dict[str, Any]:
+        # JSON: o resultado pode ser guardado no store compartilhado
+        response = await _submit_turn(request)
+        return response.model_dump(mode="json")
+
     try:
-        # 1. Inicializa MCP orchestrator (se necessário)
-        if not mcp_orchestrator.is_initialized:
-            await mcp_orchestrator.initialize()
-
-        # 2. Get available tools
-        mcp_tools = await mcp_orchestrator.get_tools()
-        anthropic_tools = [
-            AnthropicDriver.format_tool_for_anthropic(tool)
-            for tool in mcp_tools
-        ]
-
-        # 3. Build system prompt
-        system_prompt = _build_system_prompt(request.context)
-
-        # 4. Build conversation history from context
-        conversation_history = []
-        if request.context and request.context.previous_messages:
-            conversation_history = _build_conversation_history(request.context.previous_messages)
-
-        # 5. Process with Claude + MCP loop
-        result = await anthropic_driver.chat_with_tools(
-            user_message=request.message,
-            system=system_prompt,
-            tools=anthropic_tools,
-            tool_executor=mcp_orchestrator.execute_tool,
-            conversation_history=conversation_history
+        data, replay = await _idempotent(request, idempotency_key, mode, run_turn)
+        response = ChatResponse(**data)
+        if replay:
+            response = response.model_copy(update={"metadata": {**response.metadata, "idempotent_replay": replay}})
+        return response
+
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": f"{e.retry_after:.0f}"})
+
+    except Exception as e:
+        logger.error(f"Error processing chat: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing message: {str(e)}"
         )
 
-        # 6. Format response
+
+@router.get("/chat/jobs/{job_id}")
+async def chat_job(job_id: str):
+    """Estado de um job do modo assíncrono (result = ChatResponse)"""
+    job = chat_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
+async def _idempotent(request: ChatRequest, idempotency_key: Optional[str], mode: str, factory) -> tuple:
+    """
+    Executa `factory` uma vez por chave de idempotência (se houver)
+
+    Returns:
+        (resultado, None | "in_flight" | "completed")
+    """
+    key = idempotency_key or request.message_id
+    if not key:
+        return await factory(), None
+    return await idempotency_store.run(f"{mode}:{request.user_id}:{key}", factory)
+
+
+async def _submit_turn(request: ChatRequest) -> ChatResponse:
+    """Turno pelo coalescer (serializado por user_id, rajadas juntas)"""
+    result = await turn_coalescer.submit(request.user_id, request, _run_chat_turn)
+    if isinstance(result, Coalesced):
         return ChatResponse(
-            response=result["response"],
-            actions=[
-                ToolAction(**action) for action in result["actions"]
-            ],
-            needs_followup=_check_needs_followup(result["response"]),
+            response="",
             metadata={
                 "user_id": request.user_id,
-                "tools_used": [a["tool"] for a in result["actions"]],
-                "iterations": len(result["actions"]) + 1
+                "coalesced": {"messages": result.messages, "position": result.position}
             }
         )
+    return result
+
+
+async def _run_chat_turn(request: ChatRequest) -> ChatResponse:
+    """Um turno completo (histórico, Claude + MCP loop, store)"""
+    prefetch = None
+    try:
+        history = await _load_history(request)
+
+        # 0. Pergunta de FAQ já respondida: pula o LLM
+        cached, cache_embedding = await _lookup_cached_answer(request, history)
+        if cached:
+            # Resposta do cache também entra no histórico (o próximo turno depende dela)
+            await _save_turn(request, history, {"response": cached.response})
+            return cached
+
+        # Vaga global para o loop com o LLM (fila por prioridade)
+        async with admission.slot(_turn_priority(request, history)):
+            turn, prefetch = await _prepare_turn(request, history)
+
+            # 5. Process with Claude + MCP loop
+            result = await anthropic_driver.chat_with_tools(
+                user_message=request.message,
+                **turn
+            )
+
+            # 6. Guarda o turno e atualiza o resumo fora do caminho do request
+            await _save_turn(request, history, result)
+        _store_cached_answer(request, cache_embedding, result)
+
+        # 7. Format response
+        return _build_chat_response(request, result)
+
+    finally:
+        if prefetch:
+            prefetch.finish()
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    Chat em streaming (NDJSON, um evento JSON por linha)
+
+    Eventos: "text_delta", "tool_started", "tool_finished" e, por último,
+    "done" com o mesmo formato do ChatResponse (ou "error"). Espera a vez
+    do usuário como o /chat, mas sem debounce.
+    """
+    logger.info(f"Chat stream request from user {request.user_id}: {request.message[:50]}...")
+
+    async def events() -> AsyncIterator[str]:
+        prefetch = None
+        try:
+            async with turn_coalescer.turn(request.user_id):
+                history = await _load_history(request)
+                cached, cache_embedding = await _lookup_cached_answer(request, history)
+                if cached:
+                    await _save_turn(request, history, {"response": cached.response})
+                    yield json.dumps({"type": "text_delta", "text": cached.response}, ensure_ascii=False) + "\n"
+                    yield json.dumps({"type": "done", **cached.model_dump(mode="json")}, ensure_ascii=False, default=str) + "\n"
+                    return
+
+                async with admission.slot(_turn_priority(request, history)):
+                    turn, prefetch = await _prepare_turn(request, history)
+                    async for event in anthropic_driver.stream_with_tools(
+                        user_message=request.message,
+                        **turn
+                    ):
+                        if event["type"] == "done":
+                            await _save_turn(request, history, event)
+                            _store_cached_answer(request, cache_embedding, event)
+                            summary = _build_chat_response(request, event).model_dump(mode="json")
+                            event = {"type": "done", **summary}
+                        yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+        except AdmissionRejected as e:
+            yield json.dumps({"type": "error", "error": str(e), "retry_after_seconds": e.retry_after}) + "\n"
+
+        except Exception as e:
+            logger.error(f"Error processing chat stream: {e}", exc_info=True)
+            yield json.dumps({"type": "error", "error": f"Error processing message: {str(e)}"}) + "\n"
+
+        finally:
+            if prefetch:
+                prefetch.finish()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _turn_priority(request: ChatRequest, history: List[Dict[str, Any]]) -> int:
+    return turn_priority(history, request.message, settings.booking_tools)
+
+
+def _merge_requests(requests: List[ChatRequest]) -> ChatRequest:
+    """Rajada de mensagens -> um request (mensagens em linhas, contexto mais recente)"""
+    if len(requests) == 1:
+        return requests[0]
+    context = next((r.context for r in reversed(requests) if r.context), None)
+    return ChatRequest(
+        user_id=requests[-1].user_id,
+        message="\n".join(r.message for r in requests),
+        context=context
+    )
+
+
+@router.delete("/chat/conversations/{user_id}")
+async def clear_conversation(user_id: str):
+    """Apaga o histórico guardado de um usuário (ex: nova conversa)"""
+    await conversation_store.clear(user_id)
+    history_manager.forget(user_id)
+    return {"user_id": user_id, "cleared": True}
+
+
+def _is_answer_cacheable(request: ChatRequest, history: List[Dict[str, Any]]) -> bool:
+    """
+    Só turnos anônimos e sem contexto: sem dados do cliente, sem
+    histórico e sem datas (respostas dependentes do dia)
+    """
+    if not settings.answer_cache_enabled or history:
+        return False
+
+    context = request.context
+    if context and (context.name or context.email or context.phone or context.previous_messages):
+        return False
+
+    from datetime import datetime
 
+    return resolve_date(request.message, datetime.now(TZ_BR).date()) is None
+
+
+async def _lookup_cached_answer(request: ChatRequest, history: List[Dict[str, Any]]) -> tuple:
+    """
+    Returns:
+        (ChatResponse do cache ou None, embedding da mensagem ou None)
+    """
+    if not _is_answer_cacheable(request, history):
+        return None, None
+
+    embedding = await answer_cache.embed(request.message)
+    if embedding is None:
+        return None, None
+
+    found = answer_cache.lookup(embedding)
+    if not found:
+        return None, embedding
+
+    entry, similarity = found
+    logger.info(f"Answer cache hit for user {request.user_id} (similarity {similarity:.3f})")
+    return ChatResponse(
+        response=entry.response["response"],
+        actions=[],
+        needs_followup=_check_needs_followup(entry.response["response"]),
+        metadata={
+            "user_id": request.user_id,
+            "tools_used": [],
+            "iterations": 0,
+            "answer_cache": {
+                "hit": True,
+                "similarity": round(similarity, 4),
+                "age_seconds": round(entry.age_seconds, 1),
+                "cached_message": entry.message
+            }
+        }
+    ), None
+
+
+def _store_cached_answer(request: ChatRequest, embedding: Optional[List[float]], result: Dict[str, Any]) -> None:
+    """Guarda a resposta se o turno só usou tools de conhecimento estático"""
+    if embedding is None or not result["response"]:
+        return
+
+    for action in result["actions"]:
+        if action["tool"] not in settings.answer_cache_tools or action["status"] != "success":
+            return
+        if isinstance(action["result"], dict) and "error" in action["result"]:
+            return
+
+    answer_cache.store(request.message, embedding, {"response": result["response"]})
+
+
+async def _load_history(request: ChatRequest) -> List[Dict[str, Any]]:
+    """
+    Histórico da conversa: previous_messages (legado), se enviado;
+    senão, o guardado no conversation_store
+    """
+    if request.context and request.context.previous_messages:
+        return _build_conversation_history(request.context.previous_messages)
+    return await conversation_store.load(request.user_id)
+
+
+async def _prepare_turn(request: ChatRequest, history: List[Dict[str, Any]]) -> tuple:
+    """
+    Tools, system prompt e histórico para o loop do Claude
+
+    Returns:
+        (kwargs do chat_with_tools/stream_with_tools, prefetch do turno ou None)
+    """
+    # 1. Inicializa MCP orchestrator (se necessário; chamadas concorrentes
+    #    compartilham a mesma inicialização)
+    await mcp_orchestrator.initialize()
+
+    # 2. Get available tools
+    mcp_tools = await mcp_orchestrator.get_tools()
+    # Ordem estável: a lista de tools faz parte do prefixo cacheado
+    anthropic_tools = [
+        AnthropicDriver.format_tool_for_anthropic(tool)
+        for tool in sorted(mcp_tools, key=lambda tool: tool["name"])
+    ]
+
+    # Prefetch especulativo: tools prováveis já rodam enquanto o Claude pensa
+    prefetch = None
+    tool_executor = mcp_orchestrator.execute_tool
+    if settings.tool_prefetch_enabled:
+        prefetch = ToolPrefetch(mcp_orchestrator.execute_tool, available_tools=[tool["name"] for tool in mcp_tools])
+        if prefetch.start(request.message):
+            tool_executor = prefetch.executor
+
+    # 3. Histórico compactado: últimos turnos literais + resumo dos
+    #    anteriores, dentro do orçamento
+    compact = history_manager.compact(request.user_id, history)
+    if compact.dropped:
+        logger.info(f"History for {request.user_id} compacted: {compact.dropped} messages summarized, ~{compact.tokens} tokens")
+
+    # 4. Build system prompt
+    system_prompt = _build_system_prompt(request.context, history_summary=compact.summary)
+
+    return {
+        "system": system_prompt,
+        "tools": anthropic_tools,
+        "conversation_history": compact.messages,
+        "ordered_tools": _side_effect_tools(mcp_tools),
+        "tool_executor": tool_executor,
+        "tier": model_router.initial_tier(request.message, history),
+        "router": model_router
+    }, prefetch
+
+
+async def _save_turn(request: ChatRequest, history: List[Dict[str, Any]], result: Dict[str, Any]) -> None:
+    """Guarda o turno no conversation_store e agenda o resumo do histórico"""
+    turn_messages = normalize_messages(result.get("messages") or [
+        {"role": "user", "content": request.message},
+        {"role": "assistant", "content": result["response"]}
+    ])
+    try:
+        await conversation_store.append(request.user_id, turn_messages)
     except Exception as e:
-        logger.error(f"Error processing chat: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing message: {str(e)}"
-        )
+        # Falha no store não derruba a resposta já gerada
+        logger.error(f"Conversation store append failed for {request.user_id}: {e}", exc_info=True)
+
+    # Mesmo corte que o store acabou de fazer (o resumo cobre o que sobrou)
+    history_manager.schedule_refresh(
+        request.user_id,
+        trim_messages(history + turn_messages, settings.conversation_store_max_messages)
+    )
+
+
+def _build_chat_response(request: ChatRequest, result: Dict[str, Any]) -> ChatResponse:
+    """Monta o ChatResponse a partir do resultado do loop de tools"""
+    return ChatResponse(
+        response=result["response"],
+        actions=[
+            ToolAction(**action) for action in result["actions"]
+        ],
+        needs_followup=_check_needs_followup(result["response"]),
+        metadata={
+            "user_id": request.user_id,
+            "tools_used": [a["tool"] for a in result["actions"]],
+            "iterations": len(result["actions"]) + 1,
+            "usage": result.get("usage", {}),
+            "model_tier": result.get("model_tier"),
+            "model": result.get("model"),
+            "escalation": result.get("escalation")
+        }
+    )
+
+
+def _side_effect_tools(mcp_tools: List[Dict[str, Any]]) -> set:
+    """Tools sem readOnlyHint (criam/alteram dados) executam em ordem"""
+    return {
+        tool["name"]
+        for tool in mcp_tools
+        if not (tool.get("annotations") or {}).get("readOnlyHint")
+    }
 
 
 def _build_conversation_history(previous_messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
@@ -148,27 +563,34 @@ def _build_conversation_history(previous_messages: List[Dict[str, str]]) -> List
     return history
 
 
-def _build_system_prompt(context: Optional[ChatContext]) -> str:
-    """Constrói system prompt para Claude"""
-    from datetime import datetime, timezone, timedelta
+def _build_system_prompt(context: Optional[ChatContext], history_summary: str = "") -> List[Dict[str, Any]]:
+    """
+    Constrói system prompt para Claude
 
-    # Usa o prompt otimizado do arquivo prompts.py
-    base_prompt = ALABIA_SYSTEM_PROMPT
+    Args:
+        context: Contexto do cliente
+        history_summary: Resumo das mensagens antigas (histórico compactado)
+
+    Returns:
+        Dois blocos de texto: o prompt estático (prefixo estável, cacheado
+        pelo driver) e o contexto dinâmico (data/hora e dados do cliente)
+    """
+    from datetime import datetime, timezone, timedelta
 
     # Adiciona data/hora atual (timezone Brasil = UTC-3)
     tz_br = timezone(timedelta(hours=-3))
     now = datetime.now(tz_br)
 
-    base_prompt += f"\n\n## 📅 CONTEXTO TEMPORAL\n"
-    base_prompt += f"- **Data/Hora Atual:** {now.strftime('%Y-%m-%d %H:%M')} (Brasil)\n"
-    base_prompt += f"- **Dia da Semana:** {now.strftime('%A')}\n"
-    base_prompt += f"- **É fim de semana:** {'Sim' if now.weekday() >= 5 else 'Não'}\n"
-    base_prompt += f"\n**Use esta informação para calcular 'hoje', 'amanhã', etc.**\n"
+    context_prompt = f"## 📅 CONTEXTO TEMPORAL\n"
+    context_prompt += f"- **Data/Hora Atual:** {now.strftime('%Y-%m-%d %H:%M')} (Brasil)\n"
+    context_prompt += f"- **Dia da Semana:** {now.strftime('%A')}\n"
+    context_prompt += f"- **É fim de semana:** {'Sim' if now.weekday() >= 5 else 'Não'}\n"
+    context_prompt += f"\n**Use esta informação para calcular 'hoje', 'amanhã', etc.**\n"
 
     # Se for fora do horário comercial, avise
     if now.hour < 8 or now.hour >= 18 or now.weekday() >= 5:
-        base_prompt += f"\n⚠️ **IMPORTANTE:** Estamos fora do horário comercial (Seg-Sex 8h-18h).\n"
-        base_prompt += f"Ofereça agendar para próximo dia útil.\n"
+        context_prompt += f"\n⚠️ **IMPORTANTE:** Estamos fora do horário comercial (Seg-Sex 8h-18h).\n"
+        context_prompt += f"Ofereça agendar para próximo dia útil.\n"
 
     # Adiciona contexto do usuário se disponível
     if context:
@@ -181,13 +603,20 @@ def _build_system_prompt(context: Optional[ChatContext]) -> str:
             user_info.append(f"**Telefone/WhatsApp: {context.phone}** ← USE no person_phone do create_lead")
 
         if user_info:
-            base_prompt += f"\n\n## 👤 INFORMAÇÕES DO CLIENTE\n" + "\n".join(f"- {info}" for info in user_info)
-            base_prompt += "\n\n**⚠️ IMPORTANTE:**"
-            base_prompt += "\n- Quando o cliente disser 'o mesmo email', use o email acima"
-            base_prompt += "\n- SEMPRE use o telefone acima no campo person_phone do create_lead"
-            base_prompt += "\n- NUNCA use telefone como email!"
-
-    return base_prompt
+            context_prompt += f"\n\n## 👤 INFORMAÇÕES DO CLIENTE\n" + "\n".join(f"- {info}" for info in user_info)
+            context_prompt += "\n\n**⚠️ IMPORTANTE:**"
+            context_prompt += "\n- Quando o cliente disser 'o mesmo email', use o email acima"
+            context_prompt += "\n- SEMPRE use o telefone acima no campo person_phone do create_lead"
+            context_prompt += "\n- NUNCA use telefone como email!"
+
+    if history_summary:
+        context_prompt += f"\n\n## 🧾 RESUMO DA CONVERSA ANTERIOR\n{history_summary}\n"
+
+    # Usa o prompt otimizado do arquivo prompts.py como prefixo estático
+    return [
+        {"type": "text", "text": ALABIA_SYSTEM_PROMPT},
+        {"type": "text", "text": context_prompt}
+    ]
 
 
 def _check_needs_followup(response: str) -> bool:
@@ -0,0 +1,197 @@
+"""
+Server Guard - Limite de concorrência e circuit breaker por MCP server
+Protege as conversas quando Google Calendar ou Pipedrive ficam lentos
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceUnavailableError(Exception):
+    """Servidor não aceita a chamada agora (breaker aberto ou fila cheia)"""
+
+    def __init__(self, server_name: str, reason: str, retry_after: float):
+        self.server_name = server_name
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Service '{server_name}' unavailable ({reason})")
+
+
+class UpstreamError(Exception):
+    """
+    Tool devolveu erro da API externa (error_type "upstream" no resultado)
+
+    Levantada dentro do `slot()` para o breaker contar a falha; quem chama
+    devolve `result` ao modelo como qualquer outro erro de tool.
+    """
+
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+        super().__init__(str(result.get("error")))
+
+
+class ServerGuard:
+    """
+    Limite de concorrência com fila limitada + circuit breaker
+
+    Estados do breaker: "closed" (normal), "open" (falha rápida) e
+    "half_open" (deixa uma chamada de teste passar após o reset).
+    Timeouts, exceções e erros da API externa (UpstreamError) contam como
+    falha; erros de negócio retornados pela tool não.
+    """
+
+    def __init__(
+        self,
+        server_name: str,
+        max_concurrency: int = 8,
+        max_queue: int = 32,
+        queue_timeout: float = 10.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0
+    ):
+        """
+        Args:
+            server_name: Nome do servidor
+            max_concurrency: Chamadas simultâneas permitidas
+            max_queue: Chamadas aguardando vaga (além disso, rejeita)
+            queue_timeout: Espera máxima por uma vaga em segundos
+            failure_threshold: Falhas consecutivas que abrem o breaker
+            reset_seconds: Tempo com o breaker aberto antes do teste
+        """
+        self.server_name = server_name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        self.rejected = 0
+        self.opens = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _check_breaker(self) -> bool:
+        """
+        Returns:
+            True se a chamada é o teste do half-open
+
+        Raises:
+            ServiceUnavailableError: Se o breaker está aberto
+        """
+        if self.state == "open":
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise ServiceUnavailableError(self.server_name, "circuit_open", remaining)
+            self.state = "half_open"
+            logger.info(f"Circuit for {self.server_name} half-open, probing")
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise ServiceUnavailableError(self.server_name, "circuit_open", self.reset_seconds)
+            self._probe_in_flight = True
+            return True
+
+        return False
+
+    async def _acquire(self) -> None:
+        if not self._semaphore.locked():
+            # Vaga livre: adquire sem esperar
+            await self._semaphore.acquire()
+            self.wait_count += 1
+            return
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise ServiceUnavailableError(self.server_name, "queue_full", self.queue_timeout)
+
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ServiceUnavailableError(self.server_name, "queue_timeout", self.queue_timeout) from None
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - started
+        self.wait_count += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Reserva uma vaga no servidor e registra o resultado no breaker
+
+        Raises:
+            ServiceUnavailableError: Breaker aberto, fila cheia ou espera esgotada
+        """
+        probe = self._check_breaker()
+        try:
+            await self._acquire()
+            self.in_flight += 1
+            try:
+                yield
+            except Exception:
+                self.record_failure()
+                raise
+            else:
+                self.record_success()
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+        finally:
+            if probe:
+                self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            logger.info(f"Circuit for {self.server_name} closed")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(
+                    f"Circuit for {self.server_name} opened after {self.consecutive_failures} consecutive failures"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """Fila, espera e estado do breaker"""
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "avg_wait_ms": round(self.wait_total / self.wait_count * 1000, 1) if self.wait_count else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "rejected": self.rejected,
+            "breaker": {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opens": self.opens
+            }
+        }
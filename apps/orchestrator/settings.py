@@ -3,7 +3,7 @@ Configurações do Alabia Conductor
 Carrega variáveis de ambiente e valida configurações
 """
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List, Literal
 
 
 class Settings(BaseSettings):
@@ -22,6 +22,32 @@ class Settings(BaseSettings):
     anthropic_max_tokens: int = 4096
     anthropic_temperature: float = 0.7
 
+    # Roteamento por tier: modelo pequeno primeiro, escala para o anthropic_model
+    model_routing_enabled: bool = True
+    anthropic_small_model: str = "claude-haiku-4-5-20251001"
+    anthropic_small_max_tokens: int = 1024
+    anthropic_small_temperature: float = 0.5
+    # Tools de agendamento/CRM: pedidas pelo modelo pequeno, escalam
+    model_escalation_tools: List[str] = ["create_event", "cancel_event", "create_lead"]
+    # tool_use destas tools no histórico = lead no meio de um agendamento
+    # (turno começa no modelo grande e tem prioridade na admissão)
+    booking_tools: List[str] = [
+        "check_availability", "list_events", "create_event", "cancel_event", "create_lead"
+    ]
+
+    # Prompt caching
+    anthropic_prompt_caching: bool = True  # cache_control no system prompt, tools e histórico
+
+    # Retry (429/529/5xx/conexão) com backoff exponencial + jitter
+    anthropic_max_retries: int = 3
+    anthropic_retry_base_seconds: float = 0.5
+    anthropic_retry_max_seconds: float = 20.0  # teto, inclusive para retry-after
+
+    # Hedged requests: segunda chamada se a primeira passar do p95
+    anthropic_hedge_enabled: bool = False  # dobra o custo das chamadas lentas
+    anthropic_hedge_min_samples: int = 20  # amostras antes de confiar no p95
+    anthropic_hedge_min_delay_seconds: float = 2.0
+
     # Google Calendar
     google_calendar_credentials_json: str = "./secrets/google-credentials.json"
     google_calendar_id: str
@@ -51,7 +77,138 @@ class Settings(BaseSettings):
 
     # Limites e timeouts
     max_tool_iterations: int = 10
+    tool_max_parallel: int = 4  # tools de um mesmo turno executadas em paralelo
+    tool_prefetch_enabled: bool = True  # check_availability especulativo (data citada na mensagem)
+    # Orçamento (tokens) do resultado de tool devolvido ao Claude
+    tool_result_token_budget: int = 800
+    tool_result_token_budgets: Dict[str, int] = {
+        "file_search": 1500,
+        "list_events": 1000,
+    }
     tool_timeout_seconds: int = 60
+    # Timeout por tool (segundos); JSON no .env, ex: {"file_search": 10}
+    tool_timeout_overrides: Dict[str, float] = {
+        "file_search": 15,
+        "get_collection_stats": 5,
+        "check_availability": 15,
+        "list_events": 15,
+        "create_event": 25,
+        "cancel_event": 20,
+        "create_lead": 25,
+    }
+
+    # Cache de resultados de tools read-only (readOnlyHint)
+    tool_cache_enabled: bool = True
+    tool_cache_max_entries: int = 1024
+    tool_cache_default_ttl_seconds: float = 60
+    tool_cache_ttl_overrides: Dict[str, float] = {
+        "check_availability": 30,
+        "list_events": 30,
+        "file_search": 600,
+        "get_collection_stats": 300,
+    }
+    tool_coalescing_enabled: bool = True  # chamadas read-only idênticas compartilham execução
+
+    # Transporte dos MCP servers: "subprocess" (isolado, stdio) ou
+    # "inprocess" (módulo carregado no processo, streams em memória)
+    mcp_transport: Literal["subprocess", "inprocess"] = "subprocess"
+    mcp_transport_overrides: Dict[str, Literal["subprocess", "inprocess"]] = {}  # server_name -> transporte
+
+    # Política de startup por servidor (sobrescreve o registro em mcp_client):
+    # "eager" | "lazy" | "disabled"; ex: {"pipedrive": "eager"}
+    mcp_server_startup: Dict[str, Literal["eager", "lazy", "disabled"]] = {}
+    mcp_lazy_idle_seconds: float = 600  # servidor lazy ocioso é parado
+
+    # MCP gateway compartilhado (apps/gateway). Com URL ou socket definido,
+    # os workers do orquestrador não sobem MCP servers próprios
+    mcp_gateway_url: str = ""  # ex: http://127.0.0.1:8100
+    mcp_gateway_uds: str = ""  # ex: /tmp/alabia-mcp-gateway.sock
+    mcp_gateway_host: str = "127.0.0.1"
+    mcp_gateway_port: int = 8100
+
+    # Pools de sessões MCP (por servidor)
+    mcp_pool_min_size: int = 1
+    mcp_pool_max_size: int = 4
+    mcp_pool_scale_up_queue_depth: int = 2  # chamadas por sessão que disparam nova sessão
+    mcp_pool_idle_seconds: int = 300  # sessão extra ociosa por mais tempo é encerrada
+    mcp_pool_scale_interval_seconds: int = 30
+
+    # Supervisor dos MCP servers
+    mcp_probe_interval_seconds: int = 15
+    mcp_probe_timeout_seconds: float = 5.0
+    mcp_restart_backoff_base_seconds: float = 1.0
+    mcp_restart_backoff_max_seconds: float = 60.0
+    mcp_warm_standby: bool = True  # sessão pré-aquecida para failover
+
+    # Limites por servidor e circuit breaker
+    mcp_server_max_concurrency: int = 8
+    mcp_server_max_concurrency_overrides: Dict[str, int] = {
+        "calendar": 4,
+        "pipedrive": 4,
+    }
+    mcp_server_max_queue: int = 32  # chamadas aguardando vaga; além disso, falha rápida
+    mcp_server_queue_timeout_seconds: float = 10.0
+    mcp_breaker_failure_threshold: int = 5  # falhas/timeouts consecutivos que abrem o breaker
+    mcp_breaker_reset_seconds: float = 30.0
+
+    # Histórico de conversa (compactação por orçamento de tokens)
+    history_keep_turns: int = 6  # turnos mais recentes enviados literais
+    history_token_budget: int = 3000
+    history_summary_max_tokens: int = 400
+
+    # Cache semântico de respostas (FAQ); opt-in
+    answer_cache_enabled: bool = False
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_max_entries: int = 500
+    # Só turnos que usaram apenas estas tools (conhecimento estático) são guardados
+    answer_cache_tools: List[str] = ["file_search", "get_collection_stats"]
+
+    # Store de conversas por user_id: "memory" (LRU), "sqlite" (disco local)
+    # ou "tiered" (LRU na frente do SQLite)
+    conversation_store_backend: Literal["memory", "sqlite", "tiered"] = "tiered"
+    conversation_store_path: str = "./data/conversations.db"
+    conversation_store_max_users: int = 5000  # conversas mantidas em memória
+    conversation_store_max_messages: int = 100  # mensagens guardadas por conversa
+
+    # Turnos por usuário: um por vez; mensagens dentro da janela de debounce
+    # (ou que chegam durante um turno) viram um só turno
+    chat_debounce_seconds: float = 1.0  # silêncio que fecha a rajada (0 = só serializa)
+    chat_debounce_max_wait_seconds: float = 5.0  # espera máxima desde a primeira mensagem
+    chat_coalesce_max_messages: int = 10
+    # Primeira mensagem sem turno em andamento roda sem esperar (rajada vira dois turnos)
+    chat_debounce_immediate_first: bool = False
+
+    # Modo assíncrono (POST /api/chat?mode=async): 202 + job processado em
+    # background, resultado via polling e webhook
+    chat_job_workers: int = 4
+    chat_job_max_queue: int = 100  # além disso, 503
+    chat_job_retention_seconds: int = 3600
+    chat_job_admission_max_attempts: int = 5  # turno recusado por sobrecarga espera o Retry-After e tenta de novo
+    chat_callback_url: str = ""  # recebe o job terminado ("" = só polling)
+    chat_callback_secret: str = ""  # HMAC-SHA256 do corpo em X-Alabia-Signature
+    chat_callback_timeout_seconds: float = 10.0
+    chat_callback_max_attempts: int = 5
+    chat_callback_retry_base_seconds: float = 1.0
+    chat_callback_retry_max_seconds: float = 30.0
+
+    # Admission control: limite global de turnos com o LLM em andamento
+    admission_max_concurrent: int = 32
+    admission_max_queue: int = 200  # turnos aguardando; além disso, 503
+    # SLO de tempo de fila por prioridade (estourou: 503 + Retry-After)
+    admission_queue_slo_seconds: Dict[str, float] = {
+        "booking": 20.0,
+        "returning": 10.0,
+        "new": 5.0,
+    }
+
+    # Idempotência do /chat (header Idempotency-Key ou message_id do provedor)
+    # "sqlite" compartilha as chaves entre workers (banco do conversation_store);
+    # "memory" só deduplica dentro de um processo
+    idempotency_backend: Literal["memory", "sqlite"] = "sqlite"
+    idempotency_ttl_seconds: int = 86400  # reentregas do webhook chegam em até 24h
+    idempotency_max_entries: int = 10000  # cópia em memória (LRU)
+    idempotency_lease_seconds: int = 300  # reserva de worker que morreu expira
 
     @property
     def allowed_origins_list(self) -> List[str]:
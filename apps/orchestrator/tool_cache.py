@@ -0,0 +1,166 @@
+"""
+Tool Cache - Cache de resultados de tools read-only
+Cache TTL + LRU na frente do MCPOrchestrator.execute_tool
+"""
+import copy
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Tools de escrita -> tools de leitura cujos resultados ficam obsoletos
+INVALIDATIONS: Dict[str, Tuple[str, ...]] = {
+    "create_event": ("check_availability", "list_events"),
+    "cancel_event": ("check_availability", "list_events"),
+}
+
+
+def canonicalize_input(tool_name: str, tool_input: Dict[str, Any]) -> str:
+    """
+    Serializa o input de forma estável para usar como chave
+
+    Ignora parâmetros None, remove espaços das strings e, no file_search,
+    normaliza caixa e espaços da query para agrupar buscas quase iguais.
+    """
+    normalized = {}
+    for key, value in (tool_input or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if tool_name == "file_search" and key == "query":
+                value = re.sub(r"\s+", " ", value.lower()).rstrip("?!. ")
+        normalized[key] = value
+
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class ToolResultCache:
+    """
+    Cache TTL com despejo LRU para resultados de tools
+
+    Só guarda tools marcadas como cacheáveis (readOnlyHint nas annotations
+    do MCP). Tools de escrita invalidam as entradas afetadas (ver
+    INVALIDATIONS).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        default_ttl: float = 60.0,
+        ttl_overrides: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            max_entries: Número máximo de entradas (LRU)
+            default_ttl: TTL padrão em segundos
+            ttl_overrides: TTL por nome de tool
+        """
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttl_overrides = ttl_overrides or {}
+        self.cacheable: set = set()
+
+        # (tool_name, canonical_input) -> (expires_at, tool_input, result)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any], Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def register_tool(self, tool: Dict[str, Any]) -> None:
+        """Marca a tool como cacheável se ela se declara read-only"""
+        annotations = tool.get("annotations") or {}
+        if annotations.get("readOnlyHint"):
+            self.cacheable.add(tool["name"])
+
+    def is_read_only(self, tool_name: str) -> bool:
+        return tool_name in self.cacheable
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return self.is_read_only(tool_name) and self.ttl_for(tool_name) > 0
+
+    def ttl_for(self, tool_name: str) -> float:
+        return float(self.ttl_overrides.get(tool_name, self.default_ttl))
+
+    def get(self, tool_name: str, tool_input: Dict[str, Any]) -> Optional[Any]:
+        """Retorna uma cópia do resultado em cache ou None"""
+        key = (tool_name, canonicalize_input(tool_name, tool_input))
+        entry = self._entries.get(key)
+
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[2])
+
+    def set(self, tool_name: str, tool_input: Dict[str, Any], result: Any) -> None:
+        """Guarda o resultado com o TTL da tool"""
+        key = (tool_name, canonicalize_input(tool_name, tool_input))
+        self._entries[key] = (time.monotonic() + self.ttl_for(tool_name), dict(tool_input or {}), copy.deepcopy(result))
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_for_write(self, tool_name: str, tool_input: Dict[str, Any]) -> int:
+        """
+        Remove entradas afetadas por uma tool de escrita
+
+        create_event invalida só o check_availability do mesmo dia (e
+        todo o list_events); cancel_event não informa a data, então
+        invalida todas as entradas das tools afetadas.
+
+        Returns:
+            Número de entradas removidas
+        """
+        affected = INVALIDATIONS.get(tool_name)
+        if not affected:
+            return 0
+
+        start = (tool_input or {}).get("start_datetime")
+        event_date = start[:10] if isinstance(start, str) else None
+
+        stale = []
+        for key, (_, cached_input, _) in self._entries.items():
+            if key[0] not in affected:
+                continue
+            if key[0] == "check_availability" and event_date and cached_input.get("date") != event_date:
+                continue
+            stale.append(key)
+
+        for key in stale:
+            del self._entries[key]
+
+        self.invalidations += len(stale)
+        if stale:
+            logger.info(f"{tool_name} invalidated {len(stale)} cached results")
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do cache"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "cacheable_tools": sorted(self.cacheable)
+        }
@@ -0,0 +1,202 @@
+"""
+Turn Coalescer - Serializa os turnos de cada usuário e junta rajadas
+Mensagens que chegam dentro da janela de debounce ("oi", "queria saber",
+"quanto custa?") viram um único turno do Claude, com uma só resposta
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Coalesced:
+    """Resultado das mensagens absorvidas pelo turno de uma mensagem mais nova"""
+    messages: int  # mensagens no turno combinado
+    position: int  # posição desta mensagem (0 = primeira)
+
+
+class _UserTurns:
+    """Estado de um usuário: mensagens pendentes e a vez de executar"""
+
+    def __init__(self):
+        self.pending: List[Tuple[Any, asyncio.Future]] = []
+        self.first_arrival = 0.0
+        self.last_arrival = 0.0
+        self.lock = asyncio.Lock()  # um turno por vez (inclusive streaming)
+        self.drain: Optional[asyncio.Task] = None
+        self.users = 0  # requests usando este estado (descarte quando zera)
+        # Rajada atual roda sem esperar o debounce (immediate_first)
+        self.immediate = False
+
+
+class TurnCoalescer:
+    """
+    Um "ator" por user_id
+
+    Mensagens que chegam dentro da janela de debounce (ou enquanto um
+    turno roda) viram um só turno. Com `immediate_first`, a primeira
+    mensagem sem turno em andamento roda na hora (menos latência, mas o
+    resto da rajada vira um segundo turno).
+
+    Uso:
+        coalescer = TurnCoalescer(debounce_seconds=1.0, merge=merge_requests)
+        result = await coalescer.submit(request.user_id, request, run_turn)
+        # result: retorno do run_turn ou Coalesced (mensagem absorvida)
+
+        async with coalescer.turn(request.user_id):  # só serializa
+            ...
+    """
+
+    def __init__(
+        self,
+        merge: Callable[[List[Any]], Any],
+        debounce_seconds: float = 1.0,
+        max_wait_seconds: float = 5.0,
+        max_messages: int = 10,
+        immediate_first: bool = False
+    ):
+        """
+        Args:
+            merge: Junta os itens de uma rajada num só (ordem de chegada)
+            debounce_seconds: Silêncio que fecha a rajada (0 = sem espera)
+            max_wait_seconds: Espera máxima desde a primeira mensagem
+            max_messages: Mensagens por turno combinado
+            immediate_first: Primeira mensagem sem turno em andamento não
+                espera o debounce
+        """
+        self.merge = merge
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_messages = max_messages
+        self.immediate_first = immediate_first
+        self._users: Dict[str, _UserTurns] = {}
+
+        self.turns = 0
+        self.messages = 0
+        self.coalesced = 0
+        self.serialized_waits = 0
+
+    def _state(self, user_id: str) -> _UserTurns:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserTurns()
+        state.users += 1
+        return state
+
+    def _release(self, user_id: str, state: _UserTurns) -> None:
+        state.users -= 1
+        drained = state.drain is None or state.drain.done()
+        if state.users == 0 and drained and not state.pending and self._users.get(user_id) is state:
+            del self._users[user_id]
+
+    async def submit(self, user_id: str, item: Any, runner: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Enfileira a mensagem no turno do usuário
+
+        Returns:
+            Resultado do runner para a última mensagem da rajada; as
+            anteriores recebem Coalesced quando o turno termina
+
+        Raises:
+            Exceção do runner (para todas as mensagens do turno)
+        """
+        state = self._state(user_id)
+        try:
+            future = asyncio.get_running_loop().create_future()
+            now = time.monotonic()
+            if not state.pending:
+                state.first_arrival = now
+                state.immediate = self.immediate_first and not state.lock.locked()
+            state.last_arrival = now
+            state.pending.append((item, future))
+            self.messages += 1
+
+            if state.drain is None or state.drain.done():
+                state.drain = asyncio.create_task(self._drain(user_id, state, runner))
+
+            # Cliente que desistiu não cancela o turno dos outros
+            return await asyncio.shield(future)
+        finally:
+            self._release(user_id, state)
+
+    @asynccontextmanager
+    async def turn(self, user_id: str) -> AsyncIterator[None]:
+        """Vez exclusiva no turno do usuário, sem debounce"""
+        state = self._state(user_id)
+        try:
+            if state.lock.locked():
+                self.serialized_waits += 1
+            async with state.lock:
+                yield
+        finally:
+            self._release(user_id, state)
+
+    async def _drain(self, user_id: str, state: _UserTurns, runner: Callable[[Any], Awaitable[Any]]) -> None:
+        while state.pending:
+            # Espera a rajada terminar (ou o teto de espera)
+            while not state.immediate and len(state.pending) < self.max_messages:
+                deadline = min(
+                    state.last_arrival + self.debounce_seconds,
+                    state.first_arrival + self.max_wait_seconds
+                )
+                delay = deadline - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+
+            if state.lock.locked():
+                self.serialized_waits += 1
+            async with state.lock:
+                batch = state.pending[:self.max_messages]
+                state.pending = state.pending[self.max_messages:]
+                state.immediate = False
+                if state.pending:
+                    state.first_arrival = time.monotonic()
+                await self._run(user_id, batch, runner)
+
+        # Todos os requests já foram respondidos (ou desistiram)
+        if state.users == 0 and self._users.get(user_id) is state:
+            del self._users[user_id]
+
+    async def _run(self, user_id: str, batch: List[Tuple[Any, asyncio.Future]], runner) -> None:
+        """
+        Executa o turno combinado
+
+        As mensagens absorvidas só recebem Coalesced depois que o turno deu
+        certo; se ele falha, todas recebem o erro (e o backend reenvia todas).
+        """
+        *absorbed, (_, primary) = batch
+        if absorbed:
+            logger.info(f"Coalescing {len(batch)} messages from {user_id} into one turn")
+
+        self.turns += 1
+        try:
+            result = await runner(self.merge([item for item, _ in batch]))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+                    # Request que desistiu não deixa "exception never retrieved"
+                    future.add_done_callback(lambda done: done.exception())
+            return
+
+        self.coalesced += len(absorbed)
+        for position, (_, future) in enumerate(absorbed):
+            if not future.done():
+                future.set_result(Coalesced(messages=len(batch), position=position))
+        if not primary.done():
+            primary.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_users": len(self._users),
+            "messages": self.messages,
+            "turns": self.turns,
+            "coalesced": self.coalesced,
+            "serialized_waits": self.serialized_waits
+        }
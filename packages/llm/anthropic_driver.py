@@ -2,12 +2,19 @@
 Anthropic Claude Driver
 Wrapper para SDK da Anthropic com suporte a MCP tools
 """
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Callable, Collection, List, Dict, Any, Optional, Union
 from anthropic import Anthropic, AsyncAnthropic
 from anthropic.types import Message, TextBlock, ToolUseBlock
 
 from apps.orchestrator.settings import settings
+from packages.llm.resilience import LatencyTracker, backoff_delay, is_retryable
+from packages.llm.router import ModelRouter, ModelTier
+from packages.llm.tool_results import encode_tool_result
 
 logger = logging.getLogger(__name__)
 
@@ -27,36 +34,212 @@ class AnthropicDriver:
         """
         self.api_key = api_key or settings.anthropic_api_key
         self.model = model or settings.anthropic_model
-        self.client = AsyncAnthropic(api_key=self.api_key)
+        # Retries ficam no driver (backoff com jitter + retry-after), não no SDK
+        self.client = AsyncAnthropic(api_key=self.api_key, max_retries=0)
+
+        # Tokens acumulados desde o start (inclui leitura/escrita do prompt cache)
+        self.usage_totals = self._new_usage()
+
+        # Latências por modelo (limiar do hedge): resposta completa do
+        # messages.create e primeiro token do messages.stream
+        self.latency: Dict[str, LatencyTracker] = defaultdict(LatencyTracker)
+        self.first_token_latency: Dict[str, LatencyTracker] = defaultdict(LatencyTracker)
+        self.retries = 0
+        self.retries_exhausted = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
 
         logger.info(f"Anthropic driver initialized with model: {self.model}")
 
     async def chat(
         self,
         messages: List[Dict[str, str]],
-        system: Optional[str] = None,
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
         tools: Optional[List[Dict[str, Any]]] = None,
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        model: Optional[str] = None,
     ) -> Message:
         """
         Envia mensagem para Claude
 
+        Erros transitórios (429, 529, 5xx, conexão) são repetidos com
+        backoff e jitter, respeitando o retry-after.
+
         Args:
             messages: Lista de mensagens no formato [{"role": "user", "content": "..."}]
-            system: System prompt
+            system: System prompt (string ou blocos; o primeiro bloco é o prefixo estático)
             tools: Lista de tools disponíveis (formato MCP/Anthropic)
             max_tokens: Máximo de tokens na resposta
             temperature: Temperatura (0-1)
+            hedge: Dispara uma segunda chamada se a primeira passar do p95
+                (usa settings.anthropic_hedge_enabled se None)
+            model: Modelo da chamada (usa self.model se None)
 
         Returns:
             Message object da Anthropic
         """
+        params = self._build_params(messages, system, tools, max_tokens, temperature, model)
+        hedge = settings.anthropic_hedge_enabled if hedge is None else hedge
+
+        try:
+            if hedge:
+                response = await self._hedged(
+                    lambda: self._create_with_retry(params),
+                    self.latency[params["model"]]
+                )
+            else:
+                response = await self._create_with_retry(params)
+            logger.debug(f"Claude response: {response.model_dump_json(indent=2)}")
+            return response
+
+        except Exception as e:
+            logger.error(f"Error calling Anthropic API: {e}", exc_info=True)
+            raise
+
+    async def _create_with_retry(self, params: Dict[str, Any]) -> Message:
+        """messages.create com retry (backoff exponencial + jitter)"""
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await self.client.messages.create(**params)
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e):
+                    raise
+                if attempt > settings.anthropic_max_retries:
+                    self.retries_exhausted += 1
+                    raise
+
+                delay = backoff_delay(
+                    e, attempt,
+                    base=settings.anthropic_retry_base_seconds,
+                    cap=settings.anthropic_retry_max_seconds
+                )
+                self.retries += 1
+                logger.warning(f"Anthropic API error ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.latency[params["model"]].record(time.perf_counter() - started)
+            return response
+
+    @staticmethod
+    def _hedge_delay(latency: LatencyTracker) -> Optional[float]:
+        """Limiar do hedge: p95 das latências recentes (None = poucas amostras)"""
+        if len(latency.samples) < settings.anthropic_hedge_min_samples:
+            return None
+        return max(latency.percentile(95), settings.anthropic_hedge_min_delay_seconds)
+
+    async def _hedged(
+        self,
+        start: Callable[[], Any],
+        latency: LatencyTracker,
+        discard: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """
+        Hedged request: se a primeira chamada passar do p95 do modelo,
+        dispara uma segunda e fica com a que terminar primeiro (a outra é
+        cancelada)
+
+        Args:
+            start: Cria a corrotina da chamada
+            latency: Latências do modelo (limiar do hedge)
+            discard: Libera o resultado de uma chamada que terminou mas perdeu
+        """
+        delay = self._hedge_delay(latency)
+        if delay is None:
+            return await start()
+
+        primary = asyncio.create_task(start())
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges_fired += 1
+            logger.info(f"Anthropic call slower than p95 ({delay:.2f}s), firing hedged request")
+            hedged = asyncio.create_task(start())
+            pending.add(hedged)
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    if winners[0] is hedged:
+                        self.hedge_wins += 1
+                    for task in winners[1:]:
+                        if discard:
+                            await discard(task.result())
+                    return winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in (primary, *pending):
+                if not task.done():
+                    task.cancel()
+
+    async def _open_stream(self, params: Dict[str, Any]) -> tuple:
+        """
+        Abre o messages.stream e espera o primeiro texto
+
+        Returns:
+            (exit stack que fecha o stream, stream, textos a partir do primeiro)
+        """
+        started = time.perf_counter()
+        stack = AsyncExitStack()
+        try:
+            stream = await stack.enter_async_context(self.client.messages.stream(**params))
+            rest = stream.text_stream.__aiter__()
+            first = await anext(rest, None)
+        except BaseException:
+            await stack.aclose()
+            raise
+        self.first_token_latency[params["model"]].record(time.perf_counter() - started)
+
+        async def texts():
+            if first is not None:
+                yield first
+            async for text in rest:
+                yield text
+
+        return stack, stream, texts()
+
+    async def _open_stream_hedged(self, params: Dict[str, Any], hedge: bool) -> tuple:
+        """_open_stream com hedge no tempo até o primeiro token"""
+        if not hedge:
+            return await self._open_stream(params)
+        return await self._hedged(
+            lambda: self._open_stream(params),
+            self.first_token_latency[params["model"]],
+            discard=lambda opened: opened[0].aclose()
+        )
+
+    def _build_params(
+        self,
+        messages: List[Dict[str, Any]],
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Monta os parâmetros do messages.create / messages.stream
+
+        Com prompt caching, marca breakpoints na última tool, no prefixo
+        estático do system prompt e na última mensagem (reaproveitada nas
+        iterações seguintes do loop de tools).
+        """
         params = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": messages,
             "max_tokens": max_tokens or settings.anthropic_max_tokens,
-            "temperature": temperature or settings.anthropic_temperature,
+            "temperature": temperature if temperature is not None else settings.anthropic_temperature,
         }
 
         if system:
@@ -65,27 +248,130 @@ class AnthropicDriver:
         if tools:
             params["tools"] = tools
 
-        try:
-            response = await self.client.messages.create(**params)
-            logger.debug(f"Claude response: {response.model_dump_json(indent=2)}")
-            return response
+        if settings.anthropic_prompt_caching:
+            self._add_cache_breakpoints(params)
 
-        except Exception as e:
-            logger.error(f"Error calling Anthropic API: {e}", exc_info=True)
-            raise
+        return params
+
+    @staticmethod
+    def _add_cache_breakpoints(params: Dict[str, Any]) -> None:
+        """Adiciona cache_control sem alterar as listas do chamador"""
+        cache_control = {"type": "ephemeral"}
+
+        if params.get("tools"):
+            tools = list(params["tools"])
+            tools[-1] = {**tools[-1], "cache_control": cache_control}
+            params["tools"] = tools
+
+        system = params.get("system")
+        if isinstance(system, str):
+            params["system"] = [{"type": "text", "text": system, "cache_control": cache_control}]
+        elif system:
+            system = list(system)
+            system[0] = {**system[0], "cache_control": cache_control}
+            params["system"] = system
+
+        if params["messages"]:
+            messages = list(params["messages"])
+            last = messages[-1]
+            content = last["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            if content and isinstance(content[-1], dict):
+                content = list(content)
+                content[-1] = {**content[-1], "cache_control": cache_control}
+                messages[-1] = {**last, "content": content}
+                params["messages"] = messages
+
+    @staticmethod
+    def _new_usage() -> Dict[str, int]:
+        return {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+            "api_calls": 0
+        }
+
+    def _record_usage(self, usage: Dict[str, int], response: Message) -> None:
+        """Soma os tokens da resposta no uso do request e no total do driver"""
+        for totals in (usage, self.usage_totals):
+            totals["api_calls"] += 1
+            for key in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+                totals[key] += getattr(response.usage, key, None) or 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Uso de tokens, latência e contadores de retry/hedge"""
+        prompt_tokens = (
+            self.usage_totals["input_tokens"]
+            + self.usage_totals["cache_read_input_tokens"]
+            + self.usage_totals["cache_creation_input_tokens"]
+        )
+        return {
+            **self.usage_totals,
+            "cache_read_ratio": round(self.usage_totals["cache_read_input_tokens"] / prompt_tokens, 3) if prompt_tokens else 0.0,
+            "latency_p95_ms": self._p95_ms(self.latency),
+            "first_token_p95_ms": self._p95_ms(self.first_token_latency),
+            "retries": self.retries,
+            "retries_exhausted": self.retries_exhausted,
+            "hedges_fired": self.hedges_fired,
+            "hedge_wins": self.hedge_wins
+        }
+
+    @staticmethod
+    def _p95_ms(trackers: Dict[str, LatencyTracker]) -> Dict[str, float]:
+        """p95 em ms por modelo"""
+        return {
+            model: round(tracker.percentile(95) * 1000, 1)
+            for model, tracker in trackers.items()
+            if tracker.samples
+        }
+
+    @staticmethod
+    def _tier_params(system: Optional[Union[str, List[Dict[str, Any]]]], tier: Optional[ModelTier]) -> Dict[str, Any]:
+        """Modelo, limites e system prompt (com as instruções do tier)"""
+        if tier is None:
+            return {"system": system}
+
+        if tier.system_suffix:
+            blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system or [])
+            system = blocks + [{"type": "text", "text": tier.system_suffix}]
+
+        return {
+            "system": system,
+            "model": tier.model,
+            "max_tokens": tier.max_tokens,
+            "temperature": tier.temperature
+        }
+
+    @staticmethod
+    def _tier_info(tier: Optional[ModelTier], escalation: Optional[str]) -> Dict[str, Any]:
+        return {
+            "model_tier": tier.name if tier else None,
+            "model": tier.model if tier else None,
+            "escalation": escalation
+        }
 
     async def chat_with_tools(
         self,
         user_message: str,
-        system: Optional[str] = None,
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_executor: Optional[callable] = None,
         max_iterations: Optional[int] = None,
         conversation_history: Optional[List[Dict[str, str]]] = None,
+        ordered_tools: Optional[Collection[str]] = None,
+        tier: Optional[ModelTier] = None,
+        router: Optional[ModelRouter] = None,
+        hedge: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
         Chat com loop automático de function calling
 
+        As tools pedidas num mesmo turno rodam em paralelo (até
+        settings.tool_max_parallel); as de `ordered_tools` rodam uma por
+        vez, na ordem em que o Claude pediu.
+
         Args:
             user_message: Mensagem do usuário
             system: System prompt
@@ -93,19 +379,30 @@ class AnthropicDriver:
             tool_executor: Função async que executa tools
             max_iterations: Máximo de iterações (evita loop infinito)
             conversation_history: Histórico de conversa anterior
+            ordered_tools: Tools com efeito colateral (execução ordenada)
+            tier: Tier inicial (None = modelo e limites padrão)
+            router: Decide a escalada do tier pequeno para o grande
+            hedge: Hedge das chamadas deste turno (usa
+                settings.anthropic_hedge_enabled se None)
 
         Returns:
             {
                 "response": str,
                 "actions": List[ToolAction],
+                "usage": Dict[str, int] (tokens, inclusive cache read/write),
+                "model_tier": str, "model": str, "escalation": motivo ou None,
+                "messages": mensagens do turno (para o store de conversa),
                 "final_message": Message
             }
         """
         max_iter = max_iterations or settings.max_tool_iterations
         messages = conversation_history or []
+        turn_start = len(messages)
         messages.append({"role": "user", "content": user_message})
 
         actions = []
+        usage = self._new_usage()
+        escalation = None
         iterations = 0
 
         while iterations < max_iter:
@@ -115,17 +412,31 @@ class AnthropicDriver:
             # Chama Claude
             response = await self.chat(
                 messages=messages,
-                system=system,
-                tools=tools
+                tools=tools,
+                hedge=hedge,
+                **self._tier_params(system, tier)
             )
+            self._record_usage(usage, response)
+
+            # Modelo pequeno pediu tool de agendamento ou não está confiante:
+            # descarta a resposta e refaz a chamada no modelo grande
+            if router and tier:
+                reason = router.escalation_reason(response, tier)
+                if reason:
+                    logger.info(f"Escalating from {tier.model} to {router.large.model}: {reason}")
+                    escalation, tier = reason, router.large
+                    continue
 
             # Se não pediu tool, terminou
             if response.stop_reason == "end_turn":
-                text_response = self._extract_text(response)
+                text_response = self.extract_text(response)
                 logger.info(f"Chat completed in {iterations} iterations")
                 return {
                     "response": text_response,
                     "actions": actions,
+                    "usage": usage,
+                    **self._tier_info(tier, escalation),
+                    "messages": self._turn_messages(messages, turn_start, text_response),
                     "final_message": response
                 }
 
@@ -137,48 +448,14 @@ class AnthropicDriver:
                     "content": response.content
                 })
 
-                # Executa cada tool solicitada
+                # Executa as tools solicitadas (resultados na ordem original)
+                tool_blocks = [block for block in response.content if isinstance(block, ToolUseBlock)]
                 tool_results = []
-                for content_block in response.content:
-                    if isinstance(content_block, ToolUseBlock):
-                        logger.info(f"Executing tool: {content_block.name}")
-
-                        # Executa tool
-                        if tool_executor:
-                            try:
-                                result = await tool_executor(
-                                    tool_name=content_block.name,
-                                    tool_input=content_block.input
-                                )
-
-                                tool_results.append({
-                                    "type": "tool_result",
-                                    "tool_use_id": content_block.id,
-                                    "content": str(result)
-                                })
-
-                                actions.append({
-                                    "tool": content_block.name,
-                                    "status": "success",
-                                    "result": result
-                                })
-
-                            except Exception as e:
-                                logger.error(f"Tool execution error: {e}", exc_info=True)
-
-                                tool_results.append({
-                                    "type": "tool_result",
-                                    "tool_use_id": content_block.id,
-                                    "is_error": True,
-                                    "content": f"Error: {str(e)}"
-                                })
-
-                                actions.append({
-                                    "tool": content_block.name,
-                                    "status": "error",
-                                    "result": None,
-                                    "error": str(e)
-                                })
+                if tool_executor and tool_blocks:
+                    executed = await self._execute_tools(tool_blocks, tool_executor, ordered_tools or ())
+                    for tool_result, action in executed:
+                        tool_results.append(tool_result)
+                        actions.append(action)
 
                 # Adiciona resultados das tools
                 if tool_results:
@@ -191,15 +468,279 @@ class AnthropicDriver:
 
         # Se chegou ao limite de iterações
         logger.warning(f"Max iterations ({max_iter}) reached")
-        text_response = self._extract_text(response) or "Desculpe, não consegui processar sua solicitação."
+        text_response = self.extract_text(response) or "Desculpe, não consegui processar sua solicitação."
 
         return {
             "response": text_response,
             "actions": actions,
+            "usage": usage,
+            **self._tier_info(tier, escalation),
+            "messages": self._turn_messages(messages, turn_start, text_response),
+            "final_message": response
+        }
+
+    async def stream_with_tools(
+        self,
+        user_message: str,
+        system: Optional[Union[str, List[Dict[str, Any]]]] = None,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_executor: Optional[callable] = None,
+        max_iterations: Optional[int] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        ordered_tools: Optional[Collection[str]] = None,
+        tier: Optional[ModelTier] = None,
+        router: Optional[ModelRouter] = None,
+        hedge: Optional[bool] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versão streaming do chat_with_tools (API de streaming da Anthropic)
+
+        Com hedge, o limiar é o p95 do tempo até o primeiro token do modelo;
+        o stream que perde é fechado.
+
+        Yields:
+            Eventos {"type": ...}:
+            - "text_delta": {"text"}
+            - "tool_started": {"tool", "tool_use_id", "input"}
+            - "tool_finished": {"tool", "tool_use_id", "status", "duration_ms", "error"}
+            - "escalated": {"reason", "model_tier"}
+
+            O texto do tier pequeno só é enviado depois da decisão de
+            escalar: a resposta descartada nunca chega ao cliente.
+            - "done": {"response", "actions", "usage", "model_tier", "model",
+              "escalation", "messages", "final_message"} (sempre o último)
+        """
+        max_iter = max_iterations or settings.max_tool_iterations
+        hedge = settings.anthropic_hedge_enabled if hedge is None else hedge
+        messages = conversation_history or []
+        turn_start = len(messages)
+        messages.append({"role": "user", "content": user_message})
+
+        actions = []
+        usage = self._new_usage()
+        escalation = None
+        iterations = 0
+        response = None
+
+        while iterations < max_iter:
+            iterations += 1
+            logger.info(f"Chat stream iteration {iterations}/{max_iter}")
+
+            # Tier que pode escalar: segura o texto até decidir
+            buffered = bool(router and tier and router.escalation_possible(tier))
+
+            # Retry só antes do primeiro token enviado (depois duplicaria o texto)
+            attempt = 0
+            while True:
+                emitted = False
+                pending: List[str] = []
+                try:
+                    tier_params = self._tier_params(system, tier)
+                    params = self._build_params(
+                        messages, tier_params.pop("system"), tools,
+                        tier_params.get("max_tokens"), tier_params.get("temperature"), tier_params.get("model")
+                    )
+                    stack, stream, texts = await self._open_stream_hedged(params, hedge)
+                    async with stack:
+                        async for text in texts:
+                            if buffered:
+                                pending.append(text)
+                                continue
+                            emitted = True
+                            yield {"type": "text_delta", "text": text}
+                        response = await stream.get_final_message()
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if emitted or not is_retryable(e) or attempt > settings.anthropic_max_retries:
+                        raise
+                    delay = backoff_delay(
+                        e, attempt,
+                        base=settings.anthropic_retry_base_seconds,
+                        cap=settings.anthropic_retry_max_seconds
+                    )
+                    self.retries += 1
+                    logger.warning(f"Anthropic stream error ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+            self._record_usage(usage, response)
+
+            if router and tier:
+                reason = router.escalation_reason(response, tier)
+                if reason:
+                    logger.info(f"Escalating from {tier.model} to {router.large.model}: {reason}")
+                    escalation, tier = reason, router.large
+                    yield {"type": "escalated", "reason": reason, "model_tier": tier.name}
+                    continue
+
+            for text in pending:
+                yield {"type": "text_delta", "text": text}
+
+            if response.stop_reason != "tool_use":
+                logger.info(f"Chat stream completed in {iterations} iterations")
+                text_response = self.extract_text(response)
+                yield {
+                    "type": "done",
+                    "response": text_response,
+                    "actions": actions,
+                    "usage": usage,
+                    **self._tier_info(tier, escalation),
+                    "messages": self._turn_messages(messages, turn_start, text_response),
+                    "final_message": response
+                }
+                return
+
+            messages.append({
+                "role": "assistant",
+                "content": response.content
+            })
+
+            tool_blocks = [block for block in response.content if isinstance(block, ToolUseBlock)]
+            tool_results = []
+            if tool_executor and tool_blocks:
+                # Eventos de progresso chegam pela fila enquanto as tools rodam
+                events: asyncio.Queue = asyncio.Queue()
+                task = asyncio.create_task(
+                    self._execute_tools(tool_blocks, tool_executor, ordered_tools or (), on_event=events.put_nowait)
+                )
+                task.add_done_callback(lambda _: events.put_nowait(None))
+                try:
+                    while (event := await events.get()) is not None:
+                        yield event
+                finally:
+                    if not task.done():
+                        task.cancel()
+
+                for tool_result, action in task.result():
+                    tool_results.append(tool_result)
+                    actions.append(action)
+
+            if tool_results:
+                messages.append({
+                    "role": "user",
+                    "content": tool_results
+                })
+
+        logger.warning(f"Max iterations ({max_iter}) reached")
+        text_response = self.extract_text(response) or "Desculpe, não consegui processar sua solicitação."
+        yield {
+            "type": "done",
+            "response": text_response,
+            "actions": actions,
+            "usage": usage,
+            **self._tier_info(tier, escalation),
+            "messages": self._turn_messages(messages, turn_start, text_response),
             "final_message": response
         }
 
-    def _extract_text(self, message: Message) -> str:
+    @staticmethod
+    def _turn_messages(messages: List[Dict[str, Any]], turn_start: int, response: str) -> List[Dict[str, Any]]:
+        """Mensagens do turno (usuário, tool_use/tool_result e resposta final)"""
+        return messages[turn_start:] + [{"role": "assistant", "content": response}]
+
+    async def _execute_tools(
+        self,
+        tool_blocks: List[ToolUseBlock],
+        tool_executor: callable,
+        ordered_tools: Collection[str],
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> List[tuple]:
+        """
+        Executa os tool_use de um turno
+
+        Tools independentes rodam em paralelo com limite de concorrência;
+        as de `ordered_tools` formam uma cadeia sequencial.
+
+        Args:
+            on_event: Recebe eventos "tool_started"/"tool_finished" (streaming)
+
+        Returns:
+            Lista de (tool_result, action) na ordem dos blocos
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.tool_max_parallel))
+        ordered_lock = asyncio.Lock()
+
+        async def run(block: ToolUseBlock) -> tuple:
+            lock = ordered_lock if block.name in ordered_tools else None
+            if lock:
+                await lock.acquire()
+            try:
+                async with semaphore:
+                    if on_event:
+                        on_event({
+                            "type": "tool_started",
+                            "tool": block.name,
+                            "tool_use_id": block.id,
+                            "input": block.input
+                        })
+                    executed = await self._execute_tool(block, tool_executor)
+                    if on_event:
+                        action = executed[1]
+                        on_event({
+                            "type": "tool_finished",
+                            "tool": block.name,
+                            "tool_use_id": block.id,
+                            "status": action["status"],
+                            "duration_ms": action["duration_ms"],
+                            "error": action.get("error")
+                        })
+                    return executed
+            finally:
+                if lock:
+                    lock.release()
+
+        # asyncio.Lock é FIFO: a cadeia ordenada segue a ordem dos blocos
+        return list(await asyncio.gather(*(run(block) for block in tool_blocks)))
+
+    async def _execute_tool(self, block: ToolUseBlock, tool_executor: callable) -> tuple:
+        """Executa uma tool e monta o tool_result e a action (com duração)"""
+        logger.info(f"Executing tool: {block.name}")
+        started = time.perf_counter()
+
+        try:
+            result = await tool_executor(
+                tool_name=block.name,
+                tool_input=block.input
+            )
+        except Exception as e:
+            logger.error(f"Tool execution error: {e}", exc_info=True)
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            return (
+                {
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "is_error": True,
+                    "content": f"Error: {str(e)}"
+                },
+                {
+                    "tool": block.name,
+                    "status": "error",
+                    "result": None,
+                    "error": str(e),
+                    "duration_ms": duration_ms
+                }
+            )
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        return (
+            {
+                "type": "tool_result",
+                "tool_use_id": block.id,
+                # Projeção compacta para o Claude; completo fica na action
+                "content": encode_tool_result(
+                    block.name, result,
+                    settings.tool_result_token_budgets.get(block.name, settings.tool_result_token_budget)
+                )
+            },
+            {
+                "tool": block.name,
+                "status": "success",
+                "result": result,
+                "duration_ms": duration_ms
+            }
+        )
+
+    @staticmethod
+    def extract_text(message: Message) -> str:
         """Extrai texto da resposta do Claude"""
         text_blocks = [
             block.text
@@ -0,0 +1,411 @@
+"""
+Compactação do histórico de conversa por orçamento de tokens
+Mantém os últimos turnos literais e resume os mais antigos
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# (resumo anterior, transcrição das novas mensagens) -> novo resumo
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+DATETIME_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?(?:[+-]\d{2}:\d{2}|Z)?)?")
+TIME_RE = re.compile(r"\b(?:[01]?\d|2[0-3])(?::[0-5]\d|h[0-5]\d?)(?![\w:])")
+EVENT_ID_RE = re.compile(r"(?:event_id|id do evento|evento id|event id)\W{0,4}([A-Za-z0-9_-]{6,})", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimativa local de tokens (sem chamada à API)
+
+    ~4 caracteres por token, arredondado para cima; suficiente para
+    orçamento de contexto.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content", "")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, default=str)
+    # Overhead de papel/delimitadores por mensagem
+    return estimate_tokens(content) + 4
+
+
+def is_tool_result(message: Dict[str, Any]) -> bool:
+    content = message.get("content")
+    return isinstance(content, list) and any(
+        isinstance(block, dict) and block.get("type") == "tool_result" for block in content
+    )
+
+
+def has_tool_use(messages: List[Dict[str, Any]], tool_names) -> bool:
+    """Algum tool_use de uma das tools nas mensagens"""
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(
+            isinstance(block, dict) and block.get("type") == "tool_use" and block.get("name") in tool_names
+            for block in content
+        ):
+            return True
+    return False
+
+
+def extract_facts(messages: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Fatos-chave citados nas mensagens (email, datas/horários, IDs de evento)
+
+    Mantidos sempre no resumo, mesmo que o resumo do modelo os omita.
+    """
+    facts: Dict[str, List[str]] = {"emails": [], "datetimes": [], "times": [], "event_ids": []}
+
+    def add(kind: str, value: str):
+        if value not in facts[kind]:
+            facts[kind].append(value)
+
+    for message in messages:
+        text = message.get("content", "")
+        if not isinstance(text, str):
+            text = json.dumps(text, ensure_ascii=False, default=str)
+        for match in EMAIL_RE.findall(text):
+            add("emails", match)
+        for match in DATETIME_RE.findall(text):
+            add("datetimes", match)
+        for match in TIME_RE.findall(text):
+            add("times", match)
+        for match in EVENT_ID_RE.findall(text):
+            add("event_ids", match)
+
+    return facts
+
+
+def merge_facts(*groups: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Junta fatos-chave (ordem de aparição, sem repetir)"""
+    merged: Dict[str, List[str]] = {"emails": [], "datetimes": [], "times": [], "event_ids": []}
+    for facts in groups:
+        for kind, values in facts.items():
+            merged.setdefault(kind, []).extend(value for value in values if value not in merged[kind])
+    return merged
+
+
+def format_facts(facts: Dict[str, List[str]]) -> str:
+    labels = {
+        "emails": "Emails",
+        "datetimes": "Datas/horários citados",
+        "times": "Horários citados",
+        "event_ids": "IDs de eventos",
+    }
+    lines = [f"- {labels[kind]}: {', '.join(values[-5:])}" for kind, values in facts.items() if values]
+    return "Fatos-chave:\n" + "\n".join(lines) if lines else ""
+
+
+def transcript(messages: List[Dict[str, Any]], max_chars: Optional[int] = None) -> str:
+    """Transcrição simples "Cliente:/Assistente:" das mensagens"""
+    lines = []
+    for message in messages:
+        speaker = "Cliente" if message["role"] == "user" else "Assistente"
+        text = message["content"] if isinstance(message["content"], str) else json.dumps(message["content"], ensure_ascii=False)
+        if max_chars and len(text) > max_chars:
+            text = text[:max_chars] + "…"
+        lines.append(f"{speaker}: {text}")
+    return "\n".join(lines)
+
+
+def _message_hashes(messages: List[Dict[str, Any]]) -> List[str]:
+    return [
+        hashlib.sha256(json.dumps(message, ensure_ascii=False, sort_keys=True, default=str).encode()).hexdigest()
+        for message in messages
+    ]
+
+
+@dataclass
+class SummaryState:
+    """
+    Resumo das primeiras `covered` mensagens da conversa
+
+    Também cobre as mensagens já cortadas do histórico pelo store
+    (`fold`): o resumo e os fatos-chave delas ficam aqui.
+    """
+    summary: str
+    covered: int
+    hashes: List[str]  # hash de cada mensagem coberta (valida o prefixo)
+    facts: Dict[str, List[str]] = field(default_factory=dict)
+
+
+@dataclass
+class CompactHistory:
+    """Histórico pronto para o Claude"""
+    summary: str  # vai no bloco dinâmico do system prompt
+    messages: List[Dict[str, Any]]
+    tokens: int
+    dropped: int = 0  # mensagens antigas que ficaram só no resumo
+    facts: Dict[str, List[str]] = field(default_factory=dict)
+
+
+class HistoryManager:
+    """
+    Compacta o histórico da conversa dentro de um orçamento de tokens
+
+    - os últimos `keep_turns` turnos vão literais
+    - os anteriores viram um resumo; o resumo do modelo é atualizado em
+      background depois de cada resposta (nunca no caminho do request)
+    - enquanto não há resumo, usa um resumo extrativo (fatos-chave +
+      trechos) calculado localmente
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        keep_turns: int = 6,
+        token_budget: int = 3000,
+        summary_token_budget: int = 400,
+        max_conversations: int = 10000
+    ):
+        """
+        Args:
+            summarizer: Função async que atualiza o resumo (None = só extrativo)
+            keep_turns: Turnos do usuário (com as respostas e tool calls) mantidos literais
+            token_budget: Máximo de tokens do histórico (resumo incluído)
+            summary_token_budget: Máximo de tokens do resumo
+            max_conversations: Resumos mantidos em memória (LRU)
+        """
+        self.summarizer = summarizer
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_conversations = max_conversations
+
+        self._states: "OrderedDict[str, SummaryState]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        self.summaries_built = 0
+        self.summary_errors = 0
+
+    def compact(self, conversation_id: str, messages: List[Dict[str, Any]]) -> CompactHistory:
+        """
+        Monta o histórico compactado de uma conversa
+
+        Args:
+            conversation_id: ID da conversa (user_id)
+            messages: Histórico completo no formato Anthropic
+        """
+        older = messages[:self._recent_start(messages)]
+        state = self._valid_state(conversation_id, older)
+
+        # Literais: mensagens ainda não resumidas pelo modelo (ou só os
+        # últimos turnos, se não há resumo)
+        kept = messages[state.covered if state else len(older):]
+
+        # Orçamento: saem primeiro as mensagens mais antigas (o resumo
+        # tem reserva própria sempre que algo é dobrado nele)
+        def tokens_with(kept_messages):
+            reserve = self.summary_token_budget if state or len(kept_messages) < len(messages) else 0
+            return reserve + sum(message_tokens(m) for m in kept_messages)
+
+        while kept and tokens_with(kept) > self.token_budget:
+            kept = kept[1:]
+
+        # Anthropic exige que o histórico comece pelo usuário (e não por
+        # tool_result, que depende do tool_use anterior)
+        while kept and (kept[0]["role"] != "user" or is_tool_result(kept[0])):
+            kept = kept[1:]
+
+        folded = messages[:len(messages) - len(kept)]
+        summary = self._summary_for(state, folded)
+        return CompactHistory(
+            summary=summary,
+            messages=kept,
+            tokens=estimate_tokens(summary) + sum(message_tokens(m) for m in kept),
+            dropped=len(folded),
+            facts=merge_facts(state.facts if state else {}, extract_facts(folded))
+        )
+
+    def _recent_start(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        Índice onde começam os últimos `keep_turns` turnos
+
+        Um turno começa numa mensagem do usuário que não é tool_result (os
+        tool_use/tool_result do loop ficam dentro do turno).
+        """
+        if self.keep_turns <= 0:
+            return len(messages)
+
+        turns = 0
+        for index in range(len(messages) - 1, -1, -1):
+            message = messages[index]
+            if message["role"] == "user" and not is_tool_result(message):
+                turns += 1
+                if turns == self.keep_turns:
+                    return index
+        return 0
+
+    def _summary_for(self, state: Optional[SummaryState], folded: List[Dict[str, Any]]) -> str:
+        """Fatos-chave + resumo do modelo + trechos do que ele ainda não cobre"""
+        if not folded and not state:
+            return ""
+
+        parts = [format_facts(merge_facts(state.facts if state else {}, extract_facts(folded)))]
+        if state:
+            parts.append(state.summary)
+        rest = folded[state.covered:] if state else folded
+        if rest:
+            parts.append("Trechos anteriores:\n" + transcript(rest, max_chars=160))
+
+        summary = "\n\n".join(part for part in parts if part)
+        return self._truncate(summary, self.summary_token_budget)
+
+    def schedule_refresh(self, conversation_id: str, messages: List[Dict[str, Any]]) -> Optional[asyncio.Task]:
+        """
+        Atualiza o resumo em background (chamado depois da resposta)
+
+        Args:
+            conversation_id: ID da conversa (user_id)
+            messages: Histórico completo, já com o último turno
+        """
+        if not self.summarizer:
+            return None
+
+        recent_start = self._recent_start(messages)
+        if not recent_start:
+            return None
+
+        running = self._tasks.get(conversation_id)
+        if running and not running.done():
+            # Próxima resposta agenda de novo com o histórico mais novo
+            return running
+
+        task = asyncio.create_task(self._refresh(conversation_id, messages[:recent_start]))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation_id, None))
+        return task
+
+    async def _refresh(self, conversation_id: str, older: List[Dict[str, Any]]) -> None:
+        stored = self._states.get(conversation_id)
+        state = self._valid_state(conversation_id, older)
+        previous = state.summary if state else ""
+        new_messages = older[state.covered:] if state else older
+        if not new_messages:
+            return
+
+        try:
+            summary = await self.summarizer(previous, transcript(new_messages))
+        except Exception as e:
+            self.summary_errors += 1
+            logger.warning(f"History summary failed for {conversation_id}: {e}")
+            return
+
+        if self._states.get(conversation_id) is not stored:
+            # O store cortou o histórico (fold) enquanto o modelo resumia
+            return
+
+        self._save_state(conversation_id, SummaryState(
+            summary=self._truncate(summary.strip(), self.summary_token_budget),
+            covered=len(older),
+            hashes=_message_hashes(older),
+            facts=merge_facts(state.facts if state else {}, extract_facts(new_messages))
+        ))
+
+        self.summaries_built += 1
+        logger.info(f"History summary refreshed for {conversation_id} ({len(older)} messages)")
+
+    def _valid_state(self, conversation_id: str, older: List[Dict[str, Any]]) -> Optional[SummaryState]:
+        """Resumo guardado, se ele cobre um prefixo do histórico atual"""
+        state = self._states.get(conversation_id)
+        if state and state.covered <= len(older) and state.hashes == _message_hashes(older[:state.covered]):
+            return state
+        return None
+
+    def _save_state(self, conversation_id: str, state: SummaryState) -> None:
+        self._states[conversation_id] = state
+        self._states.move_to_end(conversation_id)
+        while len(self._states) > self.max_conversations:
+            self._states.popitem(last=False)
+
+    def fold(self, conversation_id: str, trimmed: List[Dict[str, Any]]) -> None:
+        """
+        Guarda resumo e fatos-chave das mensagens cortadas pelo store
+
+        Chamado pelo conversation store quando apaga o início da conversa
+        (`on_trim`); o resumo passa a cobrir o histórico que sobrou.
+
+        Args:
+            conversation_id: ID da conversa (user_id)
+            trimmed: Mensagens cortadas (as mais antigas, em ordem)
+        """
+        if not trimmed:
+            return
+
+        state = self._states.get(conversation_id)
+        hashes = _message_hashes(trimmed)
+        if state and state.hashes[:len(hashes)] == hashes:
+            # Resumo do modelo já cobre o que saiu: só desloca o prefixo
+            self._save_state(conversation_id, SummaryState(
+                summary=state.summary,
+                covered=state.covered - len(trimmed),
+                hashes=state.hashes[len(hashes):],
+                facts=merge_facts(state.facts, extract_facts(trimmed))
+            ))
+            return
+
+        # Sem resumo do modelo para essas mensagens: resumo extrativo
+        previous = state.summary if state and state.hashes == hashes[:len(state.hashes)] else ""
+        rest = trimmed[state.covered:] if previous else trimmed
+        parts = [previous, "Trechos anteriores:\n" + transcript(rest, max_chars=160)]
+        self._save_state(conversation_id, SummaryState(
+            summary=self._truncate("\n\n".join(part for part in parts if part), self.summary_token_budget),
+            covered=0,
+            hashes=[],
+            facts=merge_facts(state.facts if previous else {}, extract_facts(trimmed))
+        ))
+
+    def forget(self, conversation_id: str) -> None:
+        """Descarta o resumo de uma conversa (histórico apagado)"""
+        self._states.pop(conversation_id, None)
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int) -> str:
+        max_chars = max_tokens * 4
+        return text if len(text) <= max_chars else text[:max_chars] + "…"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "summaries": len(self._states),
+            "summaries_built": self.summaries_built,
+            "summary_errors": self.summary_errors,
+            "refreshing": len(self._tasks)
+        }
+
+
+def llm_summarizer(driver, max_tokens: int = 400, model: Optional[str] = None) -> Summarizer:
+    """
+    Summarizer que usa o AnthropicDriver com o HISTORY_SUMMARY_PROMPT
+
+    Args:
+        driver: AnthropicDriver
+        max_tokens: Limite do resumo
+        model: Modelo do resumo (o do tier pequeno basta; usa o do driver se None)
+    """
+    from packages.llm.prompts import HISTORY_SUMMARY_PROMPT
+
+    async def summarize(previous_summary: str, new_transcript: str) -> str:
+        content = f"Resumo anterior:\n{previous_summary or '(vazio)'}\n\nNovas mensagens:\n{new_transcript}"
+        response = await driver.chat(
+            messages=[{"role": "user", "content": content}],
+            system=HISTORY_SUMMARY_PROMPT,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            model=model,
+            # Roda em background: não vale pagar uma chamada duplicada
+            hedge=False
+        )
+        return driver.extract_text(response)
+
+    return summarize
@@ -252,3 +252,22 @@ TOOLS:
 - check_availability: Verifica horários (USE PROATIVAMENTE!)
 - create_event: Cria agendamento (só quando tiver data+hora+email)
 """
+
+# Resumo incremental do histórico (compactação de conversas longas)
+HISTORY_SUMMARY_PROMPT = """
+Você resume conversas de atendimento comercial da Alabia para dar contexto ao assistente.
+
+Atualize o resumo anterior com as novas mensagens. Seja curto (no máximo 10 linhas) e objetivo.
+SEMPRE preserve, exatamente como aparecem: nome, email, telefone, empresa, datas e horários
+propostos ou escolhidos, IDs de eventos/leads e o que já foi confirmado ou cancelado.
+Responda apenas com o resumo, sem introdução.
+"""
+
+# Modelo pequeno (roteamento por tier): pede o modelo grande quando precisa
+ESCALATION_MARKER = "[ESCALAR]"
+
+SMALL_MODEL_ESCALATION_PROMPT = f"""
+## ⬆️ ESCALONAMENTO
+Se o cliente quiser agendar, remarcar ou cancelar reunião, fechar proposta, ou se você não tiver
+certeza da resposta, responda APENAS com {ESCALATION_MARKER} (sem nenhum outro texto).
+"""
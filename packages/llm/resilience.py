@@ -0,0 +1,80 @@
+"""
+Resiliência das chamadas à API da Anthropic
+Classificação de erros, backoff com jitter e limiar de hedge (p95)
+"""
+import random
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+import anthropic
+
+# 408 timeout, 409 conflito, 429 rate limit, 5xx e 529 overloaded
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Erros transitórios que valem nova tentativa"""
+    if isinstance(error, anthropic.APIConnectionError):  # inclui APITimeoutError
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Lê retry-after-ms / retry-after (segundos ou data HTTP) da resposta"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(error: Exception, attempt: int, base: float, cap: float) -> float:
+    """
+    Espera antes da tentativa `attempt` (1 = primeira repetição)
+
+    Usa o retry-after do servidor quando existe; senão backoff
+    exponencial com full jitter. Sempre limitado a `cap`.
+    """
+    server_delay = retry_after_seconds(error)
+    if server_delay is not None:
+        return min(server_delay, cap)
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class LatencyTracker:
+    """Janela das últimas latências para calcular o p95"""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
@@ -0,0 +1,136 @@
+"""
+Roteamento de modelos por tier
+Turnos simples vão para o modelo pequeno; agendamento e respostas
+incertas sobem para o modelo grande
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, List, Optional
+
+from anthropic.types import Message, TextBlock, ToolUseBlock
+
+from packages.llm.history import EMAIL_RE, has_tool_use
+from packages.llm.prompts import ESCALATION_MARKER, SMALL_MODEL_ESCALATION_PROMPT
+
+BOOKING_RE = re.compile(
+    r"\b(agend\w*|marc(ar|a|o|ação)|reuni(ão|ões|ao)|cancel\w*|remarc\w*|confirm\w*|convite)\b",
+    re.IGNORECASE
+)
+UNCERTAIN_RE = re.compile(
+    r"não (tenho certeza|sei (informar|responder)|consigo (responder|ajudar)|tenho essa informação)",
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """Modelo e parâmetros de um tier"""
+    name: str  # "small" | "large"
+    model: str
+    max_tokens: int
+    temperature: float
+    system_suffix: str = ""  # instruções extras do tier (bloco no fim do system)
+
+
+class ModelRouter:
+    """
+    Escolhe o tier inicial de um turno e decide quando escalar
+
+    O modelo pequeno escala quando pede uma tool de agendamento, responde
+    com o marcador de escalonamento ou falha nas heurísticas de confiança
+    (resposta vazia, cortada ou incerta).
+    """
+
+    def __init__(
+        self,
+        small: ModelTier,
+        large: ModelTier,
+        escalation_tools: Collection[str] = (),
+        booking_tools: Collection[str] = (),
+        enabled: bool = True,
+        max_small_message_chars: int = 600
+    ):
+        """
+        Args:
+            small: Tier rápido/barato (padrão dos turnos)
+            large: Tier completo
+            escalation_tools: Tools que exigem o modelo grande
+            booking_tools: tool_use destas tools no histórico = agendamento
+                em andamento (turno começa no modelo grande)
+            enabled: False = sempre o modelo grande
+            max_small_message_chars: Mensagens maiores vão direto ao grande
+        """
+        self.small = small
+        self.large = large
+        self.escalation_tools = set(escalation_tools)
+        self.booking_tools = set(booking_tools) | self.escalation_tools
+        self.enabled = enabled
+        self.max_small_message_chars = max_small_message_chars
+
+    def initial_tier(self, message: str, history: Optional[List[Dict[str, Any]]] = None) -> ModelTier:
+        """
+        Tier inicial pela mensagem e pelo histórico
+
+        Respostas curtas no meio de um agendamento ("14h", "pode ser") vão
+        direto ao modelo grande, que é quem chama create_event.
+        """
+        if not self.enabled:
+            return self.large
+        if len(message) > self.max_small_message_chars:
+            return self.large
+        if BOOKING_RE.search(message) or EMAIL_RE.search(message):
+            return self.large
+        if history and has_tool_use(history, self.booking_tools):
+            return self.large
+        return self.small
+
+    def escalation_possible(self, tier: ModelTier) -> bool:
+        """O turno neste tier ainda pode ser descartado e refeito"""
+        return tier is self.small and self.enabled
+
+    def escalation_reason(self, response: Message, tier: ModelTier) -> Optional[str]:
+        """
+        Motivo para refazer a chamada no modelo grande (None = aceitar)
+        """
+        if tier is not self.small:
+            return None
+
+        for block in response.content:
+            if isinstance(block, ToolUseBlock) and block.name in self.escalation_tools:
+                return f"tool:{block.name}"
+
+        text = "\n".join(block.text for block in response.content if isinstance(block, TextBlock)).strip()
+        if ESCALATION_MARKER in text:
+            return "requested"
+        if response.stop_reason == "max_tokens":
+            return "max_tokens"
+        if response.stop_reason == "end_turn":
+            if not text:
+                return "empty"
+            if UNCERTAIN_RE.search(text):
+                return "uncertain"
+        return None
+
+
+def default_router() -> ModelRouter:
+    """Router a partir do settings"""
+    from apps.orchestrator.settings import settings
+
+    return ModelRouter(
+        small=ModelTier(
+            name="small",
+            model=settings.anthropic_small_model,
+            max_tokens=settings.anthropic_small_max_tokens,
+            temperature=settings.anthropic_small_temperature,
+            system_suffix=SMALL_MODEL_ESCALATION_PROMPT
+        ),
+        large=ModelTier(
+            name="large",
+            model=settings.anthropic_model,
+            max_tokens=settings.anthropic_max_tokens,
+            temperature=settings.anthropic_temperature
+        ),
+        escalation_tools=settings.model_escalation_tools,
+        booking_tools=settings.booking_tools,
+        enabled=settings.model_routing_enabled
+    )
@@ -0,0 +1,102 @@
+"""
+Codificação compacta dos resultados de tools para o Claude
+Projeta só os campos úteis ao modelo, serializa em JSON compacto e
+limita ao orçamento de tokens da tool (o resultado completo fica nas actions)
+"""
+import json
+from typing import Any, Callable, Dict, Optional
+
+from packages.llm.history import estimate_tokens
+
+TRUNCATED = "…"
+
+
+def _pick(data: Dict[str, Any], *fields: str) -> Dict[str, Any]:
+    return {field: data[field] for field in fields if data.get(field) is not None}
+
+
+def _file_search(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "results": [
+            _pick(item, "content", "source", "score")
+            for item in result.get("results", [])
+        ]
+    }
+
+
+# Projeção por tool (resultado do MCP server -> campos que o modelo usa)
+PROJECTIONS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "file_search": _file_search,
+    "check_availability": lambda r: _pick(r, "date", "available_slots"),
+    "list_events": lambda r: {"events": r.get("events", [])},
+    "create_event": lambda r: _pick(r, "event_id", "title", "start", "end", "status", "meet_link", "attendee_email"),
+    "cancel_event": lambda r: _pick(r, "event_id", "status"),
+}
+
+
+def project_result(tool_name: str, result: Any) -> Any:
+    """Aplica a projeção da tool (erros e tools sem projeção passam inteiros)"""
+    projection = PROJECTIONS.get(tool_name)
+    if projection is None or not isinstance(result, dict) or "error" in result:
+        if isinstance(result, dict):
+            # O input ecoado no erro já está na mensagem do Claude
+            return {k: v for k, v in result.items() if k != "input"}
+        return result
+
+    try:
+        return projection(result)
+    except (AttributeError, KeyError, TypeError):
+        return result
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _shrink(value: Any, max_chars: int) -> Any:
+    """Corta strings longas e listas, do fim para o começo"""
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + TRUNCATED
+    if isinstance(value, list):
+        return [_shrink(item, max_chars) for item in value]
+    if isinstance(value, dict):
+        return {key: _shrink(item, max_chars) for key, item in value.items()}
+    return value
+
+
+def encode_tool_result(tool_name: str, result: Any, token_budget: Optional[int] = None) -> str:
+    """
+    Conteúdo do tool_result enviado ao Claude
+
+    Args:
+        tool_name: Nome da tool
+        result: Resultado completo (dict do MCP server)
+        token_budget: Máximo de tokens (None = sem limite)
+
+    Returns:
+        JSON compacto (ou texto, se o resultado não for estruturado)
+    """
+    projected = project_result(tool_name, result)
+    text = projected if isinstance(projected, str) else _dumps(projected)
+    if token_budget is None or estimate_tokens(text) <= token_budget:
+        return text
+
+    if not isinstance(projected, str):
+        # 1. Encurta textos longos (ex: chunks do file_search)
+        for max_chars in (1000, 600, 300, 150):
+            shrunk = _shrink(projected, max_chars)
+            text = _dumps(shrunk)
+            if estimate_tokens(text) <= token_budget:
+                return text
+
+        # 2. Remove itens do fim das listas (resultados menos relevantes)
+        for key, items in list(shrunk.items()) if isinstance(shrunk, dict) else []:
+            while isinstance(items, list) and len(items) > 1 and estimate_tokens(text) > token_budget:
+                items.pop()
+                shrunk["truncated"] = True
+                text = _dumps(shrunk)
+        if estimate_tokens(text) <= token_budget:
+            return text
+
+    # 3. Último recurso: corte bruto
+    return text[:token_budget * 4] + TRUNCATED
@@ -13,7 +13,7 @@ from pathlib import Path
 try:
     from mcp.server import Server
     from mcp.server.stdio import stdio_server
-    from mcp.types import Tool, TextContent
+    from mcp.types import Tool, TextContent, ToolAnnotations
 except ImportError:
     print("ERROR: MCP not installed. Run: pip install mcp")
     exit(1)
@@ -38,6 +38,25 @@ SCOPES = ['https://www.googleapis.com/auth/calendar']
 # Server MCP
 server = Server("alabia-calendar-server")
 
+# Status do Google que indicam falha da API (além de 5xx), não dado inválido
+UPSTREAM_STATUS = {401, 403, 408, 429}
+
+
+def is_upstream_error(error: BaseException) -> bool:
+    """
+    Falha do Google (5xx, auth, rate limit, rede), e não erro de negócio
+
+    O orquestrador conta essas falhas no circuit breaker do servidor.
+    """
+    while error is not None:
+        if isinstance(error, HttpError):
+            status = int(error.resp.status)
+            return status >= 500 or status in UPSTREAM_STATUS
+        if isinstance(error, OSError) or type(error).__module__.startswith(("google.auth", "httplib2")):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
 
 class CalendarClient:
     """Cliente para Google Calendar API"""
@@ -320,6 +339,33 @@ class CalendarClient:
 # Cliente global
 calendar_client = None
 
+# googleapiclient/httplib2 não é thread-safe: uma chamada por vez ao cliente
+calendar_lock = asyncio.Lock()
+
+
+async def run_locked(handler, **arguments) -> Any:
+    """
+    Roda o handler em thread segurando o calendar_lock até a thread terminar
+
+    Timeout/cancelamento não interrompe a thread: o lock só é liberado quando
+    ela deixa de usar o cliente, não quando quem chamou desistiu.
+    """
+    await calendar_lock.acquire()
+    try:
+        call = asyncio.ensure_future(asyncio.to_thread(handler, **arguments))
+    except BaseException:
+        calendar_lock.release()
+        raise
+
+    def release(future: asyncio.Future) -> None:
+        calendar_lock.release()
+        # Evita "exception was never retrieved" quando ninguém mais espera
+        if not future.cancelled():
+            future.exception()
+
+    call.add_done_callback(release)
+    return await asyncio.shield(call)
+
 
 @server.list_tools()
 async def list_tools() -> list[Tool]:
@@ -353,7 +399,8 @@ async def list_tools() -> list[Tool]:
                     }
                 },
                 "required": ["title", "start_datetime"]
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=False)
         ),
         Tool(
             name="check_availability",
@@ -375,7 +422,8 @@ async def list_tools() -> list[Tool]:
                     }
                 },
                 "required": ["date"]
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=True)
         ),
         Tool(
             name="list_events",
@@ -389,7 +437,8 @@ async def list_tools() -> list[Tool]:
                     }
                 },
                 "required": []
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=True)
         ),
         Tool(
             name="cancel_event",
@@ -407,7 +456,8 @@ async def list_tools() -> list[Tool]:
                     }
                 },
                 "required": ["event_id"]
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=False, destructiveHint=True)
         )
     ]
 
@@ -422,20 +472,24 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         error_result = {"error": "Calendar client not initialized", "tool": name}
         return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False))]
 
+    handlers = {
+        "create_event": calendar_client.create_event,
+        "check_availability": calendar_client.check_availability,
+        "list_events": calendar_client.list_events,
+        "cancel_event": calendar_client.cancel_event,
+    }
+
     try:
-        if name == "create_event":
-            result = calendar_client.create_event(**arguments)
-        elif name == "check_availability":
-            result = calendar_client.check_availability(**arguments)
-        elif name == "list_events":
-            result = calendar_client.list_events(**arguments)
-        elif name == "cancel_event":
-            result = calendar_client.cancel_event(**arguments)
-        else:
+        handler = handlers.get(name)
+        if handler is None:
             error_result = {"error": f"Unknown tool: {name}", "tool": name}
             return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False))]
 
-        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, indent=2))]
+        # Google API é bloqueante: roda em thread para não travar o event
+        # loop (importante no modo in-process)
+        result = await run_locked(handler, **arguments)
+
+        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False, separators=(",", ":")))]
 
     except Exception as e:
         logger.error(f"Error executing {name}: {e}", exc_info=True)
@@ -445,24 +499,38 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             "tool": name,
             "arguments": arguments
         }
+        if is_upstream_error(e):
+            error_result["error_type"] = "upstream"
         return [TextContent(type="text", text=json.dumps(error_result, ensure_ascii=False))]
 
 
-async def main():
-    """Main entry point"""
+async def setup():
+    """
+    Inicializa e autentica o cliente do Calendar
+
+    Usado pelo main (stdio) e pelo orquestrador no modo in-process.
+    """
     global calendar_client
 
-    # Inicializa cliente do Calendar
+    if calendar_client is not None:
+        return
+
     import os
     credentials_path = os.getenv("GOOGLE_CALENDAR_CREDENTIALS_JSON", "./secrets/google-credentials.json")
 
     logger.info(f"Initializing Calendar Server with credentials: {credentials_path}")
 
-    calendar_client = CalendarClient(credentials_path)
-    calendar_client.authenticate()
+    client = CalendarClient(credentials_path)
+    await asyncio.to_thread(client.authenticate)
+    calendar_client = client
 
     logger.info("Calendar MCP Server ready")
 
+
+async def main():
+    """Main entry point"""
+    await setup()
+
     # Roda servidor MCP via stdio
     async with stdio_server() as (read_stream, write_stream):
         await server.run(read_stream, write_stream, server.create_initialization_options())
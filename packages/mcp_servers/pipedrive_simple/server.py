@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 import httpx
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
+from mcp.types import Tool, TextContent, ToolAnnotations
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -103,8 +103,16 @@ class PipedriveClient:
                 "url": f"https://{DOMAIN}.pipedrive.com/leads/inbox/{lead_data['id']}"
             }
 
+def is_upstream_error(error):
+    """Falha do Pipedrive (5xx, auth, rate limit, rede), e não dado inválido"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status >= 500 or status in (401, 403, 408, 429)
+    return isinstance(error, httpx.TransportError)
+
 client = PipedriveClient(TOKEN, BASE_URL) if TOKEN and DOMAIN else None
 app = Server("pipedrive")
+server = app  # nome esperado pelo modo in-process do orquestrador
 
 @app.list_tools()
 async def list_tools():
@@ -122,7 +130,8 @@ async def list_tools():
                 "note": {"type": "string", "description": "Note with meeting details"}
             },
             "required": ["title", "person_name"]
-        }
+        },
+        annotations=ToolAnnotations(readOnlyHint=False)
     )]
 
 @app.call_tool()
@@ -133,7 +142,11 @@ async def call_tool(name, arguments):
         result = await client.create_lead(**arguments)
         return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False))]
     except Exception as e:
-        return [TextContent(type="text", text=json.dumps({"error": str(e)}))]
+        error_result = {"error": str(e)}
+        if is_upstream_error(e):
+            # Falha da API do Pipedrive: conta no circuit breaker do orquestrador
+            error_result["error_type"] = "upstream"
+        return [TextContent(type="text", text=json.dumps(error_result))]
 
 async def main():
     async with stdio_server() as (r, w):
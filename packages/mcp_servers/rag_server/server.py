@@ -17,7 +17,7 @@ load_dotenv()
 try:
     from mcp.server import Server
     from mcp.server.stdio import stdio_server
-    from mcp.types import Tool, TextContent
+    from mcp.types import Tool, TextContent, ToolAnnotations
 except ImportError:
     print("ERROR: MCP not installed. Run: pip install mcp")
     exit(1)
@@ -206,7 +206,8 @@ async def list_tools() -> list[Tool]:
                     }
                 },
                 "required": ["query"]
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=True)
         ),
         Tool(
             name="get_collection_stats",
@@ -215,7 +216,8 @@ async def list_tools() -> list[Tool]:
                 "type": "object",
                 "properties": {},
                 "required": []
-            }
+            },
+            annotations=ToolAnnotations(readOnlyHint=True)
         )
     ]
 
@@ -234,17 +236,19 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
             top_k = arguments.get("top_k", 5)
             min_score = arguments.get("min_score", 0.0)
 
-            result = rag_client.search(query=query, top_k=top_k, min_score=min_score)
+            # Embedding + Chroma são bloqueantes: roda em thread para não
+            # travar o event loop (importante no modo in-process)
+            result = await asyncio.to_thread(rag_client.search, query=query, top_k=top_k, min_score=min_score)
 
         elif name == "get_collection_stats":
-            result = rag_client.get_stats()
+            result = await asyncio.to_thread(rag_client.get_stats)
 
         else:
             return [TextContent(type="text", text=f"ERROR: Unknown tool: {name}")]
 
         return [TextContent(
             type="text",
-            text=json.dumps(result, ensure_ascii=False, indent=2)
+            text=json.dumps(result, ensure_ascii=False, separators=(",", ":"))
         )]
 
     except Exception as e:
@@ -252,10 +256,17 @@ async def call_tool(name: str, arguments: dict) -> list[TextContent]:
         return [TextContent(type="text", text=f"ERROR: {str(e)}")]
 
 
-async def main():
-    """Main entry point"""
+async def setup():
+    """
+    Inicializa o cliente RAG
+
+    Usado pelo main (stdio) e pelo orquestrador no modo in-process.
+    """
     global rag_client
 
+    if rag_client is not None:
+        return
+
     # Configuração
     chroma_dir = os.getenv("CHROMA_PERSIST_DIR", "./data/chroma_db")
     collection_name = os.getenv("CHROMA_COLLECTION", "alabia_docs")
@@ -265,13 +276,20 @@ async def main():
     logger.info(f"Collection: {collection_name}")
 
     # Inicializa RAG client
-    rag_client = RAGClient(
+    client = await asyncio.to_thread(
+        RAGClient,
         chroma_persist_dir=chroma_dir,
         collection_name=collection_name
     )
 
-    stats = rag_client.get_stats()
+    stats = client.get_stats()
     logger.info(f"RAG Server ready. Stats: {stats}")
+    rag_client = client
+
+
+async def main():
+    """Main entry point"""
+    await setup()
 
     # Roda servidor MCP via stdio
     async with stdio_server() as (read_stream, write_stream):
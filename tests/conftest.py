@@ -0,0 +1,10 @@
+"""
+Configuração compartilhada dos testes
+Define variáveis obrigatórias antes de importar settings
+"""
+import os
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "sk-ant-test")
+os.environ.setdefault("GOOGLE_CALENDAR_ID", "test@alabia.com")
+os.environ.setdefault("CONVERSATION_STORE_BACKEND", "memory")
+os.environ.setdefault("IDEMPOTENCY_BACKEND", "memory")
@@ -0,0 +1,47 @@
+"""
+MCP server mínimo para testar o modo in-process
+Segue o mesmo formato de packages/mcp_servers/*/server.py
+"""
+import asyncio
+import json
+
+from mcp.server import Server
+from mcp.types import Tool, TextContent, ToolAnnotations
+
+server = Server("fake-server")
+setup_calls = 0
+cancelled_calls = 0  # chamadas de "slow" canceladas pelo cliente
+
+
+@server.list_tools()
+async def list_tools() -> list[Tool]:
+    return [
+        Tool(
+            name="echo",
+            description="Devolve os argumentos",
+            inputSchema={"type": "object", "properties": {}},
+            annotations=ToolAnnotations(readOnlyHint=True)
+        ),
+        Tool(
+            name="slow",
+            description="Nunca responde",
+            inputSchema={"type": "object", "properties": {}}
+        )
+    ]
+
+
+@server.call_tool()
+async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+    global cancelled_calls
+    if name == "slow":
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled_calls += 1
+            raise
+    return [TextContent(type="text", text=json.dumps({"tool": name, "arguments": arguments}))]
+
+
+async def setup():
+    global setup_calls
+    setup_calls += 1
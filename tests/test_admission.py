@@ -0,0 +1,136 @@
+"""
+Testes do admission control (limite global, prioridade e SLO de fila)
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from apps.orchestrator.admission import (
+    PRIORITY_BOOKING,
+    PRIORITY_NEW,
+    PRIORITY_RETURNING,
+    AdmissionController,
+    AdmissionRejected,
+    turn_priority,
+)
+from apps.orchestrator.conversation_store import MemoryConversationStore
+
+BOOKING_TOOLS = {"check_availability", "create_event"}
+
+
+def test_turn_priority():
+    chat = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá!"}]
+    booking = chat + [
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "t", "name": "check_availability", "input": {}}]}
+    ]
+
+    assert turn_priority([], "oi", BOOKING_TOOLS) == PRIORITY_NEW
+    assert turn_priority(chat, "e o preço?", BOOKING_TOOLS) == PRIORITY_RETURNING
+    assert turn_priority(chat, "meu email é ana@empresa.com", BOOKING_TOOLS) == PRIORITY_BOOKING
+    assert turn_priority(booking, "pode ser", BOOKING_TOOLS) == PRIORITY_BOOKING
+
+
+async def test_free_slot_goes_to_highest_priority():
+    controller = AdmissionController(max_concurrent=1, max_queue=10)
+    release = asyncio.Event()
+    order = []
+
+    async def turn(name, priority):
+        async with controller.slot(priority):
+            order.append(name)
+            if name == "first":
+                await release.wait()
+
+    first = asyncio.create_task(turn("first", PRIORITY_NEW))
+    await asyncio.sleep(0.01)
+    waiting = [
+        asyncio.create_task(turn("greeting", PRIORITY_NEW)),
+        asyncio.create_task(turn("returning", PRIORITY_RETURNING)),
+        asyncio.create_task(turn("booking", PRIORITY_BOOKING)),
+    ]
+    await asyncio.sleep(0.01)
+    assert controller.stats()["queued_by_priority"] == {"booking": 1, "returning": 1, "new": 1}
+
+    release.set()
+    await asyncio.gather(first, *waiting)
+    assert order == ["first", "booking", "returning", "greeting"]
+    assert controller.stats()["in_flight"] == 0
+
+
+async def test_sheds_on_queue_full_and_slo():
+    controller = AdmissionController(
+        max_concurrent=1, max_queue=1,
+        queue_slo_seconds={PRIORITY_BOOKING: 1.0, PRIORITY_RETURNING: 1.0, PRIORITY_NEW: 0.02}
+    )
+    release = asyncio.Event()
+
+    async def hold():
+        async with controller.slot(PRIORITY_BOOKING):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+
+    # Espera real passa do SLO da prioridade
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot(PRIORITY_NEW):
+            pass
+    assert rejected.value.reason == "slo_timeout"
+    assert rejected.value.retry_after >= 1
+
+    queued = asyncio.create_task(controller.slot(PRIORITY_RETURNING).__aenter__())
+    await asyncio.sleep(0.01)
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot(PRIORITY_BOOKING):
+            pass
+    assert rejected.value.reason == "queue_full"
+
+    release.set()
+    await holder
+    await queued
+    controller._release()
+
+    stats = controller.stats()
+    assert stats["shed"] == {"queue_full": 1, "slo_estimate": 0, "slo_timeout": 1}
+    assert stats["shed_by_priority"] == {"booking": 1, "returning": 0, "new": 1}
+
+
+async def test_estimated_wait_rejects_without_queueing():
+    controller = AdmissionController(max_concurrent=1, queue_slo_seconds={PRIORITY_NEW: 5.0})
+    controller.avg_turn_seconds = 10.0
+    controller.in_flight = 1
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot(PRIORITY_NEW):
+            pass
+    assert rejected.value.reason == "slo_estimate"
+    assert rejected.value.retry_after == 10
+    assert controller.waiting == 0
+
+
+async def test_chat_returns_503_with_retry_after(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    controller.in_flight = 1
+    monkeypatch.setattr(chat, "admission", controller)
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/chat", json={"user_id": "55119", "message": "oi"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,172 @@
+"""
+Testes do cache semântico de respostas
+"""
+import time
+
+import httpx
+
+from apps.orchestrator.answer_cache import SemanticAnswerCache, normalize_message
+from apps.orchestrator.conversation_store import MemoryConversationStore
+from apps.orchestrator.settings import settings
+
+VOCAB = ["preco", "robo", "limpeza", "alabia", "faz", "empresa", "horario", "quanto", "custa"]
+
+
+async def bag_of_words(text):
+    """Embedding determinístico: contagem de palavras do vocabulário"""
+    words = text.split()
+    return [float(sum(word.startswith(term) for word in words)) for term in VOCAB] + [0.01]
+
+
+def make_cache(**kwargs):
+    return SemanticAnswerCache(embedder=bag_of_words, prompt_version="v1", threshold=0.9, **kwargs)
+
+
+def test_normalize_message():
+    assert normalize_message("  Quanto CUSTA o robô?? ") == "quanto custa o robo"
+
+
+async def test_similar_question_hits_and_different_misses():
+    cache = make_cache()
+    embedding = await cache.embed("Quanto custa o robô de limpeza?")
+    cache.store("Quanto custa o robô de limpeza?", embedding, {"response": "R$ 50 mil"})
+
+    entry, similarity = cache.lookup(await cache.embed("quanto custa robô limpeza"))
+    assert entry.response["response"] == "R$ 50 mil"
+    assert similarity >= 0.9
+
+    assert cache.lookup(await cache.embed("O que a Alabia faz?")) is None
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+async def test_ttl_and_prompt_version_invalidate():
+    cache = make_cache(ttl=0.01)
+    embedding = await cache.embed("quanto custa o robô")
+    cache.store("quanto custa o robô", embedding, {"response": "R$ 50 mil"})
+
+    cache.prompt_version = "v2"
+    assert cache.lookup(embedding) is None
+
+    cache.prompt_version = "v1"
+    time.sleep(0.02)
+    assert cache.lookup(embedding) is None
+    assert cache.stats()["expired"] == 1
+
+
+async def test_chat_serves_faq_from_cache_without_llm(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    llm_calls = []
+
+    async def fake_chat_with_tools(**kwargs):
+        llm_calls.append(kwargs["user_message"])
+        return {
+            "response": "O robô de limpeza custa R$ 50 mil.",
+            "actions": [{"tool": "file_search", "status": "success", "result": {"results": []}}],
+            "final_message": None
+        }
+
+    monkeypatch.setattr(settings, "answer_cache_enabled", True)
+    monkeypatch.setattr(chat, "answer_cache", make_cache())
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.post("/api/chat", json={"user_id": "1", "message": "Quanto custa o robô de limpeza?"})
+        second = await client.post("/api/chat", json={"user_id": "2", "message": "quanto custa robô de limpeza"})
+        # Contexto do cliente: nunca servido do cache
+        personal = await client.post("/api/chat", json={
+            "user_id": "3",
+            "message": "Quanto custa o robô de limpeza?",
+            "context": {"email": "ana@empresa.com"}
+        })
+
+    assert first.json()["metadata"].get("answer_cache") is None
+    assert second.json()["response"] == "O robô de limpeza custa R$ 50 mil."
+    assert second.json()["metadata"]["answer_cache"]["hit"] is True
+    assert personal.json()["metadata"].get("answer_cache") is None
+    assert llm_calls == ["Quanto custa o robô de limpeza?", "Quanto custa o robô de limpeza?"]
+
+
+async def test_cache_hit_is_saved_to_the_conversation(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    seen_history = []
+
+    async def fake_chat_with_tools(**kwargs):
+        seen_history.append(list(kwargs["conversation_history"]))
+        return {"response": "Sim, parcelamos em 12x.", "actions": [], "final_message": None}
+
+    cache = make_cache()
+    embedding = await cache.embed("Quanto custa o robô de limpeza?")
+    cache.store("Quanto custa o robô de limpeza?", embedding, {"response": "O robô de limpeza custa R$ 50 mil."})
+    store = MemoryConversationStore()
+    monkeypatch.setattr(settings, "answer_cache_enabled", True)
+    monkeypatch.setattr(chat, "answer_cache", cache)
+    monkeypatch.setattr(chat, "conversation_store", store)
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        hit = await client.post("/api/chat", json={"user_id": "1", "message": "quanto custa robô de limpeza"})
+        followup = await client.post("/api/chat", json={"user_id": "1", "message": "dá para parcelar esse valor?"})
+        streamed = await client.post("/api/chat/stream", json={"user_id": "2", "message": "quanto custa robô de limpeza"})
+
+    assert hit.json()["metadata"]["answer_cache"]["hit"] is True
+    # A pergunta seguinte vai ao LLM com a resposta do cache no histórico
+    assert followup.json()["metadata"].get("answer_cache") is None
+    assert seen_history == [[
+        {"role": "user", "content": "quanto custa robô de limpeza"},
+        {"role": "assistant", "content": "O robô de limpeza custa R$ 50 mil."}
+    ]]
+    assert len(await store.load("1")) == 4
+
+    assert '"answer_cache"' in streamed.text
+    assert await store.load("2") == [
+        {"role": "user", "content": "quanto custa robô de limpeza"},
+        {"role": "assistant", "content": "O robô de limpeza custa R$ 50 mil."}
+    ]
+
+
+async def test_turns_with_other_tools_are_not_stored(monkeypatch):
+    from apps.orchestrator.routes import chat
+
+    cache = make_cache()
+    monkeypatch.setattr(chat, "answer_cache", cache)
+    request = chat.ChatRequest(user_id="1", message="quanto custa")
+    embedding = await cache.embed("quanto custa")
+
+    chat._store_cached_answer(request, embedding, {
+        "response": "Agendado!",
+        "actions": [{"tool": "create_event", "status": "success", "result": {}}]
+    })
+    assert cache.stats()["entries"] == 0
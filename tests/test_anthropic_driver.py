@@ -0,0 +1,357 @@
+"""
+Testes do AnthropicDriver com cliente Anthropic simulado
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from anthropic.types import Message, TextBlock, ToolUseBlock, Usage
+
+from packages.llm.anthropic_driver import AnthropicDriver
+
+
+def make_message(content, stop_reason):
+    return Message(
+        id="msg_test",
+        type="message",
+        role="assistant",
+        model="claude-test",
+        content=content,
+        stop_reason=stop_reason,
+        stop_sequence=None,
+        usage=Usage(input_tokens=10, output_tokens=10)
+    )
+
+
+class ScriptedStream:
+    """Simula o MessageStream do SDK a partir de uma Message pronta"""
+
+    def __init__(self, message, delay=0.0):
+        self.message = message
+        self.delay = delay
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+        return False
+
+    @property
+    async def text_stream(self):
+        await asyncio.sleep(self.delay)
+        for block in self.message.content:
+            if isinstance(block, TextBlock):
+                for word in block.text.split(" "):
+                    yield word + " "
+
+    async def get_final_message(self):
+        return self.message
+
+
+class ScriptedMessages:
+    """Responde com as mensagens da lista, em ordem"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def create(self, **params):
+        self.requests.append(params)
+        response = self.responses.pop(0)
+        if isinstance(response, tuple):
+            delay, response = response
+            await asyncio.sleep(delay)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def stream(self, **params):
+        self.requests.append(params)
+        response = self.responses.pop(0)
+        if isinstance(response, tuple):
+            return ScriptedStream(response[1], delay=response[0])
+        return ScriptedStream(response)
+
+
+def scripted_driver(responses):
+    driver = AnthropicDriver(api_key="test", model="claude-test")
+    driver.client = SimpleNamespace(messages=ScriptedMessages(responses))
+    return driver
+
+
+async def test_tools_from_one_turn_run_in_parallel_in_original_order():
+    tool_turn = make_message([
+        TextBlock(type="text", text="Vou verificar."),
+        ToolUseBlock(type="tool_use", id="tu_1", name="check_availability", input={"date": "2026-10-19"}),
+        ToolUseBlock(type="tool_use", id="tu_2", name="check_availability", input={"date": "2026-10-20"}),
+        ToolUseBlock(type="tool_use", id="tu_3", name="file_search", input={"query": "preço"}),
+    ], "tool_use")
+    driver = scripted_driver([tool_turn, make_message([TextBlock(type="text", text="Pronto")], "end_turn")])
+
+    delays = {"2026-10-19": 0.2, "2026-10-20": 0.05}
+
+    async def executor(tool_name, tool_input):
+        await asyncio.sleep(delays.get(tool_input.get("date"), 0.1))
+        return {"tool": tool_name, **tool_input}
+
+    started = time.perf_counter()
+    result = await driver.chat_with_tools("oi", tools=[], tool_executor=executor)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.3
+    tool_results = driver.client.messages.requests[1]["messages"][-1]["content"]
+    assert [r["tool_use_id"] for r in tool_results] == ["tu_1", "tu_2", "tu_3"]
+    assert [a["tool"] for a in result["actions"]] == ["check_availability", "check_availability", "file_search"]
+    assert result["actions"][0]["duration_ms"] >= 200
+    assert result["response"] == "Pronto"
+
+
+async def test_ordered_tools_run_sequentially():
+    tool_turn = make_message([
+        ToolUseBlock(type="tool_use", id="tu_1", name="create_event", input={"title": "Demo"}),
+        ToolUseBlock(type="tool_use", id="tu_2", name="create_lead", input={"name": "Ana"}),
+        ToolUseBlock(type="tool_use", id="tu_3", name="file_search", input={"query": "preço"}),
+    ], "tool_use")
+    driver = scripted_driver([tool_turn, make_message([TextBlock(type="text", text="Ok")], "end_turn")])
+
+    events = []
+
+    async def executor(tool_name, tool_input):
+        events.append(f"start:{tool_name}")
+        await asyncio.sleep(0.05 if tool_name == "create_event" else 0.01)
+        events.append(f"end:{tool_name}")
+        return {"ok": True}
+
+    result = await driver.chat_with_tools(
+        "agenda",
+        tools=[],
+        tool_executor=executor,
+        ordered_tools={"create_event", "create_lead"}
+    )
+
+    assert events.index("end:create_event") < events.index("start:create_lead")
+    # Tools independentes não esperam a cadeia ordenada
+    assert events.index("start:file_search") < events.index("end:create_event")
+    assert all(action["status"] == "success" for action in result["actions"])
+
+
+async def test_stream_emits_text_tool_progress_and_summary():
+    tool_turn = make_message([
+        TextBlock(type="text", text="Vou verificar a agenda"),
+        ToolUseBlock(type="tool_use", id="tu_1", name="check_availability", input={"date": "2026-10-19"}),
+    ], "tool_use")
+    final_turn = make_message([TextBlock(type="text", text="Tenho horário às 10h")], "end_turn")
+    driver = scripted_driver([tool_turn, final_turn])
+
+    async def executor(tool_name, tool_input):
+        return {"available_slots": ["10:00"]}
+
+    events = [event async for event in driver.stream_with_tools("agenda", tools=[], tool_executor=executor)]
+    types = [event["type"] for event in events]
+
+    assert types[0] == "text_delta"
+    assert types.index("tool_started") < types.index("tool_finished") < len(types) - 1
+    assert types[-1] == "done"
+    assert events[-1]["response"] == "Tenho horário às 10h"
+    assert events[-1]["actions"][0]["result"] == {"available_slots": ["10:00"]}
+    # O resultado da tool volta para o Claude na segunda iteração
+    assert driver.client.messages.requests[1]["messages"][-1]["content"][0]["tool_use_id"] == "tu_1"
+
+
+async def test_chat_stream_endpoint_returns_ndjson(monkeypatch):
+    import json
+
+    import httpx
+
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    async def fake_stream(**kwargs):
+        yield {"type": "text_delta", "text": "Olá"}
+        yield {"type": "done", "response": "Olá", "actions": [], "final_message": None}
+
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "stream_with_tools", fake_stream)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/chat/stream", json={"user_id": "5511999999999", "message": "oi"})
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0] == {"type": "text_delta", "text": "Olá"}
+    assert events[-1]["type"] == "done"
+    assert events[-1]["response"] == "Olá"
+    assert events[-1]["metadata"]["user_id"] == "5511999999999"
+
+
+async def test_prompt_caching_marks_static_prefix_and_records_usage(monkeypatch):
+    from apps.orchestrator.routes.chat import _build_system_prompt
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_prompt_caching", True)
+    tool_turn = make_message([
+        ToolUseBlock(type="tool_use", id="tu_1", name="file_search", input={"query": "preço"}),
+    ], "tool_use")
+    tool_turn.usage = Usage(input_tokens=50, output_tokens=10, cache_creation_input_tokens=3000)
+    final_turn = make_message([TextBlock(type="text", text="Ok")], "end_turn")
+    final_turn.usage = Usage(input_tokens=80, output_tokens=5, cache_read_input_tokens=3000)
+    driver = scripted_driver([tool_turn, final_turn])
+
+    system = _build_system_prompt(None)
+    tools = [{"name": "file_search", "input_schema": {}}, {"name": "list_events", "input_schema": {}}]
+
+    async def executor(tool_name, tool_input):
+        return {"results": []}
+
+    result = await driver.chat_with_tools("quanto custa?", system=system, tools=tools, tool_executor=executor)
+
+    first, second = driver.client.messages.requests
+    assert first["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in first["system"][1]
+    assert "CONTEXTO TEMPORAL" in first["system"][1]["text"]
+    assert first["tools"][-1]["cache_control"] == {"type": "ephemeral"}
+    # Sem efeito colateral nas listas do chamador
+    assert "cache_control" not in tools[-1] and "cache_control" not in system[0]
+    # Breakpoint acompanha a última mensagem (tool_result) na iteração seguinte
+    assert second["messages"][-1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert second["messages"][0]["content"] == "quanto custa?"
+
+    assert result["usage"]["cache_creation_input_tokens"] == 3000
+    assert result["usage"]["cache_read_input_tokens"] == 3000
+    assert result["usage"]["api_calls"] == 2
+    assert driver.stats()["cache_read_ratio"] > 0
+
+
+def api_error(status, headers=None):
+    import anthropic
+    import httpx
+
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return anthropic.APIStatusError(f"status {status}", response=response, body=None)
+
+
+async def test_retries_transient_errors_honoring_retry_after(monkeypatch):
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_retry_base_seconds", 0.001)
+    ok = make_message([TextBlock(type="text", text="Oi")], "end_turn")
+    driver = scripted_driver([api_error(429, {"retry-after": "0.05"}), api_error(529), ok])
+
+    started = time.perf_counter()
+    response = await driver.chat(messages=[{"role": "user", "content": "oi"}])
+
+    assert response is ok
+    assert time.perf_counter() - started >= 0.05
+    assert driver.stats()["retries"] == 2
+
+
+async def test_non_retryable_and_exhausted_errors_are_raised(monkeypatch):
+    import anthropic
+    import pytest
+
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_retry_base_seconds", 0.001)
+    monkeypatch.setattr(settings, "anthropic_max_retries", 2)
+
+    driver = scripted_driver([api_error(400)])
+    with pytest.raises(anthropic.APIStatusError):
+        await driver.chat(messages=[{"role": "user", "content": "oi"}])
+    assert driver.retries == 0
+
+    driver = scripted_driver([api_error(503), api_error(503), api_error(503)])
+    with pytest.raises(anthropic.APIStatusError):
+        await driver.chat(messages=[{"role": "user", "content": "oi"}])
+    assert driver.retries == 2
+    assert driver.stats()["retries_exhausted"] == 1
+
+
+async def test_hedged_request_returns_fastest_response(monkeypatch):
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_hedge_min_samples", 5)
+    monkeypatch.setattr(settings, "anthropic_hedge_min_delay_seconds", 0.01)
+    slow = make_message([TextBlock(type="text", text="lenta")], "end_turn")
+    fast = make_message([TextBlock(type="text", text="rápida")], "end_turn")
+    driver = scripted_driver([(1.0, slow), (0.01, fast)])
+    for _ in range(10):
+        driver.latency["claude-test"].record(0.05)
+
+    started = time.perf_counter()
+    response = await driver.chat(messages=[{"role": "user", "content": "oi"}], hedge=True)
+
+    assert response is fast
+    assert time.perf_counter() - started < 0.5
+    assert driver.stats()["hedges_fired"] == 1
+    assert driver.stats()["hedge_wins"] == 1
+
+
+async def test_hedge_not_fired_when_primary_is_fast(monkeypatch):
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_hedge_min_samples", 5)
+    ok = make_message([TextBlock(type="text", text="Oi")], "end_turn")
+    driver = scripted_driver([ok])
+    for _ in range(10):
+        driver.latency["claude-test"].record(5.0)
+
+    assert await driver.chat(messages=[{"role": "user", "content": "oi"}], hedge=True) is ok
+    assert driver.hedges_fired == 0
+
+
+async def test_hedge_is_per_turn_and_per_model(monkeypatch):
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_hedge_enabled", True)
+    monkeypatch.setattr(settings, "anthropic_hedge_min_samples", 5)
+    monkeypatch.setattr(settings, "anthropic_hedge_min_delay_seconds", 0.01)
+    slow = make_message([TextBlock(type="text", text="lenta")], "end_turn")
+    driver = scripted_driver([(0.1, slow), (0.1, slow)])
+    for _ in range(10):
+        driver.latency["claude-test"].record(0.02)
+
+    # Turno que desligou o hedge não dispara segunda chamada
+    result = await driver.chat_with_tools("oi", tools=[], hedge=False)
+    assert result["response"] == "lenta"
+    # Outro modelo ainda não tem amostras: sem limiar, sem hedge
+    await driver.chat(messages=[{"role": "user", "content": "oi"}], model="claude-small")
+
+    assert driver.hedges_fired == 0
+    assert len(driver.client.messages.requests) == 2
+    assert set(driver.stats()["latency_p95_ms"]) == {"claude-test", "claude-small"}
+
+
+async def test_stream_hedges_on_first_token(monkeypatch):
+    from apps.orchestrator.settings import settings
+
+    monkeypatch.setattr(settings, "anthropic_hedge_min_samples", 5)
+    monkeypatch.setattr(settings, "anthropic_hedge_min_delay_seconds", 0.01)
+    slow = make_message([TextBlock(type="text", text="lenta")], "end_turn")
+    fast = make_message([TextBlock(type="text", text="rápida")], "end_turn")
+    driver = scripted_driver([(1.0, slow), (0.01, fast)])
+    for _ in range(10):
+        driver.first_token_latency["claude-test"].record(0.02)
+
+    started = time.perf_counter()
+    events = [event async for event in driver.stream_with_tools("oi", tools=[], hedge=True)]
+
+    assert time.perf_counter() - started < 0.5
+    assert "".join(e["text"] for e in events if e["type"] == "text_delta") == "rápida "
+    assert events[-1]["response"] == "rápida"
+    assert driver.hedges_fired == 1 and driver.hedge_wins == 1
@@ -0,0 +1,171 @@
+"""
+Testes do modo assíncrono do /chat (jobs + webhook)
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+
+import httpx
+import pytest
+
+from apps.orchestrator.chat_jobs import ChatJobQueue, JobQueueFull
+from apps.orchestrator.conversation_store import MemoryConversationStore
+
+
+def callback_transport(statuses, received):
+    """Callback que responde os status da lista, em ordem (depois 200)"""
+    async def handler(request: httpx.Request):
+        received.append(request)
+        status = statuses.pop(0) if statuses else 200
+        return httpx.Response(status)
+    return httpx.MockTransport(handler)
+
+
+async def wait_finished(queue, job_id, delivered=False):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job.finished_at and (not delivered or job.delivery["status"] != "pending"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+async def test_job_result_is_delivered_with_retries_and_signature():
+    received = []
+    queue = ChatJobQueue(
+        workers=1,
+        callback_url="http://backend/webhook",
+        callback_secret="segredo",
+        callback_retry_base_seconds=0.001,
+        transport=callback_transport([503, 500], received)
+    )
+
+    async def runner():
+        return {"response": "Agendado!"}
+
+    job = queue.submit("55119", runner)
+    job = await wait_finished(queue, job.id, delivered=True)
+
+    assert job.status == "succeeded"
+    assert job.delivery == {"status": "delivered", "attempts": 3, "error": None}
+    body = received[-1].content
+    assert json.loads(body)["result"] == {"response": "Agendado!"}
+    expected = hmac.new(b"segredo", body, hashlib.sha256).hexdigest()
+    assert received[-1].headers["X-Alabia-Signature"] == f"sha256={expected}"
+    await queue.shutdown()
+
+
+async def test_client_errors_are_not_retried():
+    received = []
+    queue = ChatJobQueue(
+        workers=1,
+        callback_url="http://backend/webhook",
+        callback_retry_base_seconds=0.001,
+        transport=callback_transport([404], received)
+    )
+
+    async def runner():
+        raise RuntimeError("boom")
+
+    job = queue.submit("55119", runner)
+    job = await wait_finished(queue, job.id, delivered=True)
+
+    assert job.status == "failed"
+    assert "boom" in job.error
+    assert job.delivery["status"] == "failed"
+    assert len(received) == 1
+    await queue.shutdown()
+
+
+async def test_bounded_queue_rejects_overflow():
+    release = asyncio.Event()
+    queue = ChatJobQueue(workers=1, max_queue=1)
+
+    async def runner():
+        await release.wait()
+        return {}
+
+    queue.submit("a", runner)
+    await asyncio.sleep(0.01)  # worker pega o primeiro
+    queue.submit("b", runner)
+    with pytest.raises(JobQueueFull):
+        queue.submit("c", runner)
+
+    assert queue.stats()["rejected"] == 1
+    release.set()
+    await queue.shutdown()
+
+
+async def test_async_mode_returns_202_and_supports_polling(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    async def fake_chat_with_tools(user_message, **kwargs):
+        await asyncio.sleep(0.05)
+        return {"response": "Olá!", "actions": [], "final_message": None}
+
+    queue = ChatJobQueue(workers=2)
+    monkeypatch.setattr(chat, "chat_jobs", queue)
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        accepted = await client.post("/api/chat?mode=async", json={"user_id": "55119", "message": "oi"})
+        assert accepted.status_code == 202
+        status_url = accepted.json()["status_url"]
+
+        pending = await client.get(status_url)
+        assert pending.json()["status"] in ("queued", "running")
+
+        await wait_finished(queue, accepted.json()["job_id"])
+        done = await client.get(status_url)
+        missing = await client.get("/api/chat/jobs/nope")
+
+    assert done.json()["status"] == "succeeded"
+    assert done.json()["result"]["response"] == "Olá!"
+    assert done.json()["delivery"]["status"] == "disabled"
+    assert missing.status_code == 404
+    await queue.shutdown()
+
+
+async def test_async_job_retries_admission_with_its_own_limit(monkeypatch):
+    from apps.orchestrator.admission import AdmissionRejected
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+    from apps.orchestrator.settings import settings
+
+    attempts = []
+
+    async def overloaded(request):
+        attempts.append(request.message)
+        raise AdmissionRejected("queue_full", retry_after=0)
+
+    queue = ChatJobQueue(workers=1)
+    monkeypatch.setattr(chat, "chat_jobs", queue)
+    monkeypatch.setattr(chat, "_submit_turn", overloaded)
+    monkeypatch.setattr(settings, "chat_job_admission_max_attempts", 3)
+    monkeypatch.setattr(settings, "chat_callback_max_attempts", 5)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        accepted = await client.post("/api/chat?mode=async", json={"user_id": "55119", "message": "oi"})
+
+    job = await wait_finished(queue, accepted.json()["job_id"])
+    assert job.status == "failed"
+    assert len(attempts) == 3
+    await queue.shutdown()
@@ -0,0 +1,172 @@
+"""
+Testes do store de conversas (memória, SQLite e tiered)
+"""
+import httpx
+import pytest
+from anthropic.types import TextBlock, ToolUseBlock
+
+from apps.orchestrator.conversation_store import (
+    ConversationStore,
+    MemoryConversationStore,
+    SQLiteConversationStore,
+    TieredConversationStore,
+    normalize_messages,
+)
+from packages.llm.history import HistoryManager
+
+
+def turn(text, answer):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": answer}]
+
+
+def test_normalize_messages_drops_sdk_objects_and_cache_control():
+    messages = normalize_messages([
+        {"role": "user", "content": [{"type": "text", "text": "oi", "cache_control": {"type": "ephemeral"}}]},
+        {"role": "assistant", "content": [
+            TextBlock(type="text", text=""),
+            ToolUseBlock(type="tool_use", id="tu_1", name="list_events", input={"days": 1})
+        ]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "tu_1", "content": "{}"}]},
+        {"role": "assistant", "content": "Pronto"}
+    ])
+
+    assert messages == [
+        {"role": "user", "content": "oi"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "tu_1", "name": "list_events", "input": {"days": 1}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "tu_1", "content": "{}"}]},
+        {"role": "assistant", "content": "Pronto"}
+    ]
+
+
+def test_store_interface_requires_load_append_clear():
+    class Incomplete(ConversationStore):
+        async def load(self, user_id):
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+async def test_memory_store_lru_and_trim():
+    store = MemoryConversationStore(max_users=2, max_messages=4)
+    await store.append("a", turn("1", "r1"))
+    await store.append("b", turn("1", "r1"))
+    await store.load("a")
+    await store.append("c", turn("1", "r1"))  # "b" é o menos recente
+
+    assert await store.load("b") == []
+    assert store.stats()["evictions"] == 1
+
+    await store.append("a", turn("2", "r2") + turn("3", "r3"))
+    # Passou do limite: fica a metade mais recente
+    assert await store.load("a") == turn("3", "r3")
+
+
+async def test_sqlite_store_persists_and_trims_at_user_turn(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    store = SQLiteConversationStore(path, max_messages=4)
+    await store.append("a", turn("1", "r1"))
+    await store.append("a", [
+        {"role": "user", "content": "2"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "t", "name": "x", "input": {}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "ok"}]},
+        {"role": "assistant", "content": "r2"}
+    ])
+    store.close()
+
+    reopened = SQLiteConversationStore(path, max_messages=4)
+    # Corte cairia no tool_result: começa na próxima mensagem do usuário
+    assert await reopened.load("a") == []
+    assert await reopened.append("a", turn("3", "r3")) is None
+    assert await reopened.load("a") == turn("3", "r3")
+    assert await reopened.last_seq("a") == 8
+    assert await reopened.append_versioned("a", turn("4", "r4")) == 10
+
+    await reopened.clear("a")
+    assert await reopened.load("a") == []
+
+
+async def test_tiered_store_revalidates_against_sqlite(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    worker_a = TieredConversationStore(MemoryConversationStore(), SQLiteConversationStore(path))
+    worker_b = TieredConversationStore(MemoryConversationStore(), SQLiteConversationStore(path))
+
+    await worker_a.append("u", turn("1", "r1"))
+    assert await worker_a.load("u") == turn("1", "r1")
+    assert await worker_a.load("u") == turn("1", "r1")
+    assert worker_a.hits == 1
+
+    # Outro worker escreveu: a cópia em memória do primeiro fica inválida
+    await worker_b.append("u", turn("2", "r2"))
+    assert await worker_a.load("u") == turn("1", "r1") + turn("2", "r2")
+
+
+async def test_chat_only_needs_the_new_message(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    seen_history = []
+
+    async def fake_chat_with_tools(user_message, conversation_history, **kwargs):
+        seen_history.append(list(conversation_history))
+        return {
+            "response": f"resposta para {user_message}",
+            "actions": [],
+            "messages": [
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": f"resposta para {user_message}"}
+            ],
+            "final_message": None
+        }
+
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post("/api/chat", json={"user_id": "55119", "message": "oi"})
+        await client.post("/api/chat", json={"user_id": "55119", "message": "tudo bem?"})
+        cleared = await client.delete("/api/chat/conversations/55119")
+        await client.post("/api/chat", json={"user_id": "55119", "message": "de novo"})
+
+    assert seen_history[0] == []
+    assert seen_history[1] == turn("oi", "resposta para oi")
+    assert cleared.json()["cleared"] is True
+    assert seen_history[2] == []
+
+
+async def test_trimmed_messages_keep_key_facts_in_summary(tmp_path):
+    booking = [
+        {"role": "user", "content": "Meu email é ana.souza@empresa.com.br, quero 2026-10-20T15:00"},
+        {"role": "assistant", "content": "Agendado! event_id: evt8f3k2l9q"},
+    ]
+    for store_factory in (
+        lambda fold: MemoryConversationStore(max_messages=10, on_trim=fold),
+        lambda fold: SQLiteConversationStore(str(tmp_path / "trim.db"), max_messages=10, on_trim=fold),
+    ):
+        manager = HistoryManager(keep_turns=2, token_budget=5000)
+        store = store_factory(manager.fold)
+        await store.append("a", booking)
+        for i in range(6):
+            await store.append("a", turn(f"pergunta {i}", f"resposta {i}"))
+
+        history = await store.load("a")
+        assert booking[0] not in history  # passou do limite: início cortado
+
+        summary = manager.compact("a", history).summary
+        assert "ana.souza@empresa.com.br" in summary
+        assert "2026-10-20T15:00" in summary
+        assert "evt8f3k2l9q" in summary
@@ -0,0 +1,165 @@
+"""
+Testes da compactação do histórico por orçamento de tokens
+"""
+from packages.llm.history import HistoryManager, estimate_tokens, message_tokens
+
+
+def long_conversation(turns=30):
+    """Conversa de WhatsApp com fatos-chave no começo e no meio"""
+    messages = [
+        {"role": "user", "content": "Oi, meu email é ana.souza@empresa.com.br e quero uma demo"},
+        {"role": "assistant", "content": "Olá Ana! Temos horários amanhã às 10:00 e 15:00. Qual prefere?"},
+        {"role": "user", "content": "Pode ser 2026-10-20T15:00 então"},
+        {"role": "assistant", "content": "Agendado! event_id: evt8f3k2l9q, convite enviado para ana.souza@empresa.com.br"},
+    ]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Pergunta {i} sobre robôs de limpeza " + "detalhe " * 40})
+        messages.append({"role": "assistant", "content": f"Resposta {i} sobre o catálogo " + "informação " * 40})
+    return messages
+
+
+def test_compact_keeps_recent_turns_and_key_facts_within_budget():
+    manager = HistoryManager(keep_turns=3, token_budget=1500, summary_token_budget=300)
+    messages = long_conversation()
+
+    compact = manager.compact("5511999999999", messages)
+
+    assert compact.messages == messages[-6:]
+    assert compact.tokens <= 1500
+    assert compact.dropped == len(messages) - 6
+    assert "ana.souza@empresa.com.br" in compact.summary
+    assert "2026-10-20T15:00" in compact.summary
+    assert "evt8f3k2l9q" in compact.summary
+
+
+def test_budget_drops_oldest_recent_turns_and_starts_with_user():
+    manager = HistoryManager(keep_turns=10, token_budget=600, summary_token_budget=150)
+    messages = long_conversation(turns=10)
+
+    compact = manager.compact("5511999999999", messages)
+
+    assert compact.messages[0]["role"] == "user"
+    assert compact.messages[-1] == messages[-1]
+    assert estimate_tokens(compact.summary) + sum(message_tokens(m) for m in compact.messages) <= 600
+    assert "evt8f3k2l9q" in compact.summary
+
+
+def test_keep_turns_counts_user_turns_with_tool_calls():
+    manager = HistoryManager(keep_turns=2, token_budget=10000)
+    messages = []
+    for i in range(3):
+        messages += [
+            {"role": "user", "content": f"Tem horário dia {20 + i}?"},
+            {"role": "assistant", "content": [{"type": "tool_use", "id": f"t{i}", "name": "check_availability", "input": {}}]},
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": f"t{i}", "content": "10:00"}]},
+            {"role": "assistant", "content": "Tem às 10:00"},
+        ]
+
+    compact = manager.compact("5511999999999", messages)
+
+    # Dois turnos inteiros, com os tool_use/tool_result
+    assert compact.messages == messages[4:]
+    assert compact.dropped == 4
+
+
+def test_short_conversation_is_unchanged():
+    manager = HistoryManager(keep_turns=6)
+    messages = long_conversation(turns=0)
+
+    compact = manager.compact("5511999999999", messages)
+
+    assert compact.messages == messages
+    assert compact.summary == ""
+    assert compact.dropped == 0
+
+
+async def test_rolling_summary_is_refreshed_in_background():
+    calls = []
+
+    async def summarizer(previous, new_transcript):
+        calls.append((previous, new_transcript))
+        # O modelo pode omitir fatos; eles continuam nos fatos-chave
+        return f"Resumo {len(calls)}: cliente Ana quer demo de robôs"
+
+    manager = HistoryManager(summarizer=summarizer, keep_turns=3, token_budget=2000)
+    messages = long_conversation(turns=10)
+
+    task = manager.schedule_refresh("5511999999999", messages)
+    await task
+
+    assert len(calls) == 1
+    assert "ana.souza@empresa.com.br" in calls[0][1]
+
+    # Próximo turno: resumo do modelo + só o que ele ainda não cobre
+    messages += [
+        {"role": "user", "content": "E o preço do modelo X?"},
+        {"role": "assistant", "content": "O modelo X custa R$ 50 mil."},
+    ]
+    compact = manager.compact("5511999999999", messages)
+
+    assert "Resumo 1" in compact.summary
+    assert "evt8f3k2l9q" in compact.summary
+    assert "2026-10-20T15:00" in compact.summary
+    assert "ana.souza@empresa.com.br" in compact.summary
+    assert compact.messages[-2:] == messages[-2:]
+
+    # Atualização incremental: só as mensagens novas vão para o modelo
+    await manager.schedule_refresh("5511999999999", messages)
+    assert calls[1][0] == "Resumo 1: cliente Ana quer demo de robôs"
+    assert "ana.souza" not in calls[1][1]
+    assert manager.stats()["summaries_built"] == 2
+
+
+async def test_summary_is_discarded_when_history_diverges():
+    async def summarizer(previous, new_transcript):
+        return "Resumo antigo"
+
+    manager = HistoryManager(summarizer=summarizer, keep_turns=2)
+    await manager.schedule_refresh("5511999999999", long_conversation(turns=5))
+
+    other = [{"role": "user", "content": f"conversa nova {i}"} for i in range(10)]
+    compact = manager.compact("5511999999999", other)
+
+    assert "Resumo antigo" not in compact.summary
+
+
+async def test_model_summary_survives_head_trim():
+    calls = []
+
+    async def summarizer(previous, new_transcript):
+        calls.append(previous)
+        return "Resumo: Ana agendou demo"
+
+    manager = HistoryManager(summarizer=summarizer, keep_turns=2, token_budget=5000)
+    messages = long_conversation(turns=6)
+    await manager.schedule_refresh("5511999999999", messages)
+
+    # Store corta as 6 primeiras mensagens (já cobertas pelo resumo)
+    manager.fold("5511999999999", messages[:6])
+    trimmed = messages[6:]
+    compact = manager.compact("5511999999999", trimmed)
+
+    assert "Resumo: Ana agendou demo" in compact.summary
+    assert "ana.souza@empresa.com.br" in compact.summary
+    assert "evt8f3k2l9q" in compact.summary
+    assert compact.messages == trimmed[-4:]
+
+    # Próxima atualização continua do resumo anterior
+    await manager.schedule_refresh("5511999999999", trimmed + messages[-2:])
+    assert calls[-1] == "Resumo: Ana agendou demo"
+
+
+async def test_llm_summarizer_uses_given_model():
+    from anthropic.types import TextBlock
+
+    from packages.llm.anthropic_driver import AnthropicDriver
+    from packages.llm.history import llm_summarizer
+    from tests.test_anthropic_driver import scripted_driver, make_message
+
+    driver = scripted_driver([make_message([TextBlock(type="text", text="Cliente quer orçamento.")], "end_turn")])
+    summarize = llm_summarizer(driver, max_tokens=200, model="claude-small")
+
+    assert await summarize("", "user: quanto custa?") == "Cliente quer orçamento."
+    request = driver.client.messages.requests[0]
+    assert request["model"] == "claude-small" and request["max_tokens"] == 200
+    assert AnthropicDriver.extract_text(make_message([], "end_turn")) == ""
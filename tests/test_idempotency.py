@@ -0,0 +1,154 @@
+"""
+Testes das chaves de idempotência do /chat
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from apps.orchestrator.conversation_store import MemoryConversationStore
+from apps.orchestrator.idempotency import IdempotencyStore, SQLiteIdempotencyStore
+
+
+async def test_duplicates_join_and_replay():
+    store = IdempotencyStore(ttl=60)
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "Agendado!"
+
+    (first, first_replay), (second, second_replay) = await asyncio.gather(
+        store.run("k", factory), store.run("k", factory)
+    )
+    third, third_replay = await store.run("k", factory)
+
+    assert calls == 1
+    assert (first, first_replay) == ("Agendado!", None)
+    assert (second, second_replay) == ("Agendado!", "in_flight")
+    assert (third, third_replay) == ("Agendado!", "completed")
+    assert store.stats()["executions"] == 1
+
+
+async def test_failures_are_not_stored_and_ttl_expires():
+    store = IdempotencyStore(ttl=0.01)
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("timeout")
+        return attempts
+
+    with pytest.raises(RuntimeError):
+        await store.run("k", flaky)
+    assert await store.run("k", flaky) == (2, None)
+
+    await asyncio.sleep(0.02)
+    assert await store.run("k", flaky) == (3, None)
+
+
+async def test_abandoned_original_keeps_running():
+    store = IdempotencyStore()
+    finished = asyncio.Event()
+
+    async def factory():
+        await asyncio.sleep(0.02)
+        finished.set()
+        return "ok"
+
+    original = asyncio.create_task(store.run("k", factory))
+    await asyncio.sleep(0.005)
+    original.cancel()  # provedor desistiu do request
+
+    assert await store.run("k", factory) == ("ok", "in_flight")
+    assert finished.is_set()
+
+
+async def test_sqlite_store_dedupes_across_workers(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    # Um store por "worker", mesmo banco
+    workers = [SQLiteIdempotencyStore(path, ttl=60, poll_interval=0.01) for _ in range(3)]
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"response": "Agendado!"}
+
+    first, second = await asyncio.gather(workers[0].run("k", factory), workers[1].run("k", factory))
+    late = await workers[2].run("k", factory)
+
+    assert calls == 1
+    assert sorted(str(replay) for _, replay in (first, second)) == ["None", "in_flight"]
+    assert late == ({"response": "Agendado!"}, "completed")
+
+
+async def test_sqlite_store_releases_failed_and_expired_reservations(tmp_path):
+    path = str(tmp_path / "conversations.db")
+    store = SQLiteIdempotencyStore(path, poll_interval=0.01)
+
+    async def failing():
+        raise RuntimeError("timeout")
+
+    with pytest.raises(RuntimeError):
+        await store.run("k", failing)
+    # Falha libera a chave: outro worker executa a reentrega
+    assert await SQLiteIdempotencyStore(path).run("k", lambda: asyncio.sleep(0, "ok")) == ("ok", None)
+
+    # Reserva de um worker que morreu no meio expira com o lease
+    SQLiteIdempotencyStore(path, lease=0.01)._claim("crashed")
+    await asyncio.sleep(0.02)
+    assert await store.run("crashed", lambda: asyncio.sleep(0, "ok")) == ("ok", None)
+
+
+async def test_chat_retry_does_not_repeat_side_effects(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    created = []
+
+    async def fake_chat_with_tools(user_message, **kwargs):
+        await asyncio.sleep(0.05)
+        created.append(user_message)
+        return {
+            "response": "Reunião agendada!",
+            "actions": [{"tool": "create_event", "status": "success", "result": {"event_id": "abc"}}],
+            "final_message": None
+        }
+
+    monkeypatch.setattr(chat, "idempotency_store", IdempotencyStore())
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    body = {"user_id": "55119", "message": "pode agendar amanhã 10h", "message_id": "wamid.1"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first, retry = await asyncio.gather(
+            client.post("/api/chat", json=body),
+            client.post("/api/chat", json=body)
+        )
+        late = await client.post("/api/chat", json={**body, "message_id": None}, headers={"Idempotency-Key": "wamid.1"})
+
+    assert created == ["pode agendar amanhã 10h"]
+    assert first.json()["response"] == retry.json()["response"] == late.json()["response"]
+    replays = sorted(str(r.json()["metadata"].get("idempotent_replay")) for r in (first, retry))
+    assert replays == ["None", "in_flight"]
+    assert late.json()["metadata"]["idempotent_replay"] == "completed"
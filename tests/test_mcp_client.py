@@ -0,0 +1,547 @@
+"""
+Testes do MCPOrchestrator com servidores stub (sem subprocessos)
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from apps.orchestrator.mcp_client import (
+    InProcessMCPConnection,
+    MCPConnection,
+    MCPOrchestrator,
+    MCPServerPool,
+)
+from apps.orchestrator.settings import settings
+
+
+READ_ONLY_TOOLS = {"file_search", "get_collection_stats", "check_availability", "list_events"}
+
+STUB_TOOLS = {
+    "rag": ["file_search", "get_collection_stats"],
+    "calendar": ["create_event", "check_availability", "list_events", "cancel_event"],
+    "pipedrive": ["create_lead"],
+}
+
+
+def stub_tool_dicts(server_name):
+    return [
+        {
+            "name": tool_name,
+            "description": "",
+            "inputSchema": {},
+            "annotations": {"readOnlyHint": tool_name in READ_ONLY_TOOLS}
+        }
+        for tool_name in STUB_TOOLS[server_name]
+    ]
+
+
+@pytest.fixture(autouse=True)
+def no_warm_standby(monkeypatch):
+    """Standby sobe subprocessos extras; só os testes do supervisor ligam"""
+    monkeypatch.setattr(settings, "mcp_warm_standby", False)
+
+
+class StubConnection:
+    """Substitui MCPConnection sem subprocesso"""
+
+    def __init__(self, server_name, spawns, delay=0.05, failing=(), call_delay=0.0, replies=None):
+        self.server_name = server_name
+        self.replies = replies or {}
+        self.spawns = spawns
+        self.delay = delay
+        self.failing = failing
+        self.call_delay = call_delay
+        self.in_flight = 0
+        self.calls = 0
+        self.last_used = time.monotonic()
+        self.closed = False
+        self.started = False
+        self.crashed = False
+
+    @property
+    def is_alive(self):
+        return self.started and not self.closed
+
+    async def start(self):
+        self.spawns[self.server_name] += 1
+        await asyncio.sleep(self.delay)
+        if self.server_name in self.failing:
+            raise ConnectionError(f"{self.server_name} crashed")
+        self.started = True
+        return stub_tool_dicts(self.server_name)
+
+    async def call_tool(self, tool_name, tool_input, timeout=None):
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.sleep(self.call_delay)
+            payload = json.dumps(self.replies.get(tool_name) or {"tool": tool_name, "input": tool_input})
+            return SimpleNamespace(content=[SimpleNamespace(text=payload)])
+        finally:
+            self.in_flight -= 1
+            self.last_used = time.monotonic()
+
+    async def ping(self, timeout):
+        if self.crashed or not self.is_alive:
+            raise ConnectionError("session dead")
+        return 1.0
+
+    async def close(self):
+        self.closed = True
+
+
+def install_stub_servers(orchestrator, spawns: Counter, **kwargs):
+    """Troca as conexões reais por stubs que contam quantas vezes sobem"""
+    created = []
+
+    def factory(server_name):
+        connection = StubConnection(server_name, spawns, **kwargs)
+        created.append(connection)
+        return connection
+
+    orchestrator._connection_factory = factory
+    return created
+
+
+async def test_concurrent_initialize_spawns_each_server_once():
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns)
+
+    await asyncio.gather(*(orchestrator.initialize() for _ in range(200)))
+
+    assert spawns == Counter({"rag": 1, "calendar": 1, "pipedrive": 1})
+    assert orchestrator.is_initialized and orchestrator.is_ready
+    assert len(orchestrator.tools) == 7
+
+
+async def test_concurrent_initialize_shares_error():
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, failing=set(STUB_TOOLS))
+
+    results = await asyncio.gather(
+        *(orchestrator.initialize() for _ in range(50)),
+        return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len({id(r) for r in results}) == 1
+    assert sum(spawns.values()) == 3
+    assert not orchestrator.is_initialized
+
+    # Depois da falha, uma nova chamada tenta de novo
+    await asyncio.gather(orchestrator.initialize(), return_exceptions=True)
+    assert sum(spawns.values()) == 6
+
+
+async def test_partial_failure_keeps_other_servers():
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, failing={"pipedrive"})
+
+    await orchestrator.initialize()
+
+    assert orchestrator.is_initialized and not orchestrator.is_ready
+    assert orchestrator.server_status["pipedrive"]["state"] == "failed"
+    assert "create_lead" not in orchestrator.tools
+
+
+async def test_restart_server_keeps_others():
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns)
+    await orchestrator.initialize()
+
+    old_calendar = orchestrator.servers["calendar"].connections[0]
+    rag_pool = orchestrator.servers["rag"]
+
+    await asyncio.gather(*(orchestrator.restart_server("calendar") for _ in range(20)))
+
+    assert spawns["calendar"] == 2
+    assert spawns["rag"] == 1
+    assert old_calendar.closed
+    assert orchestrator.servers["rag"] is rag_pool
+    assert orchestrator.server_for_tool["check_availability"] == "calendar"
+
+
+async def test_200_concurrent_first_chat_requests(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns)
+    monkeypatch.setattr(chat, "mcp_orchestrator", orchestrator)
+
+    async def fake_chat_with_tools(**kwargs):
+        return {"response": "Olá!", "actions": [], "final_message": None}
+
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(*(
+            client.post("/api/chat", json={"user_id": f"55119{i:08d}", "message": "oi"})
+            for i in range(200)
+        ))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert spawns == Counter({"rag": 1, "calendar": 1, "pipedrive": 1})
+    # Pipedrive é lazy: só descobriu as tools e foi parado
+    assert set(orchestrator.servers) == {"rag", "calendar"}
+
+
+async def test_pool_dispatches_to_least_loaded_and_scales(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_pool_scale_up_queue_depth", 1)
+    monkeypatch.setattr(settings, "mcp_pool_idle_seconds", 0)
+    spawns = Counter()
+    created = []
+
+    def factory(server_name):
+        connection = StubConnection(server_name, spawns, delay=0, call_delay=0.05)
+        created.append(connection)
+        return connection
+
+    pool = MCPServerPool("calendar", factory, min_size=2, max_size=3)
+    await pool.start()
+
+    await asyncio.gather(*(pool.call_tool("check_availability", {"date": "2026-10-19"}) for _ in range(8)))
+
+    # Despacho por menor carga distribui entre as sessões iniciais
+    assert created[0].calls > 0 and created[1].calls > 0
+    # Fila acima do limite sobe uma sessão extra, nunca além do máximo
+    assert len(pool.connections) == 3
+
+    await pool.shrink()
+    assert len(pool.connections) == 2
+
+    await pool.close()
+    assert all(connection.closed for connection in created)
+
+
+async def test_supervisor_fails_over_to_warm_standby(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_warm_standby", True)
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    created = install_stub_servers(orchestrator, spawns, delay=0)
+    await orchestrator.initialize()
+    await asyncio.sleep(0.01)  # standby sobe em background
+
+    pool = orchestrator.servers["calendar"]
+    standby = pool.standby
+    assert standby is not None and standby.is_alive
+
+    crashed = pool.connections[0]
+    crashed.crashed = True
+    await orchestrator.supervisor.check_server("calendar")
+
+    assert crashed.closed
+    assert pool.connections == [standby]
+    assert pool.restarts == 1
+    assert orchestrator.server_status["calendar"]["state"] == "ready"
+    assert pool.last_probe["dead"] == 1
+
+    await asyncio.sleep(0.01)  # nova standby
+    assert pool.standby is not None and pool.standby is not standby
+    # Sessão principal, standby promovida e a nova standby
+    assert [c for c in created if c.server_name == "calendar"] == [crashed, standby, pool.standby]
+    await orchestrator.shutdown()
+
+
+async def test_supervisor_retries_failed_server_with_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_restart_backoff_base_seconds", 60)
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, delay=0, failing={"pipedrive"})
+    await orchestrator.initialize()
+    assert spawns["pipedrive"] == 1
+
+    await orchestrator.supervisor.check_server("pipedrive")
+    assert spawns["pipedrive"] == 2
+    assert orchestrator.supervisor.failures["pipedrive"] == 1
+
+    # Dentro da janela de backoff não tenta de novo
+    await orchestrator.supervisor.check_server("pipedrive")
+    assert spawns["pipedrive"] == 2
+    assert orchestrator.health()["servers"]["pipedrive"]["supervisor"]["next_restart_in_s"] > 0
+    await orchestrator.shutdown()
+
+
+class HangingSession:
+    """ClientSession falsa cuja tool nunca responde"""
+
+    def __init__(self):
+        self.notifications = []
+
+    async def send_request(self, request, result_type):
+        await asyncio.sleep(3600)
+
+    async def send_notification(self, notification):
+        self.notifications.append(notification)
+
+
+class HangingConnection(MCPConnection):
+    """MCPConnection real sobre uma sessão que trava"""
+
+    def __init__(self, server_name):
+        super().__init__(server_name, params=None)
+
+    async def start(self):
+        self.session = HangingSession()
+        self._task = asyncio.create_task(self._stop.wait())
+        return stub_tool_dicts(self.server_name)
+
+
+async def test_tool_timeout_cancels_request_and_returns_structured_error(monkeypatch):
+    monkeypatch.setattr(settings, "tool_timeout_overrides", {"check_availability": 0.05})
+    orchestrator = MCPOrchestrator()
+    orchestrator._connection_factory = HangingConnection
+    await orchestrator.initialize()
+
+    started = time.perf_counter()
+    result = await orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+
+    assert time.perf_counter() - started < 1
+    assert result["error_type"] == "timeout"
+    assert result["timeout_seconds"] == 0.05
+    assert result["retryable"] is True
+
+    connection = orchestrator.servers["calendar"].connections[0]
+    assert connection.in_flight == 0
+    await orchestrator.shutdown()
+
+
+async def test_write_tool_timeout_is_not_retryable(monkeypatch):
+    monkeypatch.setattr(settings, "tool_timeout_overrides", {"create_event": 0.05})
+    orchestrator = MCPOrchestrator()
+    orchestrator._connection_factory = HangingConnection
+    await orchestrator.initialize()
+
+    result = await orchestrator.execute_tool("create_event", {"date": "2026-10-19"})
+
+    # Evento pode ter sido criado: o modelo confere antes de repetir
+    assert result["error_type"] == "timeout"
+    assert result["retryable"] is False
+    assert result["outcome"] == "unknown"
+    assert "list_events" in result["hint"]
+    await orchestrator.shutdown()
+
+
+async def test_timed_out_call_is_cancelled_on_the_server():
+    from tests import fake_mcp_server
+
+    connection = InProcessMCPConnection("fake", "tests.fake_mcp_server")
+    await connection.start()
+    # Outras requisições antes e em paralelo: o cancelamento tem de acertar o ID da tools/call
+    await connection.call_tool("echo", {}, timeout=5)
+    pings = asyncio.gather(*(connection.ping(timeout=5) for _ in range(3)))
+
+    with pytest.raises(TimeoutError):
+        await connection.call_tool("slow", {}, timeout=0.1)
+    await pings
+
+    for _ in range(50):
+        if fake_mcp_server.cancelled_calls:
+            break
+        await asyncio.sleep(0.01)
+    assert fake_mcp_server.cancelled_calls == 1
+    assert connection.in_flight == 0
+
+    result = await connection.call_tool("echo", {"date": "2026-10-19"}, timeout=5)
+    assert json.loads(result.content[0].text)["arguments"] == {"date": "2026-10-19"}
+    await connection.close()
+
+
+async def test_read_only_results_are_cached_and_writes_invalidate():
+    orchestrator = MCPOrchestrator()
+    created = install_stub_servers(orchestrator, Counter(), delay=0)
+    await orchestrator.initialize()
+    calendar = next(c for c in created if c.server_name == "calendar")
+
+    first = await orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+    again = await orchestrator.execute_tool("check_availability", {"date": "2026-10-19 "})
+    other_day = await orchestrator.execute_tool("check_availability", {"date": "2026-10-20"})
+
+    assert first == again
+    assert calendar.calls == 2
+    assert orchestrator.cache.hits == 1
+
+    await orchestrator.execute_tool(
+        "create_event",
+        {"title": "Demo", "start_datetime": "2026-10-19T14:00:00"}
+    )
+    # Mesmo dia foi invalidado, outro dia continua em cache
+    await orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+    assert await orchestrator.execute_tool("check_availability", {"date": "2026-10-20"}) == other_day
+
+    assert calendar.calls == 4  # 2 leituras + create_event + releitura do dia 19
+    assert orchestrator.cache.invalidations == 1
+    assert orchestrator.cache.stats()["hits"] == 2
+    await orchestrator.shutdown()
+
+
+async def test_identical_in_flight_calls_share_one_execution(monkeypatch):
+    monkeypatch.setattr(settings, "tool_cache_enabled", False)
+    orchestrator = MCPOrchestrator()
+    created = install_stub_servers(orchestrator, Counter(), delay=0, call_delay=0.05)
+    await orchestrator.initialize()
+    calendar = next(c for c in created if c.server_name == "calendar")
+
+    results = await asyncio.gather(*(
+        orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+        for _ in range(30)
+    ))
+
+    assert calendar.calls == 1
+    assert orchestrator.coalesced_calls == 29
+    assert all(r == results[0] for r in results)
+    assert results[1] is not results[0]
+
+    # Escritas nunca são agrupadas
+    await asyncio.gather(*(
+        orchestrator.execute_tool("create_event", {"title": "Demo", "start_datetime": "2026-10-19T10:00:00"})
+        for _ in range(2)
+    ))
+    assert calendar.calls == 3
+    await orchestrator.shutdown()
+
+
+async def test_in_process_connection_keeps_tool_contract():
+    from tests import fake_mcp_server
+
+    first = InProcessMCPConnection("fake", "tests.fake_mcp_server")
+    second = InProcessMCPConnection("fake", "tests.fake_mcp_server")
+
+    tools = await first.start()
+    await second.start()
+    result = await first.call_tool("echo", {"date": "2026-10-19"}, timeout=5)
+
+    assert [tool["name"] for tool in tools] == ["echo", "slow"]
+    assert tools[0]["annotations"] == {"readOnlyHint": True}
+    assert json.loads(result.content[0].text) == {"tool": "echo", "arguments": {"date": "2026-10-19"}}
+    assert await first.ping(timeout=5) >= 0
+    assert fake_mcp_server.setup_calls == 1
+
+    await first.close()
+    await second.close()
+    assert not first.is_alive
+
+
+async def test_in_process_transport_uses_single_session_pool(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_transport_overrides", {"rag": "inprocess"})
+    monkeypatch.setattr(settings, "mcp_pool_min_size", 2)
+    orchestrator = MCPOrchestrator()
+
+    assert isinstance(orchestrator._create_connection("rag"), InProcessMCPConnection)
+    assert type(orchestrator._create_connection("calendar")) is MCPConnection
+
+    install_stub_servers(orchestrator, Counter(), delay=0)
+    await orchestrator.initialize()
+    health = orchestrator.health()["servers"]
+
+    assert health["rag"]["transport"] == "inprocess"
+    assert health["rag"]["pool"]["max_size"] == 1
+    assert health["calendar"]["pool"]["size"] == 2
+    await orchestrator.shutdown()
+
+
+async def test_lazy_server_starts_on_first_call_and_stops_when_idle(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_pool_max_size", 1)
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    created = install_stub_servers(orchestrator, spawns, delay=0)
+    await orchestrator.initialize()
+
+    assert orchestrator.server_status["pipedrive"]["state"] == "idle"
+    assert "pipedrive" not in orchestrator.servers
+    assert "create_lead" in orchestrator.tools
+    assert orchestrator.is_ready
+
+    results = await asyncio.gather(*(
+        orchestrator.execute_tool("create_lead", {"title": "Lead", "person_name": "Ana"})
+        for _ in range(5)
+    ))
+    assert all("error" not in result for result in results)
+    assert spawns["pipedrive"] == 2
+    assert orchestrator.server_status["pipedrive"]["state"] == "ready"
+
+    monkeypatch.setattr(settings, "mcp_lazy_idle_seconds", 0)
+    await orchestrator.supervisor.check_server("pipedrive")
+
+    assert orchestrator.server_status["pipedrive"]["state"] == "idle"
+    assert "create_lead" in orchestrator.tools
+    assert created[-1].closed
+    # Servidores eager nunca são parados por ociosidade
+    await orchestrator.supervisor.check_server("rag")
+    assert "rag" in orchestrator.servers
+    await orchestrator.shutdown()
+
+
+async def test_disabled_server_is_skipped(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_server_startup", {"calendar": "disabled"})
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, delay=0)
+    await orchestrator.initialize()
+
+    assert spawns["calendar"] == 0
+    assert orchestrator.server_status["calendar"]["state"] == "disabled"
+    assert "check_availability" not in orchestrator.tools
+    with pytest.raises(ValueError):
+        await orchestrator.start_server("calendar")
+    await orchestrator.shutdown()
+
+
+async def test_open_breaker_returns_service_unavailable(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_breaker_failure_threshold", 2)
+    monkeypatch.setattr(settings, "tool_timeout_overrides", {"check_availability": 0.01})
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, delay=0, call_delay=0.1)
+    await orchestrator.initialize()
+
+    for _ in range(2):
+        result = await orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+        assert result["error_type"] == "timeout"
+
+    result = await orchestrator.execute_tool("check_availability", {"date": "2026-10-20"})
+    assert result["error_type"] == "service_unavailable"
+    assert result["reason"] == "circuit_open"
+    assert result["server"] == "calendar"
+    assert orchestrator.metrics()["servers"]["calendar"]["breaker"]["state"] == "open"
+    # Outros servidores não são afetados
+    assert "error" not in await orchestrator.execute_tool("file_search", {"query": "preço"})
+    await orchestrator.shutdown()
+
+
+async def test_upstream_errors_open_breaker_but_business_errors_do_not(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_breaker_failure_threshold", 2)
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, delay=0, replies={
+        "create_event": {"error": "Invalid date format"},
+        "check_availability": {"error": "HttpError 503", "error_type": "upstream"},
+    })
+    await orchestrator.initialize()
+
+    # Erro de negócio volta ao modelo e não conta como falha
+    for _ in range(3):
+        result = await orchestrator.execute_tool("create_event", {"date": "ontem"})
+        assert result == {"error": "Invalid date format"}
+    assert orchestrator.metrics()["servers"]["calendar"]["breaker"]["state"] == "closed"
+
+    for _ in range(2):
+        result = await orchestrator.execute_tool("check_availability", {"date": "2026-10-19"})
+        assert result["error_type"] == "upstream"
+
+    result = await orchestrator.execute_tool("create_event", {"date": "2026-10-20"})
+    assert result["error_type"] == "service_unavailable"
+    assert orchestrator.metrics()["servers"]["calendar"]["breaker"]["state"] == "open"
+    await orchestrator.shutdown()
@@ -0,0 +1,117 @@
+"""
+Testes do MCP gateway compartilhado (apps/gateway) e do cliente dos workers
+"""
+import asyncio
+from collections import Counter
+
+import httpx
+
+from apps.gateway import main as gateway_main
+from apps.orchestrator.mcp_client import MCPOrchestrator
+from apps.orchestrator.mcp_gateway_client import MCPGatewayClient
+from apps.orchestrator.settings import settings
+from tests.test_mcp_client import install_stub_servers
+
+
+async def test_workers_share_gateway_pools(monkeypatch):
+    monkeypatch.setattr(settings, "mcp_pool_max_size", 1)
+    monkeypatch.setattr(settings, "mcp_warm_standby", False)
+    orchestrator = MCPOrchestrator()
+    spawns = Counter()
+    install_stub_servers(orchestrator, spawns, delay=0)
+    monkeypatch.setattr(gateway_main, "orchestrator", orchestrator)
+    await orchestrator.initialize()
+
+    # Quatro "workers" multiplexando no mesmo gateway
+    transport = httpx.ASGITransport(app=gateway_main.app)
+    workers = [MCPGatewayClient("http://gateway", transport=transport) for _ in range(4)]
+    await asyncio.gather(*(worker.initialize() for worker in workers))
+
+    assert all("file_search" in worker.tools for worker in workers)
+    assert workers[0].server_for_tool["check_availability"] == "calendar"
+
+    results = await asyncio.gather(*(
+        worker.execute_tool("file_search", {"query": f"preço {i}"})
+        for i, worker in enumerate(workers * 10)
+    ))
+    assert all("error" not in result for result in results)
+    # Subprocessos sobem uma vez no gateway, não por worker
+    assert spawns["rag"] == 1 and spawns["calendar"] == 1
+
+    # Estado por servidor vem do /health do gateway
+    health = await workers[0].health()
+    assert health["ready"] is True
+    assert health["servers"]["calendar"]["pool"] == orchestrator.health()["servers"]["calendar"]["pool"]
+    assert health["gateway"]["reachable"] is True
+
+    await workers[0].shutdown()
+    await orchestrator.shutdown()
+
+
+async def test_gateway_client_returns_structured_error_when_unreachable():
+    def refuse(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = MCPGatewayClient("http://gateway", transport=httpx.MockTransport(refuse))
+    client.tools = {"file_search": {"name": "file_search"}}
+
+    result = await client.execute_tool("file_search", {"query": "preço"})
+
+    assert result["error_type"] == "gateway"
+    assert result["retryable"] is True
+    assert client.metrics()["gateway"]["errors"] == 1
+
+
+async def test_gateway_client_write_timeout_is_not_retryable():
+    def hang(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    client = MCPGatewayClient("http://gateway", transport=httpx.MockTransport(hang))
+    client.tools = {"create_event": {"name": "create_event", "annotations": {"readOnlyHint": False}}}
+
+    result = await client.execute_tool("create_event", {"date": "2026-10-19"})
+
+    assert result["retryable"] is False
+    assert result["outcome"] == "unknown"
+
+
+async def test_gateway_client_recovers_after_transient_error():
+    calls = Counter()
+
+    def flaky(request):
+        calls[request.url.path] += 1
+        if request.url.path == "/health":
+            return httpx.Response(200, json={"initialized": True, "ready": True, "servers": {"rag": {"state": "ready"}}})
+        if calls[request.url.path] == 1:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"result": {"chunks": []}})
+
+    client = MCPGatewayClient("http://gateway", transport=httpx.MockTransport(flaky))
+    client.tools = {"file_search": {"name": "file_search"}}
+    client.is_initialized = True
+
+    await client.execute_tool("file_search", {"query": "preço"})
+    assert client.last_error is not None
+
+    assert await client.execute_tool("file_search", {"query": "preço"}) == {"chunks": []}
+    assert client.last_error is None
+
+    health = await client.health()
+    assert health["ready"] is True
+    assert health["servers"] == {"rag": {"state": "ready"}}
+    await client.shutdown()
+
+
+async def test_gateway_client_health_when_gateway_is_down():
+    def refuse(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    client = MCPGatewayClient("http://gateway", transport=httpx.MockTransport(refuse))
+    client.is_initialized = True
+
+    health = await client.health()
+
+    assert health["ready"] is False
+    assert health["gateway"]["reachable"] is False
+    assert "connection refused" in health["gateway"]["health_error"]
+    await client.shutdown()
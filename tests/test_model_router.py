@@ -0,0 +1,117 @@
+"""
+Testes do roteamento de modelos por tier
+"""
+from anthropic.types import TextBlock, ToolUseBlock
+
+from packages.llm.prompts import ESCALATION_MARKER
+from packages.llm.router import ModelRouter, ModelTier
+from tests.test_anthropic_driver import make_message, scripted_driver
+
+SMALL = ModelTier(name="small", model="claude-small", max_tokens=512, temperature=0.3, system_suffix="escale se precisar")
+LARGE = ModelTier(name="large", model="claude-large", max_tokens=4096, temperature=0.7)
+
+
+def make_router(**kwargs):
+    return ModelRouter(small=SMALL, large=LARGE, escalation_tools={"create_event", "create_lead"}, **kwargs)
+
+
+def test_initial_tier():
+    router = make_router()
+
+    assert router.initial_tier("oi") is SMALL
+    assert router.initial_tier("obrigado!") is SMALL
+    assert router.initial_tier("Quero agendar uma reunião amanhã") is LARGE
+    assert router.initial_tier("pode mandar para ana@empresa.com") is LARGE
+    assert router.initial_tier("x" * 1000) is LARGE
+    assert make_router(enabled=False).initial_tier("oi") is LARGE
+
+
+def test_booking_in_history_starts_on_large_tier():
+    router = make_router(booking_tools={"check_availability"})
+    chat = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá!"}]
+    booking = [
+        {"role": "user", "content": "tem horário amanhã?"},
+        {"role": "assistant", "content": [{"type": "tool_use", "id": "t", "name": "check_availability", "input": {}}]},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "{}"}]},
+        {"role": "assistant", "content": "Tenho 10h e 14h."},
+    ]
+
+    assert router.initial_tier("14h", chat) is SMALL
+    assert router.initial_tier("14h", booking) is LARGE
+    assert router.initial_tier("pode ser", booking) is LARGE
+
+
+def test_escalation_reasons():
+    router = make_router()
+    booking = make_message([ToolUseBlock(type="tool_use", id="tu_1", name="create_event", input={})], "tool_use")
+    search = make_message([ToolUseBlock(type="tool_use", id="tu_1", name="file_search", input={})], "tool_use")
+
+    assert router.escalation_reason(booking, SMALL) == "tool:create_event"
+    assert router.escalation_reason(booking, LARGE) is None
+    assert router.escalation_reason(search, SMALL) is None
+    assert router.escalation_reason(make_message([TextBlock(type="text", text=ESCALATION_MARKER)], "end_turn"), SMALL) == "requested"
+    assert router.escalation_reason(make_message([TextBlock(type="text", text="Não tenho certeza, talvez")], "end_turn"), SMALL) == "uncertain"
+    assert router.escalation_reason(make_message([TextBlock(type="text", text="Olá! Como posso ajudar?")], "end_turn"), SMALL) is None
+
+
+async def test_small_model_answers_simple_turn():
+    driver = scripted_driver([make_message([TextBlock(type="text", text="Olá! Como posso ajudar?")], "end_turn")])
+    router = make_router()
+
+    result = await driver.chat_with_tools("oi", system="prompt", tier=router.initial_tier("oi"), router=router)
+
+    request = driver.client.messages.requests[0]
+    assert request["model"] == "claude-small"
+    assert request["max_tokens"] == 512
+    assert request["system"][-1]["text"] == "escale se precisar"
+    assert result["model_tier"] == "small"
+    assert result["escalation"] is None
+
+
+async def test_booking_tool_escalates_to_large_model_without_executing():
+    booking = make_message([ToolUseBlock(type="tool_use", id="tu_1", name="create_event", input={"title": "Demo"})], "tool_use")
+    driver = scripted_driver([booking, make_message([TextBlock(type="text", text="Qual email?")], "end_turn")])
+    router = make_router()
+    executed = []
+
+    async def executor(tool_name, tool_input):
+        executed.append(tool_name)
+        return {}
+
+    result = await driver.chat_with_tools(
+        "pode ser às 15h", system="prompt", tool_executor=executor, tier=SMALL, router=router
+    )
+
+    second = driver.client.messages.requests[1]
+    assert executed == []
+    assert second["model"] == "claude-large"
+    assert second["max_tokens"] == 4096
+    assert all(block["text"] != "escale se precisar" for block in second["system"])
+    assert result["model_tier"] == "large"
+    assert result["escalation"] == "tool:create_event"
+    assert result["response"] == "Qual email?"
+
+
+async def test_stream_never_sends_text_of_an_escalated_small_turn():
+    driver = scripted_driver([
+        make_message([TextBlock(type="text", text=f"Não sei {ESCALATION_MARKER}")], "end_turn"),
+        make_message([TextBlock(type="text", text="O plano custa R$ 50 mil")], "end_turn"),
+    ])
+    router = make_router()
+
+    events = [event async for event in driver.stream_with_tools("quanto custa?", system="prompt", tier=SMALL, router=router)]
+    streamed = "".join(event["text"] for event in events if event["type"] == "text_delta")
+
+    assert [event["type"] for event in events if event["type"] != "text_delta"] == ["escalated", "done"]
+    assert ESCALATION_MARKER not in streamed
+    assert streamed.strip() == "O plano custa R$ 50 mil"
+
+
+async def test_stream_sends_small_tier_text_once_accepted():
+    driver = scripted_driver([make_message([TextBlock(type="text", text="Olá! Como posso ajudar?")], "end_turn")])
+    router = make_router()
+
+    events = [event async for event in driver.stream_with_tools("oi", system="prompt", tier=SMALL, router=router)]
+
+    assert "".join(event["text"] for event in events if event["type"] == "text_delta").strip() == "Olá! Como posso ajudar?"
+    assert events[-1]["model_tier"] == "small"
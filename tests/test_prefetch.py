@@ -0,0 +1,110 @@
+"""
+Testes do prefetch especulativo de tools
+"""
+import asyncio
+import time
+from datetime import date, datetime
+
+from anthropic.types import TextBlock, ToolUseBlock
+
+from apps.orchestrator.prefetch import (
+    TZ_BR,
+    PrefetchStats,
+    ToolPrefetch,
+    predict_tool_calls,
+    resolve_date,
+)
+from tests.test_anthropic_driver import make_message, scripted_driver
+
+# Sábado
+TODAY = date(2026, 10, 17)
+
+
+def test_resolve_date_triggers():
+    assert resolve_date("Hoje tem horário?", TODAY) == date(2026, 10, 17)
+    assert resolve_date("Amanhã funciona?", TODAY) == date(2026, 10, 18)
+    assert resolve_date("e amanha de tarde", TODAY) == date(2026, 10, 18)
+    assert resolve_date("depois de amanhã pode ser", TODAY) == date(2026, 10, 19)
+    assert resolve_date("Segunda-feira às 10h", TODAY) == date(2026, 10, 19)
+    assert resolve_date("pode ser sábado que vem", TODAY) == date(2026, 10, 24)
+    assert resolve_date("dia 05/11 serve?", TODAY) == date(2026, 11, 5)
+    assert resolve_date("e 10/01?", TODAY) == date(2027, 1, 10)
+    assert resolve_date("quero saber dos robôs", TODAY) is None
+
+
+def test_predict_tool_calls():
+    now = datetime(2026, 10, 17, 10, 0, tzinfo=TZ_BR)
+
+    assert predict_tool_calls("oi", now) == []
+    # file_search não é previsto: a query é do modelo, não a mensagem
+    assert predict_tool_calls("Quanto custa o robô de limpeza?", now) == []
+    assert predict_tool_calls("Tem horário amanhã? E qual o preço?", now) == [
+        ("check_availability", {"date": "2026-10-18"}),
+    ]
+
+
+async def test_matching_call_is_served_from_prefetch():
+    calls = []
+
+    async def executor(tool_name, tool_input):
+        calls.append((tool_name, tool_input))
+        await asyncio.sleep(0.05)
+        return {"date": tool_input["date"], "available_slots": ["10:00"]}
+
+    stats = PrefetchStats()
+    prefetch = ToolPrefetch(executor, available_tools=["check_availability"], stats=stats)
+    prefetch.start("Amanhã tem horário?", now=datetime(2026, 10, 17, 10, 0, tzinfo=TZ_BR))
+
+    # Parâmetros com valor padrão não impedem o acerto
+    result = await prefetch.executor(
+        tool_name="check_availability",
+        tool_input={"date": "2026-10-18", "start_hour": 9, "end_hour": 18}
+    )
+    other = await prefetch.executor(tool_name="check_availability", tool_input={"date": "2026-10-19"})
+    prefetch.finish()
+
+    assert result["available_slots"] == ["10:00"]
+    assert other["date"] == "2026-10-19"
+    assert len(calls) == 2
+    assert stats.stats() == {"started": 1, "hits": 1, "unused": 0, "hit_rate": 1.0}
+
+
+async def test_unavailable_tools_are_not_prefetched_and_unused_are_counted():
+    async def executor(tool_name, tool_input):
+        return {}
+
+    stats = PrefetchStats()
+    assert ToolPrefetch(executor, available_tools=[], stats=stats).start("Hoje tem horário?") == []
+
+    prefetch = ToolPrefetch(executor, available_tools=["check_availability"], stats=stats)
+    started = prefetch.start("Hoje tem horário?")
+    await asyncio.sleep(0)
+    prefetch.finish()
+
+    assert [key.split(":")[0] for key in started] == ["check_availability"]
+    assert stats.stats()["unused"] == 1
+    assert stats.stats()["hit_rate"] == 0.0
+
+
+async def test_prefetch_overlaps_first_llm_call():
+    tool_turn = make_message([
+        ToolUseBlock(type="tool_use", id="tu_1", name="check_availability", input={"date": "2026-10-18"}),
+    ], "tool_use")
+    final = make_message([TextBlock(type="text", text="Amanhã às 10h")], "end_turn")
+    driver = scripted_driver([(0.2, tool_turn), final])
+
+    async def executor(tool_name, tool_input):
+        await asyncio.sleep(0.2)
+        return {"available_slots": ["10:00"]}
+
+    prefetch = ToolPrefetch(executor, stats=PrefetchStats())
+    prefetch.start("Amanhã tem horário?", now=datetime(2026, 10, 17, 10, 0, tzinfo=TZ_BR))
+
+    started = time.perf_counter()
+    result = await driver.chat_with_tools("Amanhã tem horário?", tools=[], tool_executor=prefetch.executor)
+    prefetch.finish()
+
+    # LLM e tool em paralelo: ~0.2s em vez de ~0.4s
+    assert time.perf_counter() - started < 0.35
+    assert result["actions"][0]["result"] == {"available_slots": ["10:00"]}
+    assert prefetch.stats.hits == 1
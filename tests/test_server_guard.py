@@ -0,0 +1,84 @@
+"""
+Testes do limite de concorrência e circuit breaker por servidor
+"""
+import asyncio
+
+import pytest
+
+from apps.orchestrator.server_guard import ServerGuard, ServiceUnavailableError
+
+
+async def hold(guard, release: asyncio.Event):
+    async with guard.slot():
+        await release.wait()
+
+
+async def test_concurrency_limit_and_bounded_queue():
+    guard = ServerGuard("calendar", max_concurrency=2, max_queue=1, queue_timeout=5)
+    release = asyncio.Event()
+
+    holders = [asyncio.create_task(hold(guard, release)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert guard.in_flight == 2
+    assert guard.stats()["queue_depth"] == 1
+
+    with pytest.raises(ServiceUnavailableError) as exc:
+        async with guard.slot():
+            pass
+    assert exc.value.reason == "queue_full"
+
+    release.set()
+    await asyncio.gather(*holders)
+    assert guard.in_flight == 0
+    assert guard.stats()["rejected"] == 1
+
+
+async def test_queue_timeout_rejects_waiter():
+    guard = ServerGuard("calendar", max_concurrency=1, queue_timeout=0.01)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(guard, release))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(ServiceUnavailableError) as exc:
+        async with guard.slot():
+            pass
+    assert exc.value.reason == "queue_timeout"
+
+    release.set()
+    await holder
+
+
+async def test_breaker_opens_fails_fast_and_recovers():
+    guard = ServerGuard("pipedrive", failure_threshold=3, reset_seconds=0.05)
+
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            async with guard.slot():
+                raise TimeoutError()
+    assert guard.state == "open"
+
+    with pytest.raises(ServiceUnavailableError) as exc:
+        async with guard.slot():
+            pass
+    assert exc.value.reason == "circuit_open"
+
+    # Depois do reset, uma chamada de teste com sucesso fecha o breaker
+    await asyncio.sleep(0.06)
+    async with guard.slot():
+        assert guard.state == "half_open"
+    assert guard.state == "closed"
+    assert guard.stats()["breaker"]["opens"] == 1
+
+
+async def test_failed_half_open_probe_reopens():
+    guard = ServerGuard("pipedrive", failure_threshold=1, reset_seconds=0.01)
+    with pytest.raises(ConnectionError):
+        async with guard.slot():
+            raise ConnectionError()
+
+    await asyncio.sleep(0.02)
+    with pytest.raises(ConnectionError):
+        async with guard.slot():
+            raise ConnectionError()
+
+    assert guard.state == "open"
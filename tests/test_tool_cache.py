@@ -0,0 +1,63 @@
+"""
+Testes do cache de resultados de tools
+"""
+from apps.orchestrator import tool_cache
+from apps.orchestrator.tool_cache import ToolResultCache, canonicalize_input
+
+
+def make_cache(**kwargs):
+    cache = ToolResultCache(**kwargs)
+    for name in ("file_search", "check_availability", "list_events"):
+        cache.register_tool({"name": name, "annotations": {"readOnlyHint": True}})
+    cache.register_tool({"name": "create_event", "annotations": {"readOnlyHint": False}})
+    return cache
+
+
+def test_only_read_only_tools_are_cacheable():
+    cache = make_cache()
+    assert cache.is_cacheable("check_availability")
+    assert not cache.is_cacheable("create_event")
+    assert not cache.is_cacheable("create_lead")
+
+
+def test_canonical_key_groups_near_identical_queries():
+    assert canonicalize_input("file_search", {"query": "Quais os  Preços?", "top_k": 5}) == \
+        canonicalize_input("file_search", {"top_k": 5, "query": "quais os preços"})
+    assert canonicalize_input("check_availability", {"date": "2026-10-19", "start_hour": None}) == \
+        canonicalize_input("check_availability", {"date": "2026-10-19"})
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool_cache.time, "monotonic", lambda: now[0])
+    cache = make_cache(default_ttl=30)
+
+    cache.set("list_events", {}, {"count": 0})
+    assert cache.get("list_events", {}) == {"count": 0}
+
+    now[0] += 31
+    assert cache.get("list_events", {}) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = make_cache(max_entries=2)
+    cache.set("check_availability", {"date": "2026-10-19"}, {"slots": 1})
+    cache.set("check_availability", {"date": "2026-10-20"}, {"slots": 2})
+    cache.get("check_availability", {"date": "2026-10-19"})
+    cache.set("check_availability", {"date": "2026-10-21"}, {"slots": 3})
+
+    assert cache.get("check_availability", {"date": "2026-10-20"}) is None
+    assert cache.get("check_availability", {"date": "2026-10-19"}) == {"slots": 1}
+    assert cache.evictions == 1
+
+
+def test_cancel_event_invalidates_all_availability():
+    cache = make_cache()
+    cache.set("check_availability", {"date": "2026-10-19"}, {})
+    cache.set("check_availability", {"date": "2026-10-20"}, {})
+    cache.set("list_events", {"days": 7}, {})
+    cache.set("file_search", {"query": "preços"}, {})
+
+    assert cache.invalidate_for_write("cancel_event", {"event_id": "abc"}) == 3
+    assert cache.get("file_search", {"query": "preços"}) == {}
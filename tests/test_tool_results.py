@@ -0,0 +1,92 @@
+"""
+Testes da codificação compacta de resultados de tools
+"""
+import json
+
+from packages.llm.history import estimate_tokens
+from packages.llm.tool_results import encode_tool_result
+
+
+def file_search_result(chunks=5, size=400):
+    return {
+        "query": "preço robô",
+        "count": chunks,
+        "results": [
+            {
+                "content": f"Chunk {i}: " + "texto " * (size // 6),
+                "source": f"docs/precos_{i}.md",
+                "score": 0.9 - i / 10,
+                "metadata": {"source": f"docs/precos_{i}.md", "path": f"/srv/data/docs/precos_{i}.md", "chunk": i}
+            }
+            for i in range(chunks)
+        ]
+    }
+
+
+def test_file_search_projection_is_compact_json():
+    result = file_search_result()
+
+    encoded = encode_tool_result("file_search", result)
+    decoded = json.loads(encoded)
+
+    assert set(decoded["results"][0]) == {"content", "source", "score"}
+    assert "metadata" not in encoded and ", " not in encoded[:20]
+    assert len(encoded) < len(str(result))
+
+
+def test_calendar_projections_keep_needed_fields():
+    created = json.loads(encode_tool_result("create_event", {
+        "event_id": "evt8f3k2l9q",
+        "title": "Demo",
+        "start": "2026-10-20T15:00:00-03:00",
+        "end": "2026-10-20T16:00:00-03:00",
+        "status": "confirmed",
+        "calendar_link": "https://www.google.com/calendar/event?eid=" + "x" * 80,
+        "meet_link": "https://meet.google.com/abc-defg-hij",
+        "attendee_email": "ana@empresa.com"
+    }))
+    assert created["event_id"] == "evt8f3k2l9q"
+    assert created["meet_link"] == "https://meet.google.com/abc-defg-hij"
+    assert "calendar_link" not in created
+
+    availability = json.loads(encode_tool_result("check_availability", {
+        "date": "2026-10-20", "available_slots": ["10:00", "15:00"], "busy_hours": [9, 11, 12]
+    }))
+    assert availability == {"date": "2026-10-20", "available_slots": ["10:00", "15:00"]}
+
+
+def test_errors_and_unknown_tools_pass_through_as_json():
+    error = json.loads(encode_tool_result("check_availability", {"error": "timeout", "tool": "check_availability", "input": {"date": "x"}}))
+    assert error == {"error": "timeout", "tool": "check_availability"}
+
+    assert json.loads(encode_tool_result("create_lead", {"success": True, "lead_id": 42})) == {"success": True, "lead_id": 42}
+    assert encode_tool_result("create_lead", "ok") == "ok"
+
+
+def test_result_is_truncated_to_token_budget():
+    result = file_search_result(chunks=5, size=3000)
+
+    encoded = encode_tool_result("file_search", result, token_budget=300)
+
+    assert estimate_tokens(encoded) <= 300
+    decoded = json.loads(encoded)
+    assert decoded["results"][0]["source"] == "docs/precos_0.md"
+
+
+async def test_driver_sends_compact_result_and_keeps_full_action():
+    from anthropic.types import TextBlock, ToolUseBlock
+
+    from tests.test_anthropic_driver import make_message, scripted_driver
+
+    tool_turn = make_message([ToolUseBlock(type="tool_use", id="tu_1", name="file_search", input={"query": "preço"})], "tool_use")
+    driver = scripted_driver([tool_turn, make_message([TextBlock(type="text", text="Ok")], "end_turn")])
+    full = file_search_result()
+
+    async def executor(tool_name, tool_input):
+        return full
+
+    result = await driver.chat_with_tools("preço?", tools=[], tool_executor=executor)
+
+    content = driver.client.messages.requests[1]["messages"][-1]["content"][0]["content"]
+    assert "metadata" not in json.loads(content)["results"][0]
+    assert result["actions"][0]["result"] is full
@@ -0,0 +1,174 @@
+"""
+Testes da serialização e junção de turnos por usuário
+"""
+import asyncio
+import time
+
+import httpx
+
+from apps.orchestrator.conversation_store import MemoryConversationStore
+from apps.orchestrator.turn_coalescer import Coalesced, TurnCoalescer
+
+
+async def test_burst_becomes_one_turn():
+    calls = []
+
+    async def runner(message):
+        calls.append(message)
+        return f"resposta: {message}"
+
+    coalescer = TurnCoalescer(merge=" / ".join, debounce_seconds=0.05)
+    results = await asyncio.gather(*[
+        coalescer.submit("u", message, runner)
+        for message in ["oi", "queria saber", "quanto custa?"]
+    ])
+
+    assert calls == ["oi / queria saber / quanto custa?"]
+    assert results[:2] == [Coalesced(messages=3, position=0), Coalesced(messages=3, position=1)]
+    assert results[2] == "resposta: oi / queria saber / quanto custa?"
+    assert coalescer.stats()["coalesced"] == 2
+    assert coalescer.stats()["active_users"] == 0
+
+
+async def test_first_message_waits_the_debounce_unless_immediate_first():
+    async def runner(message):
+        return message
+
+    coalescer = TurnCoalescer(merge=" ".join, debounce_seconds=0.2)
+    started = time.monotonic()
+    assert await coalescer.submit("u", "oi", runner) == "oi"
+    assert time.monotonic() - started >= 0.2
+
+    immediate = TurnCoalescer(merge=" ".join, debounce_seconds=1.0, immediate_first=True)
+    started = time.monotonic()
+    assert await immediate.submit("u", "oi", runner) == "oi"
+    assert time.monotonic() - started < 0.5
+
+
+async def test_messages_during_a_turn_wait_for_the_debounce():
+    release = asyncio.Event()
+    calls = []
+
+    async def runner(message):
+        calls.append(message)
+        if message == "oi":
+            await release.wait()
+        return message
+
+    coalescer = TurnCoalescer(merge=" / ".join, debounce_seconds=0.05, immediate_first=True)
+    first = asyncio.create_task(coalescer.submit("u", "oi", runner))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(coalescer.submit("u", "queria saber", runner))
+    release.set()
+    await first
+    # Turno terminou, mas a rajada ainda está na janela de debounce
+    await asyncio.sleep(0.01)
+    third = asyncio.create_task(coalescer.submit("u", "quanto custa?", runner))
+
+    assert await third == "queria saber / quanto custa?"
+    assert await second == Coalesced(messages=2, position=0)
+    assert calls == ["oi", "queria saber / quanto custa?"]
+
+
+async def test_turns_of_same_user_never_overlap():
+    running = 0
+    overlaps = 0
+
+    async def runner(message):
+        nonlocal running, overlaps
+        running += 1
+        overlaps += running > 1
+        await asyncio.sleep(0.02)
+        running -= 1
+        return message
+
+    coalescer = TurnCoalescer(merge=" ".join, debounce_seconds=0)
+
+    async def stream_turn():
+        async with coalescer.turn("u"):
+            await runner("stream")
+
+    first = asyncio.create_task(coalescer.submit("u", "a", runner))
+    await asyncio.sleep(0.005)
+    # Chegam durante o primeiro turno: viram o próximo turno
+    later = [asyncio.create_task(coalescer.submit("u", m, runner)) for m in ["b", "c"]]
+    await asyncio.gather(first, *later, stream_turn())
+
+    assert overlaps == 0
+    assert first.result() == "a"
+    assert later[1].result() == "b c"
+
+
+async def test_other_users_are_not_delayed():
+    release = asyncio.Event()
+
+    async def runner(message):
+        if message == "lento":
+            await release.wait()
+        return message
+
+    coalescer = TurnCoalescer(merge=" ".join, debounce_seconds=0)
+    slow = asyncio.create_task(coalescer.submit("a", "lento", runner))
+    assert await asyncio.wait_for(coalescer.submit("b", "rápido", runner), 1) == "rápido"
+    release.set()
+    assert await slow == "lento"
+
+
+async def test_chat_route_answers_only_the_last_message(monkeypatch):
+    from apps.orchestrator.main import app
+    from apps.orchestrator.routes import chat
+
+    class ReadyOrchestrator:
+        is_initialized = True
+
+        async def initialize(self):
+            pass
+
+        async def get_tools(self):
+            return []
+
+        async def execute_tool(self, tool_name, tool_input):
+            return {}
+
+    llm_messages = []
+
+    async def fake_chat_with_tools(user_message, **kwargs):
+        llm_messages.append(user_message)
+        await asyncio.sleep(0.05)
+        return {"response": "R$ 50 mil", "actions": [], "final_message": None}
+
+    monkeypatch.setattr(chat, "conversation_store", MemoryConversationStore())
+    monkeypatch.setattr(chat, "mcp_orchestrator", ReadyOrchestrator())
+    monkeypatch.setattr(chat.anthropic_driver, "chat_with_tools", fake_chat_with_tools)
+    monkeypatch.setattr(chat, "turn_coalescer", TurnCoalescer(merge=chat._merge_requests, debounce_seconds=0.1))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async def send(message, delay):
+            await asyncio.sleep(delay)
+            return await client.post("/api/chat", json={"user_id": "55119", "message": message})
+
+        # Três fragmentos dentro da janela de debounce: um turno só
+        first, second, third = await asyncio.gather(
+            send("oi", 0), send("queria saber", 0.03), send("quanto custa?", 0.06)
+        )
+
+    assert llm_messages == ["oi\nqueria saber\nquanto custa?"]
+    assert first.json()["response"] == ""
+    assert first.json()["metadata"]["coalesced"] == {"messages": 3, "position": 0}
+    assert second.json()["metadata"]["coalesced"] == {"messages": 3, "position": 1}
+    assert third.json()["response"] == "R$ 50 mil"
+
+
+async def test_failed_turn_fails_every_message_of_the_burst():
+    async def runner(message):
+        raise RuntimeError("anthropic indisponível")
+
+    coalescer = TurnCoalescer(merge=" / ".join, debounce_seconds=0.05)
+    results = await asyncio.gather(
+        *[coalescer.submit("u", message, runner) for message in ["oi", "queria saber", "quanto custa?"]],
+        return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert coalescer.stats()["coalesced"] == 0